@@ -1,36 +1,24 @@
-import re
-from semantic_storage import load_semantic_mappings
+from sql_lexer import analyze_sql
+from semantic_catalog import get_semantic_catalog
+from schema_reader import load_physical_schema, foreign_key_constraints
 
 
 # ---------------------------------
 # Allowlist Validator (V1)
 # ---------------------------------
 
-TABLE_PATTERN = re.compile(r"\bfrom\s+([a-zA-Z_][a-zA-Z0-9_]*)", re.IGNORECASE)
-JOIN_PATTERN = re.compile(r"\bjoin\s+([a-zA-Z_][a-zA-Z0-9_]*)", re.IGNORECASE)
-
-COLUMN_PATTERN = re.compile(
-    r"\b([a-zA-Z_][a-zA-Z0-9_]*)\.([a-zA-Z_][a-zA-Z0-9_]*)\b"
-)
-
-
 def extract_tables(sql: str) -> set:
-    tables = set()
-
-    for match in TABLE_PATTERN.findall(sql):
-        tables.add(match)
-
-    for match in JOIN_PATTERN.findall(sql):
-        tables.add(match)
-
-    return tables
+    """
+    Extracts table names following FROM / JOIN
+    """
+    return set(analyze_sql(sql).tables)
 
 
 def extract_columns(sql: str) -> set:
     """
     Extracts (table, column) pairs like users.email
     """
-    return set(COLUMN_PATTERN.findall(sql))
+    return set(analyze_sql(sql).columns)
 
 
 def validate_allowlist(sql: str) -> bool:
@@ -41,9 +29,7 @@ def validate_allowlist(sql: str) -> bool:
     Technical fields are NOT allowed.
     """
 
-    semantic_mappings = load_semantic_mappings()
-
-    allowed_tables = set(semantic_mappings.keys())
+    catalog = get_semantic_catalog()
 
     # ---------------------------------
     # 1. Validate tables
@@ -51,7 +37,7 @@ def validate_allowlist(sql: str) -> bool:
     used_tables = extract_tables(sql)
 
     for table in used_tables:
-        if table not in allowed_tables:
+        if not catalog.is_allowed_table(table):
             raise ValueError(f"Table '{table}' is not allowed by semantic mappings")
 
     # ---------------------------------
@@ -60,17 +46,73 @@ def validate_allowlist(sql: str) -> bool:
     used_columns = extract_columns(sql)
 
     for table, column in used_columns:
-        if table not in semantic_mappings:
+        if not catalog.is_allowed_table(table):
             raise ValueError(f"Table '{table}' is not allowed")
 
-        allowed_dimensions = semantic_mappings[table].get("dimensions", {})
-        allowed_measures = semantic_mappings[table].get("measures", {})
+        if not catalog.is_allowed_column(table, column):
+            raise ValueError(
+                f"Column '{table}.{column}' is not allowed (technical or unknown field)"
+            )
+
+    return True
 
-        allowed_columns = set(allowed_dimensions.values()) | set(allowed_measures.values())
 
-        if column not in allowed_columns:
+def _is_foreign_key_join(physical_schema: dict, join) -> bool:
+    """
+    True if the join's equality pairs are exactly one declared foreign key
+    constraint (all of its columns, in either direction).
+    """
+    pairs = {frozenset(((l.table, l.name), (r.table, r.name))) for l, r in join.on}
+    tables = {c[0] for pair in pairs for c in pair}
+
+    for table in tables:
+        for fk in foreign_key_constraints(table, physical_schema.get(table, {})):
+            fk_pairs = {
+                frozenset(((table, col), (fk["references_table"], ref_col)))
+                for col, ref_col in zip(fk["columns"], fk["references_columns"])
+            }
+            if fk_pairs == pairs:
+                return True
+    return False
+
+
+def validate_query_allowlist(query, physical_schema: dict = None) -> bool:
+    """
+    AST counterpart of validate_allowlist: reads tables and columns straight
+    from a sql_ast.Select, so nothing is re-parsed.
+
+    Join keys are usually technical fields (users.id, orders.user_id), so
+    they are not checked against the column allowlist; instead every join
+    condition must be a declared foreign key between allowed tables.
+    """
+
+    catalog = get_semantic_catalog()
+
+    # 1. Tables (FROM + JOINs)
+    for table in sorted(query.tables()):
+        if not catalog.is_allowed_table(table):
+            raise ValueError(f"Table '{table}' is not allowed by semantic mappings")
+
+    # 2. Columns read or exposed by the query
+    for table, column in sorted(query.referenced_columns()):
+        if not catalog.is_allowed_table(table):
+            raise ValueError(f"Table '{table}' is not allowed")
+
+        if not catalog.is_allowed_column(table, column):
             raise ValueError(
                 f"Column '{table}.{column}' is not allowed (technical or unknown field)"
             )
 
+    # 3. Join conditions must follow foreign keys
+    if query.joins:
+        if physical_schema is None:
+            physical_schema = load_physical_schema()
+
+        for join in query.joins:
+            if not _is_foreign_key_join(physical_schema, join):
+                condition = " AND ".join(
+                    f"{l.table}.{l.name} = {r.table}.{r.name}" for l, r in join.on
+                )
+                raise ValueError(f"Join condition '{condition}' is not a foreign key")
+
     return True
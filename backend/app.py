@@ -1,19 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import math
+import time
+from contextlib import AsyncExitStack
+from fastapi import FastAPI, Depends, HTTPException, Request
 from pydantic import BaseModel
 from llm import UniversalLLM
+from plan_cache import PLAN_CACHE
+from semantic_catalog import get_semantic_catalog
 import psycopg2
 from auth import get_current_user
 from crypto import encrypt
 from db import get_internal_db_connection
 from fastapi.middleware.cors import CORSMiddleware
-
-from semantic_storage import validate_semantic_plan
-from sql_builder import build_sql_from_plan
-from sql_validator import validate_sql
-from limit_enforcer import enforce_row_limit
-from schema import QueryRequest
-from db import get_user_database_credentials
+from fastapi.responses import StreamingResponse, Response
+from schema import QueryRequest, StreamQueryRequest, BatchQueryRequest
+from db import invalidate_user_database_credentials, release_db_connection, tenant_key
+from async_db import (
+    ASYNC_TENANT_POOLS, get_user_database_credentials_async,
+    stream_with_timeout_async,
+)
+from secure_executor import (
+    prepare_semantic_query, prepare_query_ast, render_checked_sql, execute_gated_async, DEFAULT_TIMEOUT_MS,
+)
+from cost_gate import COST_GATE, CostBudgetExceeded, HeavyLaneBusy
+from scheduler import SQL_SCHEDULER, SchedulerOverloaded, scheduler_stats
+from result_cache import RESULT_CACHE, make_result_cache_key, ttl_for_time_range
+from result_stream import (
+    encode_ndjson, encode_arrow, arrow_available, encode_columnar, encode_arrow_result,
+    NDJSON_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE, JSON_MEDIA_TYPE, STREAM_FORMATS, RESPONSE_FORMATS,
+)
+from rollup_manager import (
+    ROLLUP_REFRESH_INTERVAL_S, get_tenant_rollups_async, refresh_tenant_rollups, register_rollup_user,
+    rollup_refresh_status, run_rollup_refresh_loop,
+)
+from query_batch import BATCH_MAX_QUERIES, prepare_batch, plan_batch, split_rows, execute_batch_async
 from answer_generator import generate_answer
+from metrics import (
+    span, start_request, end_request, stage_timings, server_timing_header,
+    render_prometheus, REQUEST_DURATION, PROMETHEUS_MEDIA_TYPE,
+)
 
 # ---------------------------------
 # App Initialization
@@ -23,15 +48,51 @@ app = FastAPI(
     description="Semantic SQL & Data Warehouse Intelligence Engine",
     version="v1"
 )
+FRONTEND_ORIGIN = "http://localhost:3000"
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # frontend origin
+    allow_origins=[FRONTEND_ORIGIN],  # frontend origin
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
 
 
+# ---------------------------------
+# Request ID + Stage Timing
+# ---------------------------------
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    """
+    Gives every request an ID (X-Request-ID, generated if absent) and
+    reports the pipeline's stage timings in a Server-Timing header.
+    Streamed responses report the stages up to the first byte.
+    """
+    request_id, tokens = start_request(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        total = time.perf_counter() - start
+
+        response.headers["X-Request-ID"] = request_id
+        response.headers["Server-Timing"] = server_timing_header(stage_timings(), total)
+        response.headers["Timing-Allow-Origin"] = FRONTEND_ORIGIN
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            route.path if route is not None else "unmatched",
+            request.method,
+            str(status),
+        )
+        end_request(tokens)
+
+
 # ---------------------------------
 # Request / Response Models
 # ---------------------------------
@@ -61,7 +122,23 @@ with open("specs/planner_prompt.txt", "r") as f:
 # ---------------------------------
 # Init Universal LLM
 # ---------------------------------
-llm = UniversalLLM(provider="groq")
+llm = UniversalLLM(provider="groq", plan_cache=PLAN_CACHE)
+
+
+_background_tasks = []
+
+
+@app.on_event("startup")
+async def start_rollup_refresh():
+    if ROLLUP_REFRESH_INTERVAL_S > 0:
+        _background_tasks.append(asyncio.create_task(run_rollup_refresh_loop()))
+
+
+@app.on_event("shutdown")
+async def close_tenant_pools():
+    for task in _background_tasks:
+        task.cancel()
+    await ASYNC_TENANT_POOLS.close_all()
 
 
 # ---------------------------------
@@ -72,16 +149,100 @@ def health_check():
     return {"status": "ok", "service": "WhareIQ API"}
 
 
+# ---------------------------------
+# Metrics
+# ---------------------------------
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint: stage / request latency histograms and
+    scheduler gauges.
+    """
+    return Response(render_prometheus(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+# ---------------------------------
+# Admission Control
+# ---------------------------------
+@app.get("/metrics/scheduler")
+def scheduler_metrics():
+    """
+    Queue depth, running slots and admission counters per scheduler / tenant.
+    """
+    return scheduler_stats()
+
+
+def _overloaded(e: SchedulerOverloaded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after_s))},
+    )
+
+
+# ---------------------------------
+# Rollups (per tenant database)
+# ---------------------------------
+async def _tenant_rollups(user_id: str, db_creds: dict, tenant: str) -> list:
+    """
+    Rollups registered in the user's database, for routing. Routing is an
+    optimization: if the registry cannot be read, queries hit the fact tables.
+    """
+    try:
+        with span("rollup_registry"):
+            return await get_tenant_rollups_async(
+                tenant, lambda: ASYNC_TENANT_POOLS.connection(user_id, db_creds)
+            )
+    except Exception:
+        return []
+
+
+@app.post("/rollups/refresh")
+async def refresh_rollups_endpoint(user: dict = Depends(get_current_user)):
+    """
+    Builds or incrementally refreshes the daily rollups in the user's
+    database, then keeps them fresh every ROLLUP_REFRESH_INTERVAL_S.
+    """
+    user_id = user["id"]
+
+    db_creds = await get_user_database_credentials_async(user_id)
+    if not db_creds:
+        raise HTTPException(
+            status_code=400,
+            detail="No database connected for this user"
+        )
+
+    try:
+        results = await asyncio.to_thread(refresh_tenant_rollups, user_id, db_creds)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    register_rollup_user(user_id)
+    return {"rollups": results}
+
+
+@app.get("/metrics/rollups")
+def rollup_metrics():
+    """
+    Scheduled rollup refresh: period, registered tenants and last outcome.
+    """
+    return rollup_refresh_status()
+
+
 # ---------------------------------
 # /plan Endpoint
 # ---------------------------------
 @app.post("/plan", response_model=PlanResponse)
-def generate_plan(payload: PlanRequest):
+async def generate_plan(payload: PlanRequest):
     try:
-        plan_json = llm.generate_json(
+        catalog = await asyncio.to_thread(get_semantic_catalog)
+        plan_json = await llm.agenerate_json(
             system_prompt=PLANNER_PROMPT,
             user_input=payload.question,
+            catalog_version=catalog.version,
         )
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
     except ValueError as e:
         # LLM / schema-related issues – bad request from semantic layer
         raise HTTPException(
@@ -123,12 +284,23 @@ def generate_plan(payload: PlanRequest):
     return plan_json
 
 @app.post("/connect-database")
-def connect_database(
+async def connect_database(
     payload: DatabaseConnectRequest,
     user: dict = Depends(get_current_user)  # ✅ FIX 1
 ):
     user_id = user["id"]  # ✅ FIX 2
 
+    # 1-2. Test connection and store encrypted credentials (blocking I/O, off the event loop)
+    await asyncio.to_thread(_test_and_store_credentials, user_id, payload)
+
+    # 3. Drop cached credentials / pooled connections for the old target
+    invalidate_user_database_credentials(user_id)
+    await ASYNC_TENANT_POOLS.evict_user(user_id)
+
+    return {"status": "connected"}
+
+
+def _test_and_store_credentials(user_id: str, payload: DatabaseConnectRequest):
     # 1. Test connection to user's DB
     try:
         conn = psycopg2.connect(
@@ -169,63 +341,392 @@ def connect_database(
 
     internal_conn.commit()
     cur.close()
-    internal_conn.close()
+    release_db_connection(internal_conn)
 
-    return {"status": "connected"}
+
+async def _plan_question(user_id: str, question: str):
+    """
+    Shared front half of /query and /query/stream.
+
+    Returns (db_creds, semantic_plan) where semantic_plan is the full,
+    schema-validated planner output (it may ask for clarification).
+    """
+
+    # 1️⃣ Load user's DB credentials (cached, decrypted)
+    with span("credentials"):
+        db_creds = await get_user_database_credentials_async(user_id)
+    if not db_creds:
+        raise HTTPException(
+            status_code=400,
+            detail="No database connected for this user"
+        )
+
+    # 2️⃣ Generate semantic plan using LLM (served from the plan cache on repeats)
+    with span("catalog"):
+        catalog = await asyncio.to_thread(get_semantic_catalog)
+    try:
+        with span("llm"):
+            semantic_plan = await llm.agenerate_plan(
+                question,
+                catalog_version=catalog.version,
+                tenant=user_id,
+            )
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Plan generation failed: {str(e)}")
+
+    return db_creds, semantic_plan
+
+
+def _needs_clarification(semantic_plan: dict) -> bool:
+    return semantic_plan.get("needs_clarification") is True or not semantic_plan.get("plan")
+
+
+def _clarification_text(semantic_plan: dict) -> str:
+    return (
+        semantic_plan.get("clarification_question")
+        or "Your question is ambiguous. Please provide more details."
+    )
 
 
 @app.post("/query")
-def query_data(
+async def query_data(
     payload: QueryRequest,
     user: dict = Depends(get_current_user)
 ):
     user_id = user["id"]
 
-    # 1️⃣ Load user's DB credentials
-    db_creds = get_user_database_credentials(user_id)
+    if payload.format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported response format: {payload.format}")
+
+    if payload.format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow responses require the 'pyarrow' package")
+
+    db_creds, semantic_plan = await _plan_question(user_id, payload.question)
+
+    # 3️⃣ Clarification fallback (plan JSON is already schema-validated)
+    if _needs_clarification(semantic_plan):
+        return {
+            "answer": _clarification_text(semantic_plan),
+            "sql": None,
+            "rows": []
+        }
+
+    plan = semantic_plan["plan"]
+    tenant = tenant_key(user_id, db_creds)
+
+    # 4️⃣ Semantic plan → SQL → safety checks (routed to the tenant's rollups)
+    rollups = await _tenant_rollups(user_id, db_creds, tenant)
+    try:
+        query = await asyncio.to_thread(prepare_query_ast, plan, rollups)
+        final_sql, params = render_checked_sql(query)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 5️⃣ Result cache, keyed on (tenant database, final SQL, role, bound params)
+    cache_key = make_result_cache_key(tenant, final_sql, role=user.get("role"), params=params)
+    cached = await RESULT_CACHE.get_async(cache_key)
+
+    if cached is not None:
+        rows, ttl_remaining = cached
+        cache_info = {"hit": True, "ttl_s": ttl_remaining}
+        cost = COST_GATE.lookup(tenant, final_sql, params)
+    else:
+        # 6️⃣ Fair-share SQL slot, cost gate (EXPLAIN), then execute on USER database
+        try:
+            async with SQL_SCHEDULER.slot(user_id):
+                async with ASYNC_TENANT_POOLS.connection(user_id, db_creds) as conn:
+                    cost, rows = await execute_gated_async(conn, final_sql, params, tenant, budget_tenant=user_id)
+        except SchedulerOverloaded as e:
+            raise _overloaded(e)
+        except CostBudgetExceeded as e:
+            raise HTTPException(status_code=422, detail={"message": str(e), "cost": e.estimate})
+        except HeavyLaneBusy as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        ttl = ttl_for_time_range(plan.get("time_range"))
+        await RESULT_CACHE.set_async(cache_key, rows, ttl)
+        cache_info = {"hit": False, "ttl_s": ttl}
+
+    # 7️⃣ Human summary (V1: simple deterministic)
+    with span("answer"):
+        answer = generate_answer(plan, rows)
+
+    if payload.format == "rows":
+        return {
+            "answer": answer,
+            "sql": final_sql,
+            "params": params,
+            "rows": rows,
+            "cache": cache_info,
+            "cost": cost
+        }
+
+    # 8️⃣ Opt-in columnar encodings (names and types once, values per column)
+    with span("serialization"):
+        columns = query.output_names()
+
+        if payload.format == "arrow":
+            body = encode_arrow_result(columns, rows, {"sql": final_sql, "answer": answer})
+            headers = {"X-Result-Cache": "hit" if cache_info["hit"] else "miss"}
+            if cost is not None:
+                headers["X-Query-Cost"] = f"{cost['total_cost']}"
+            if cost is not None and "decision" in cost:
+                headers["X-Query-Cost-Decision"] = cost["decision"]
+            return Response(body, media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+
+        body = encode_columnar({
+            "answer": answer,
+            "sql": final_sql,
+            "params": params,
+            "cache": cache_info,
+            "cost": cost
+        }, columns, rows)
+
+    return Response(body, media_type=JSON_MEDIA_TYPE)
+
+
+@app.post("/query/batch")
+async def query_data_batch(
+    payload: BatchQueryRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Answers many questions (or ready-made semantic plans) in one request,
+    e.g. every tile of a dashboard.
+
+    - One credentials lookup and one catalog snapshot for the whole batch
+    - Questions are planned concurrently (plan cache first)
+    - Identical SQL runs once; compatible aggregates over the same table
+      and filters are merged into one GROUP BY / GROUPING SETS query
+    - The remaining statements are pipelined on one pooled connection,
+      under a single SQL scheduler slot
+
+    Results come back in request order; a query that fails only fails
+    its own entry ({"error": ..., "status": ...}).
+    """
+    user_id = user["id"]
+
+    if not payload.queries:
+        raise HTTPException(status_code=400, detail="Batch contains no queries")
+    if len(payload.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"A batch accepts at most {BATCH_MAX_QUERIES} queries")
+    for item in payload.queries:
+        if (item.question is None) == (item.plan is None):
+            raise HTTPException(status_code=400, detail="Each batch query needs exactly one of question or plan")
+
+    # 1️⃣ Credentials and one catalog snapshot for every query
+    with span("credentials"):
+        db_creds = await get_user_database_credentials_async(user_id)
     if not db_creds:
         raise HTTPException(
             status_code=400,
             detail="No database connected for this user"
         )
 
-    # 2️⃣ Generate semantic plan using LLM
-    llm = UniversalLLM()
-    semantic_plan = llm.generate_plan(payload.question)
+    with span("catalog"):
+        catalog = await asyncio.to_thread(get_semantic_catalog)
 
-    # 3️⃣ Validate semantic plan schema
-    validate_semantic_plan(semantic_plan)
+    # 2️⃣ Plan every question concurrently; supplied plans are validated like LLM output
+    async def plan_item(item):
+        if item.plan is not None:
+            return llm.validate_plan(item.plan)
+        return await llm.agenerate_plan(item.question, catalog_version=catalog.version, tenant=user_id)
 
-    # 4️⃣ Resolve semantic plan → SQL
-    sql = build_sql_from_plan(semantic_plan)
+    with span("llm"):
+        semantic_plans = await asyncio.gather(
+            *(plan_item(item) for item in payload.queries), return_exceptions=True
+        )
+
+    results = [None] * len(payload.queries)
+    plans = {}
+
+    for index, semantic_plan in enumerate(semantic_plans):
+        if isinstance(semantic_plan, SchedulerOverloaded):
+            results[index] = {"error": str(semantic_plan), "status": 429}
+        elif isinstance(semantic_plan, Exception):
+            results[index] = {"error": f"Plan generation failed: {str(semantic_plan)}", "status": 400}
+        elif _needs_clarification(semantic_plan):
+            results[index] = {"answer": _clarification_text(semantic_plan), "sql": None, "rows": []}
+        else:
+            plans[index] = semantic_plan["plan"]
+
+    # 3️⃣ Semantic plans → checked query ASTs, against the same catalog
+    tenant = tenant_key(user_id, db_creds)
+    rollups = await _tenant_rollups(user_id, db_creds, tenant)
+    prepared = await asyncio.to_thread(prepare_batch, plans, catalog, rollups)
+
+    # 4️⃣ Result cache per query
+    pending = {}
+    cache_keys = {}
+
+    for index, query in prepared.items():
+        if isinstance(query, Exception):
+            results[index] = {"error": str(query), "status": 400}
+            continue
+
+        final_sql, params = query.render()
+        cache_keys[index] = make_result_cache_key(tenant, final_sql, role=user.get("role"), params=params)
+
+    cached_results = await RESULT_CACHE.get_many_async(list(cache_keys.values()))
+
+    for index, key in cache_keys.items():
+        query = prepared[index]
+        cached = cached_results[key]
+
+        if cached is not None:
+            final_sql, params = query.render()
+            rows, ttl_remaining = cached
+            results[index] = {
+                "sql": final_sql,
+                "params": params,
+                "rows": rows,
+                "cache": {"hit": True, "ttl_s": ttl_remaining},
+                "cost": COST_GATE.lookup(tenant, final_sql, params),
+            }
+        else:
+            pending[index] = query
+
+    # 5️⃣ Deduplicate / merge, then run everything on one connection
+    statements = plan_batch(pending)
+    outcomes = []
+
+    if statements:
+        try:
+            async with SQL_SCHEDULER.slot(user_id, cost=len(statements)):
+                async with ASYNC_TENANT_POOLS.connection(user_id, db_creds) as conn:
+                    outcomes = await execute_batch_async(conn, statements, tenant, budget_tenant=user_id)
+        except SchedulerOverloaded as e:
+            raise _overloaded(e)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    executed = []
+    to_cache = []
+    for number, (statement, outcome) in enumerate(zip(statements, outcomes)):
+        executed_sql, executed_params = statement.render()
+        executed.append({
+            "sql": executed_sql,
+            "params": executed_params,
+            "queries": sorted({m.index for m in statement.members}),
+            "cost": outcome.get("cost"),
+        })
+
+        if "error" in outcome:
+            for m in statement.members:
+                results[m.index] = {"error": outcome["error"], "status": outcome["status"], "cost": outcome.get("cost")}
+            continue
+
+        for index, rows in split_rows(statement, outcome["rows"]).items():
+            ttl = ttl_for_time_range(plans[index].get("time_range"))
+            to_cache.append((cache_keys[index], rows, ttl))
+
+            final_sql, params = pending[index].render()
+            results[index] = {
+                "sql": final_sql,
+                "params": params,
+                "rows": rows,
+                "cache": {"hit": False, "ttl_s": ttl},
+                "cost": outcome["cost"],
+                "statement": number,
+            }
+
+    await RESULT_CACHE.set_many_async(to_cache)
+
+    # 6️⃣ Human summaries
+    with span("answer"):
+        for index, plan in plans.items():
+            if "rows" in results[index]:
+                results[index]["answer"] = generate_answer(plan, results[index]["rows"])
 
-    # 5️⃣ Enforce SQL safety
-    validate_sql(sql)
-    sql = enforce_row_limit(sql)
+    return {
+        "results": results,
+        "statements": executed,
+    }
 
-    # 6️⃣ Execute SQL on USER database
+
+async def _admit_stream(slots: AsyncExitStack, user_id: str, db_creds: dict, tenant: str, sql: str, params):
+    """
+    Enters the SQL scheduler slot (and heavy lane, if the estimate needs
+    it) on slots and returns the checked cost. Closes slots on failure.
+    """
     try:
-        conn = psycopg2.connect(
-            host=db_creds["host"],
-            port=db_creds["port"],
-            dbname=db_creds["db_name"],
-            user=db_creds["username"],
-            password=db_creds["password"],
-            connect_timeout=5
-        )
-        cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        await slots.enter_async_context(SQL_SCHEDULER.slot(user_id))
+        async with ASYNC_TENANT_POOLS.connection(user_id, db_creds) as conn:
+            estimate = await COST_GATE.estimate_async(conn, tenant, sql, params)
+        cost = COST_GATE.check(user_id, estimate)
+        if cost["decision"] == "heavy":
+            await slots.enter_async_context(COST_GATE.async_heavy_lane())
+        return cost
+    except BaseException:
+        await slots.aclose()
+        raise
+
+
+@app.post("/query/stream")
+async def query_data_stream(
+    payload: StreamQueryRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Streams query results instead of buffering them in one JSON body.
+
+    Rows are read through a server-side cursor in fetchmany batches and
+    sent as NDJSON (default) or an Arrow IPC stream (format="arrow").
+    """
+    user_id = user["id"]
+
+    if payload.format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported stream format: {payload.format}")
+
+    if payload.format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow streaming requires the 'pyarrow' package")
+
+    db_creds, semantic_plan = await _plan_question(user_id, payload.question)
+
+    if _needs_clarification(semantic_plan):
+        raise HTTPException(status_code=422, detail=_clarification_text(semantic_plan))
+
+    # Build and validate before the first byte, so errors still get a status code
+    tenant = tenant_key(user_id, db_creds)
+    rollups = await _tenant_rollups(user_id, db_creds, tenant)
+    try:
+        final_sql, params = await asyncio.to_thread(prepare_semantic_query, semantic_plan["plan"], rollups)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    # 7️⃣ Human summary (V1: simple deterministic)
-    answer = generate_answer(semantic_plan, rows)
+    # Admission and cost gate, also before the first byte; the SQL slot
+    # (and heavy-lane slot) are held for the whole stream
+    slots = AsyncExitStack()
+    try:
+        cost = await _admit_stream(slots, user_id, db_creds, tenant, final_sql, params)
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
+    except CostBudgetExceeded as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "cost": e.estimate})
+    except HeavyLaneBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return {
-        "answer": answer,
-        "sql": sql,
-        "rows": rows
+    async def batches():
+        try:
+            # The connection stays checked out while the response is streamed
+            async with ASYNC_TENANT_POOLS.connection(user_id, db_creds) as conn:
+                async for batch in stream_with_timeout_async(final_sql, params, timeout_ms=DEFAULT_TIMEOUT_MS, conn=conn):
+                    yield batch
+        finally:
+            await slots.aclose()
+
+    headers = {
+        "X-Query-Cost": f"{cost['total_cost']}",
+        "X-Query-Cost-Decision": cost["decision"],
     }
+
+    if payload.format == "arrow":
+        return StreamingResponse(encode_arrow(batches(), final_sql), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+
+    return StreamingResponse(encode_ndjson(batches(), final_sql), media_type=NDJSON_MEDIA_TYPE, headers=headers)
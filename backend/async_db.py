@@ -0,0 +1,331 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from psycopg import Pipeline
+from psycopg.conninfo import make_conninfo
+from psycopg.errors import IndeterminateDatatype, InvalidSqlStatementName
+from psycopg_pool import AsyncConnectionPool
+
+from db import (
+    USER_DATABASE_CREDENTIALS_SQL,
+    peek_user_database_credentials,
+    remember_user_database_credentials,
+)
+from prepared_statements import PREPARED_STATEMENTS
+
+
+# ---------------------------------
+# Async Internal DB Pool (psycopg 3)
+# ---------------------------------
+
+_internal_pool = None
+_internal_pool_lock = asyncio.Lock()
+
+
+async def get_internal_pool() -> AsyncConnectionPool:
+    """
+    Returns the async pool for WhareIQ's internal metadata database,
+    opening it on first use.
+    """
+    global _internal_pool
+
+    if _internal_pool is not None:
+        return _internal_pool
+
+    async with _internal_pool_lock:
+        if _internal_pool is None:
+            pool = AsyncConnectionPool(
+                make_conninfo(
+                    host=os.getenv("POSTGRES_HOST"),
+                    port=os.getenv("POSTGRES_PORT"),
+                    dbname=os.getenv("POSTGRES_DB"),
+                    user=os.getenv("POSTGRES_USER"),
+                    password=os.getenv("POSTGRES_PASSWORD"),
+                ),
+                min_size=1,
+                max_size=5,
+                open=False,
+            )
+            await pool.open()
+            _internal_pool = pool
+
+    return _internal_pool
+
+
+async def get_user_database_credentials_async(user_id: str):
+    """
+    Async counterpart of db.get_user_database_credentials (shares its cache).
+    """
+    cached = peek_user_database_credentials(user_id)
+    if cached is not None:
+        return cached
+
+    pool = await get_internal_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(USER_DATABASE_CREDENTIALS_SQL, (user_id,))
+            row = await cur.fetchone()
+
+    return remember_user_database_credentials(user_id, row)
+
+
+# ---------------------------------
+# Async Per-Tenant Pools (user databases)
+# ---------------------------------
+
+DEFAULT_MAX_POOLS = 50
+DEFAULT_MAX_CONNECTIONS_PER_POOL = 5
+DEFAULT_IDLE_TIMEOUT_S = 300.0
+DEFAULT_ACQUIRE_TIMEOUT_S = 10.0
+DEFAULT_CONNECT_TIMEOUT_S = 5
+
+
+class AsyncTenantPoolRegistry:
+    """
+    One AsyncConnectionPool per (user_id, host, port, db_name). psycopg_pool
+    enforces the per-pool connection cap, acquire timeout and idle connection
+    reaping; this registry bounds the number of pools (LRU; pools with
+    checked-out connections are never closed) and rebuilds a pool when
+    credentials change.
+    """
+
+    def __init__(
+        self,
+        max_pools: int = DEFAULT_MAX_POOLS,
+        max_connections_per_pool: int = DEFAULT_MAX_CONNECTIONS_PER_POOL,
+        idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S,
+        acquire_timeout_s: float = DEFAULT_ACQUIRE_TIMEOUT_S,
+        connect_timeout: int = DEFAULT_CONNECT_TIMEOUT_S,
+    ):
+        self.max_pools = max_pools
+        self.max_connections_per_pool = max_connections_per_pool
+        self.idle_timeout_s = idle_timeout_s
+        self.acquire_timeout_s = acquire_timeout_s
+        self.connect_timeout = connect_timeout
+
+        self._pools = OrderedDict()  # key -> entry dict
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _pool_key(user_id: str, creds: dict) -> tuple:
+        return (user_id, creds["host"], creds["port"], creds["db_name"])
+
+    @staticmethod
+    def _creds_fingerprint(creds: dict) -> str:
+        raw = f"{creds['username']}\x00{creds['password']}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def _acquire_entry(self, user_id: str, creds: dict) -> dict:
+        key = self._pool_key(user_id, creds)
+        fingerprint = self._creds_fingerprint(creds)
+        stale = []
+
+        async with self._lock:
+            entry = self._pools.get(key)
+
+            if entry is not None and entry["creds_fingerprint"] != fingerprint:
+                stale.append(self._pools.pop(key))
+                entry = None
+
+            if entry is None:
+                pool = AsyncConnectionPool(
+                    make_conninfo(
+                        host=creds["host"],
+                        port=creds["port"],
+                        dbname=creds["db_name"],
+                        user=creds["username"],
+                        password=creds["password"],
+                        connect_timeout=self.connect_timeout,
+                    ),
+                    min_size=0,
+                    max_size=self.max_connections_per_pool,
+                    max_idle=self.idle_timeout_s,
+                    timeout=self.acquire_timeout_s,
+                    open=False,
+                )
+                await pool.open(wait=False)
+                entry = {
+                    "pool": pool,
+                    "in_use": 0,
+                    "last_used": time.monotonic(),
+                    "creds_fingerprint": fingerprint,
+                }
+                self._pools[key] = entry
+
+            self._pools.move_to_end(key)
+            entry["in_use"] += 1
+            entry["last_used"] = time.monotonic()
+
+            # LRU eviction of idle pools, plus pools idle past the timeout
+            now = time.monotonic()
+            for other_key in list(self._pools.keys()):
+                other = self._pools[other_key]
+                if other["in_use"] > 0:
+                    continue
+                if len(self._pools) > self.max_pools or now - other["last_used"] >= self.idle_timeout_s:
+                    stale.append(self._pools.pop(other_key))
+
+        for old in stale:
+            await old["pool"].close()
+
+        return entry
+
+    @asynccontextmanager
+    async def connection(self, user_id: str, creds: dict):
+        entry = await self._acquire_entry(user_id, creds)
+        try:
+            async with entry["pool"].connection() as conn:
+                yield conn
+        finally:
+            entry["in_use"] -= 1
+            entry["last_used"] = time.monotonic()
+
+    async def evict_user(self, user_id: str):
+        async with self._lock:
+            keys = [k for k in self._pools.keys() if k[0] == user_id]
+            stale = [self._pools.pop(k) for k in keys]
+
+        for entry in stale:
+            await entry["pool"].close()
+
+    async def close_all(self):
+        async with self._lock:
+            stale = list(self._pools.values())
+            self._pools.clear()
+
+        for entry in stale:
+            await entry["pool"].close()
+
+    def stats(self) -> dict:
+        return {
+            "pools": len(self._pools),
+            "connections_in_use": sum(e["in_use"] for e in self._pools.values()),
+        }
+
+
+ASYNC_TENANT_POOLS = AsyncTenantPoolRegistry()
+
+
+# ---------------------------------
+# Async Query Timeout Executor
+# ---------------------------------
+
+async def execute_with_timeout_async(sql: str, params=None, timeout_ms: int = 2000, conn=None,
+                                     prepare: bool = True):
+    """
+    Async counterpart of query_timeout.execute_with_timeout.
+
+    - timeout_ms is enforced by the database with SET LOCAL, so it only
+      applies to this transaction and never leaks into the pool
+    - conn: optional async connection (e.g. a tenant pool connection);
+      defaults to the internal pool
+    - prepare: run SELECTs through the per-connection prepared statement
+      registry, so repeat shapes skip parsing and planning
+    """
+    if conn is None:
+        pool = await get_internal_pool()
+        async with pool.connection() as internal_conn:
+            return await execute_with_timeout_async(sql, params, timeout_ms, internal_conn, prepare)
+
+    async with conn.cursor() as cur:
+        await cur.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        if not prepare:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+    try:
+        return await PREPARED_STATEMENTS.execute_async(conn, sql, params)
+    except InvalidSqlStatementName:
+        # The server dropped our statements (e.g. DISCARD ALL): start over
+        PREPARED_STATEMENTS.forget(conn)
+    except IndeterminateDatatype:
+        PREPARED_STATEMENTS.skip(sql)
+
+    await conn.rollback()
+    return await execute_with_timeout_async(sql, params, timeout_ms, conn, prepare=False)
+
+
+async def execute_pipelined_async(statements: list, timeout_ms: int = 2000, conn=None) -> list:
+    """
+    Executes [(sql, params), ...] on one connection in pipeline mode, so
+    every statement is sent before the first result is awaited (one
+    network round trip instead of one per statement). Returns the rows of
+    each statement, in order.
+
+    A failing statement aborts the whole pipelined transaction, so on any
+    error every statement is re-run on its own; the returned list then
+    holds the exception in place of the rows of each statement that failed.
+    Without pipeline support (libpq < 14) statements simply run one by one.
+    """
+    if conn is None:
+        pool = await get_internal_pool()
+        async with pool.connection() as internal_conn:
+            return await execute_pipelined_async(statements, timeout_ms, internal_conn)
+
+    if not statements:
+        return []
+
+    if Pipeline.is_supported():
+        try:
+            async with AsyncExitStack() as cursors:
+                async with conn.pipeline():
+                    pending = []
+                    setup = await cursors.enter_async_context(conn.cursor())
+                    await setup.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+                    for sql, params in statements:
+                        cur = await cursors.enter_async_context(conn.cursor())
+                        await cur.execute(sql, params)
+                        pending.append(cur)
+
+                return [await cur.fetchall() for cur in pending]
+        except Exception:
+            await conn.rollback()
+
+    results = []
+    for sql, params in statements:
+        try:
+            results.append(await execute_with_timeout_async(sql, params, timeout_ms, conn))
+        except Exception as e:
+            await conn.rollback()
+            results.append(e)
+    return results
+
+
+# ---------------------------------
+# Async Streaming Executor (server-side cursor)
+# ---------------------------------
+
+DEFAULT_STREAM_BATCH_SIZE = 500
+
+
+async def stream_with_timeout_async(sql: str, params=None, timeout_ms: int = 2000, conn=None,
+                                    batch_size: int = DEFAULT_STREAM_BATCH_SIZE):
+    """
+    Executes sql through a named (server-side) cursor and yields
+    (column_names, rows) batches of at most batch_size rows; at least one
+    batch, empty if the query returns no rows.
+
+    conn must be an open async connection that stays checked out for the
+    whole iteration (the cursor lives inside its transaction).
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+    async with conn.cursor(name="whareiq_stream") as stream:
+        stream.itersize = batch_size
+        await stream.execute(sql, params)
+        columns = [col.name for col in stream.description]
+
+        # The first batch is yielded even when empty, so encoders always
+        # get the column names (e.g. for an Arrow schema)
+        rows = await stream.fetchmany(batch_size)
+        yield columns, rows
+
+        while len(rows) == batch_size:
+            rows = await stream.fetchmany(batch_size)
+            if rows:
+                yield columns, rows
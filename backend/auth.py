@@ -1,19 +1,206 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import httpx
+import jwt
 import requests
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import os
+
+from metrics import span
+from ttl_cache import TTLCache
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv(
+    "SUPABASE_JWKS_URL",
+    f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None
+)
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+
+# Remote introspection is only used when a token cannot be verified locally
+AUTH_REMOTE_FALLBACK = os.getenv("AUTH_REMOTE_FALLBACK", "true").lower() == "true"
+
+TOKEN_CACHE_MAX_TTL_S = 300.0
+REMOTE_CACHE_TTL_S = 30.0
+
+# An unknown kid refetches the JWKS (key rotation) at most this often
+JWKS_REFETCH_INTERVAL_S = float(os.getenv("JWKS_REFETCH_INTERVAL_S", "60"))
 
 security = HTTPBearer()
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-):
-    token = credentials.credentials
+
+# ---------------------------------
+# Caches
+# ---------------------------------
+# token hash -> user dict; each entry lives until min(token exp, max TTL)
+_TOKEN_CACHE = TTLCache(maxsize=10000, ttl_s=TOKEN_CACHE_MAX_TTL_S)
+
+# token hash -> user dict from Supabase /auth/v1/user (short-lived)
+_REMOTE_CACHE = TTLCache(maxsize=10000, ttl_s=REMOTE_CACHE_TTL_S)
+
+_jwks_client = None
+_jwks_lock = threading.Lock()
+_jwks_refetched_at = None
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _get_jwks_client():
+    global _jwks_client
+    if _jwks_client is None and SUPABASE_JWKS_URL:
+        # PyJWKClient caches the key set; refetches on unknown kid are ours
+        _jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, lifespan=3600)
+    return _jwks_client
+
+
+class LocalVerificationUnavailable(Exception):
+    """
+    Raised when no key material is available to verify a token locally.
+    """
+
+
+# ---------------------------------
+# Local Verification
+# ---------------------------------
+
+def _get_signing_key(token: str):
+    """
+    Public key for an asymmetric token, from the cached JWKS (blocking:
+    fetches the key set when it is missing or expired).
+
+    An unknown kid refetches the key set at most once per
+    JWKS_REFETCH_INTERVAL_S, so tokens with made-up kids cannot each
+    trigger a fetch.
+    """
+    global _jwks_refetched_at
+
+    jwks_client = _get_jwks_client()
+    if jwks_client is None:
+        raise LocalVerificationUnavailable("No JWKS URL configured")
+
+    kid = jwt.get_unverified_header(token).get("kid")
+
+    try:
+        with _jwks_lock:
+            signing_key = jwks_client.match_kid(jwks_client.get_signing_keys(), kid)
+
+            now = time.monotonic()
+            if signing_key is None and (
+                _jwks_refetched_at is None or now - _jwks_refetched_at >= JWKS_REFETCH_INTERVAL_S
+            ):
+                _jwks_refetched_at = now
+                signing_key = jwks_client.match_kid(jwks_client.get_signing_keys(refresh=True), kid)
+
+    except jwt.PyJWKClientError as e:
+        raise LocalVerificationUnavailable(str(e))
+
+    if signing_key is None:
+        raise LocalVerificationUnavailable(f"No signing key matches kid {kid!r}")
+    return signing_key.key
+
+
+def _claims_to_user(claims: dict) -> dict:
+    """
+    Maps verified JWT claims to the same shape /auth/v1/user returns
+    for the fields the API relies on.
+    """
+    return {
+        "id": claims["sub"],
+        "email": claims.get("email"),
+        "role": claims.get("role"),
+        "app_metadata": claims.get("app_metadata", {}),
+        "user_metadata": claims.get("user_metadata", {}),
+    }
+
+
+def verify_token_locally(token: str) -> dict:
+    """
+    Verifies the token signature, expiry and audience without a network call.
+
+    - HS256 tokens are checked against SUPABASE_JWT_SECRET.
+    - Asymmetric tokens (RS256 / ES256) are checked against the cached JWKS.
+
+    Raises jwt.InvalidTokenError for bad tokens and
+    LocalVerificationUnavailable when no suitable key is configured.
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+
+    if algorithm == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET is not configured")
+        key = SUPABASE_JWT_SECRET
+
+    elif algorithm in ("RS256", "ES256"):
+        key = _get_signing_key(token)
+
+    else:
+        raise jwt.InvalidTokenError(f"Unsupported token algorithm: {algorithm}")
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+# ---------------------------------
+# Remote Introspection (fallback)
+# ---------------------------------
+
+def introspect_token_remotely(token: str):
+    """
+    Asks Supabase who the token belongs to. Returns the user dict or None.
+    """
+    key = _token_key(token)
+    cached = _REMOTE_CACHE.get(key)
+    if cached is not None:
+        return cached
 
     resp = requests.get(
+        f"{SUPABASE_URL}/auth/v1/user",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "apikey": SUPABASE_ANON_KEY
+        },
+        timeout=5
+    )
+
+    if resp.status_code != 200:
+        return None
+
+    user = resp.json()
+    _REMOTE_CACHE.set(key, user)
+    return user
+
+
+_async_http_client = None
+
+
+async def introspect_token_remotely_async(token: str):
+    """
+    Async counterpart of introspect_token_remotely (shares its cache).
+    """
+    global _async_http_client
+
+    key = _token_key(token)
+    cached = _REMOTE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(timeout=5)
+
+    resp = await _async_http_client.get(
         f"{SUPABASE_URL}/auth/v1/user",
         headers={
             "Authorization": f"Bearer {token}",
@@ -22,9 +209,84 @@ def get_current_user(
     )
 
     if resp.status_code != 200:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
+        return None
+
+    user = resp.json()
+    _REMOTE_CACHE.set(key, user)
+    return user
+
+
+# ---------------------------------
+# FastAPI Dependency
+# ---------------------------------
 
-    return resp.json()
+def _unauthorized():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token"
+    )
+
+
+def authenticate_token_locally(token: str) -> dict:
+    """
+    Resolves a bearer token to a user dict without any network call.
+
+    Verified claims are cached per token until the token expires (bounded
+    by TOKEN_CACHE_MAX_TTL_S), so repeat requests cost a dict lookup.
+
+    Raises LocalVerificationUnavailable if the token needs remote introspection.
+    """
+    key = _token_key(token)
+
+    cached = _TOKEN_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        claims = verify_token_locally(token)
+    except jwt.InvalidTokenError:
+        raise _unauthorized()
+    except LocalVerificationUnavailable:
+        if not AUTH_REMOTE_FALLBACK:
+            raise _unauthorized()
+        raise
+
+    user = _claims_to_user(claims)
+    _TOKEN_CACHE.set(key, user, ttl_s=min(claims["exp"] - time.time(), TOKEN_CACHE_MAX_TTL_S))
+    return user
+
+
+def authenticate_token(token: str) -> dict:
+    try:
+        return authenticate_token_locally(token)
+    except LocalVerificationUnavailable:
+        user = introspect_token_remotely(token)
+
+    if user is None:
+        raise _unauthorized()
+    return user
+
+
+async def authenticate_token_async(token: str) -> dict:
+    # Cache hits stay on the event loop; verification may fetch the JWKS
+    # (blocking I/O), so it runs in a worker thread
+    cached = _TOKEN_CACHE.get(_token_key(token))
+    if cached is not None:
+        return cached
+
+    try:
+        return await asyncio.to_thread(authenticate_token_locally, token)
+    except LocalVerificationUnavailable:
+        user = await introspect_token_remotely_async(token)
+
+    if user is None:
+        raise _unauthorized()
+    return user
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    # async dependency: cached tokens never occupy a threadpool slot
+    with span("auth"):
+        return await authenticate_token_async(credentials.credentials)
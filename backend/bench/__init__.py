@@ -0,0 +1,3 @@
+"""
+Reproducible benchmarks for the WhareIQ query pipeline (see bench/run.py).
+"""
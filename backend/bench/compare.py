@@ -0,0 +1,83 @@
+"""
+Compares two bench.run result files stage by stage.
+
+    python -m bench.compare baseline.json candidate.json [--fail-above 10]
+
+Exits non-zero when any stage's p50 regressed by more than --fail-above
+percent (if given).
+"""
+
+import argparse
+import json
+import sys
+
+
+COLUMNS = ("p50_us", "p99_us", "alloc_peak_bytes_p50")
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return 100.0 * (new - old) / old
+
+
+def compare(baseline: dict, candidate: dict) -> dict:
+    """
+    {stage: {column: {"baseline", "candidate", "change_pct"}}} for stages in both runs.
+    """
+    result = {}
+    for stage, old in baseline["stages"].items():
+        new = candidate["stages"].get(stage)
+        if new is None:
+            continue
+        result[stage] = {
+            column: {
+                "baseline": old.get(column),
+                "candidate": new.get(column),
+                "change_pct": _change(old.get(column), new.get(column)),
+            }
+            for column in COLUMNS
+        }
+    return result
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:,.1f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two WhareIQ benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--fail-above", type=float, help="max allowed p50 regression in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    diff = compare(baseline, candidate)
+
+    print(f"{'stage':<22}" + "".join(f"{c:>34}" for c in COLUMNS))
+    regressions = []
+    for stage, columns in diff.items():
+        cells = []
+        for column in COLUMNS:
+            c = columns[column]
+            change = "" if c["change_pct"] is None else f" ({c['change_pct']:+.1f}%)"
+            cells.append(f"{_fmt(c['baseline'])} → {_fmt(c['candidate'])}{change}")
+        print(f"{stage:<22}" + "".join(f"{cell:>34}" for cell in cells))
+
+        change = columns["p50_us"]["change_pct"]
+        if args.fail_above is not None and change is not None and change > args.fail_above:
+            regressions.append(stage)
+
+    if regressions:
+        print(f"\nRegressed by more than {args.fail_above}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
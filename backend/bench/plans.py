@@ -0,0 +1,155 @@
+import copy
+import datetime
+import json
+import random
+from pathlib import Path
+
+from jsonschema import validators
+from jsonschema.exceptions import best_match
+
+from bench.star_schema import (
+    StarSchemaSpec, attribute_column, fact_dimensions, measure_column,
+)
+
+
+# ---------------------------------
+# Semantic Plan Corpus
+# ---------------------------------
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "specs" / "semantic_plan.schema.json"
+
+OPERATIONS = ("sum", "avg", "count", "min", "max", "distinct_count")
+
+TIME_RANGES = (
+    None,
+    {"type": "this_month"},
+    {"type": "this_year"},
+    {"type": "last_month"},
+    {"type": "last_year"},
+    {"type": "relative_days", "last_n_days": 30},
+    {"type": "relative_days", "last_n_days": 90},
+    {"type": "relative_months", "last_n_months": 6},
+    {"type": "absolute_range", "start_date": "2024-01-01", "end_date": "2024-06-30"},
+)
+
+TIME_GRAINS = ("day", "week", "month", "quarter", "year")
+
+# Attribute values are 'v0' .. 'v<cardinality - 1>' (see star_schema.ddl_statements)
+FILTERS = (
+    ("=", "v3"),
+    ("!=", "v0"),
+    ("in", "v1, v7, v12"),
+    ("not_in", "v2, v4"),
+    ("like", "v1%"),
+)
+
+
+def generate_plan_corpus(spec: StarSchemaSpec, count: int, seed: int = None) -> dict:
+    """
+    Deterministic {question: planner output} corpus over the synthetic schema.
+
+    Each plan aggregates 1-2 measures of one fact table, grouped by 0-2
+    attributes of the dimension tables that fact references; some plans
+    also filter on an attribute, rank by their first measure, or bucket
+    by a time grain (gap-filled when they have no dimensions).
+    """
+    rng = random.Random(spec.seed if seed is None else seed)
+    corpus = {}
+
+    for n in range(count):
+        j = rng.randrange(spec.fact_tables)
+
+        measures = [
+            {"name": measure_column(j, m), "operation": rng.choice(OPERATIONS)}
+            for m in rng.sample(range(spec.measures_per_fact), rng.randint(1, min(2, spec.measures_per_fact)))
+        ]
+
+        dimensions = []
+        for _ in range(rng.randint(0, 2)):
+            i = rng.choice(fact_dimensions(spec, j))
+            name = attribute_column(i, rng.randrange(spec.attributes_per_dimension))
+            if name not in dimensions:
+                dimensions.append(name)
+
+        filters = []
+        if rng.random() < 0.4:
+            i = rng.choice(fact_dimensions(spec, j))
+            operator, value = rng.choice(FILTERS)
+            filters.append({
+                "field": attribute_column(i, rng.randrange(spec.attributes_per_dimension)),
+                "operator": operator,
+                "value": value,
+            })
+
+        sorting = []
+        if rng.random() < 0.5:
+            sorting.append({"field": measures[0]["name"], "direction": "desc"})
+
+        time_range = copy.deepcopy(rng.choice(TIME_RANGES))
+        time_grain = rng.choice(TIME_GRAINS) if rng.random() < 0.25 else None
+
+        plan = {
+            "intent_type": "trend" if time_grain else "ranking" if sorting else "aggregation",
+            "measures": measures,
+            "dimensions": dimensions,
+            "time_range": time_range,
+            "time_grain": time_grain,
+            "fill_gaps": bool(time_grain and time_range and not dimensions),
+            "filters": filters,
+            "sorting": sorting,
+            "limit": rng.choice((10, 50, 100, 500)),
+            "confidence_level": "high",
+        }
+
+        question = (
+            f"q{n}: " + ", ".join(f"{m['operation']} of {m['name']}" for m in measures)
+            + (" by " + ", ".join(dimensions) if dimensions else "")
+        )
+        corpus[question] = {"needs_clarification": False, "clarification_question": None, "plan": plan}
+
+    return corpus
+
+
+def save_corpus(corpus: dict, path: str):
+    with open(path, "w") as f:
+        json.dump({"recorded_at": datetime.datetime.now().isoformat(), "plans": corpus}, f, indent=2)
+
+
+def load_corpus(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)["plans"]
+
+
+# ---------------------------------
+# Recorded-Plan LLM Stub
+# ---------------------------------
+
+class RecordedPlanLLM:
+    """
+    Stand-in for llm.UniversalLLM that replays recorded planner outputs,
+    so benchmarks run offline and deterministically.
+
+    Recorded plans are validated against the semantic plan JSON schema on
+    every call, like real LLM output.
+    """
+
+    def __init__(self, recordings: dict):
+        self.recordings = recordings
+
+        with open(SCHEMA_PATH, "r") as f:
+            self.schema = json.load(f)
+        # Compiled once, as llm.PLAN_VALIDATOR is
+        self.validator = validators.validator_for(self.schema)(self.schema)
+
+    def generate_plan(self, question: str, catalog_version: str = None) -> dict:
+        if question not in self.recordings:
+            raise ValueError(f"No recorded plan for question: {question}")
+
+        plan = copy.deepcopy(self.recordings[question])
+        error = best_match(self.validator.iter_errors(plan))
+        if error is not None:
+            raise error
+        return plan
+
+    async def agenerate_plan(self, question: str, catalog_version: str = None, tenant: str = None) -> dict:
+        return self.generate_plan(question, catalog_version)
@@ -0,0 +1,342 @@
+"""
+Pipeline benchmark: replays a corpus of semantic plans through the
+planning → SQL → execution stages and reports per-stage latency
+percentiles and allocations as JSON.
+
+Run from backend/:
+
+    python -m bench.run --plans 200 --iterations 5 --output bench_results.json
+    python -m bench.run --mode live --create-schema --fact-rows 1000000
+    python -m bench.compare baseline.json bench_results.json
+
+Modes:
+  offline  synthetic schema and catalog in memory; no database or LLM
+  live     creates the synthetic star schema in the Postgres configured
+           by POSTGRES_* (use a scratch database) and executes the SQL
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import fields
+
+from cryptography.fernet import Fernet
+
+# crypto.py needs a key at import time; benchmarks never decrypt anything
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+
+from bench.plans import RecordedPlanLLM, generate_plan_corpus, load_corpus, save_corpus  # noqa: E402
+from bench.star_schema import (  # noqa: E402
+    StarSchemaSpec, TABLE_PREFIX, attribute_cardinalities, build_physical_schema,
+    build_semantic_mappings, create_star_schema,
+)
+from measure_resolver import resolve_measures  # noqa: E402
+from dimension_resolver import resolve_dimensions  # noqa: E402
+from join_resolver import build_join_plan  # noqa: E402
+from time_filter_resolver import resolve_time_filter  # noqa: E402
+from filter_resolver import resolve_filters  # noqa: E402
+from sql_builder import build_query  # noqa: E402
+from limit_enforcer import enforce_query_limit  # noqa: E402
+from allowlist_validator import validate_query_allowlist  # noqa: E402
+from sql_validator import validate_sql  # noqa: E402
+from rollup_manager import define_rollups, refresh_rollup, route_to_rollup  # noqa: E402
+from schema_reader import SCHEMA_CACHE, INTERNAL_SCHEMA_KEY, load_physical_schema  # noqa: E402
+from semantic_catalog import SemanticCatalog, set_semantic_catalog  # noqa: E402
+from secure_executor import DEFAULT_MAX_LIMIT, DEFAULT_TIMEOUT_MS  # noqa: E402
+from query_timeout import execute_with_timeout  # noqa: E402
+from db import get_db_connection, release_db_connection  # noqa: E402
+
+
+STAGES = (
+    "llm_stub",
+    "resolve_measures",
+    "resolve_dimensions",
+    "resolve_filters",
+    "build_join_plan",
+    "resolve_time_filter",
+    "build_query",
+    "enforce_limit",
+    "allowlist",
+    "rollup_routing",
+    "render",
+    "validate_sql",
+    "execution",
+    "total",
+)
+
+
+# ---------------------------------
+# Setup
+# ---------------------------------
+
+def setup_offline(spec: StarSchemaSpec, use_rollups: bool):
+    """
+    Installs the synthetic schema and catalog in the process caches.
+    Returns the rollups to route to ([(RollupDefinition, refreshed_at)]).
+    """
+    physical_schema = build_physical_schema(spec)
+
+    # Never revalidate against a database: the primed schema is the truth
+    SCHEMA_CACHE.check_interval_s = float("inf")
+    SCHEMA_CACHE.prime(INTERNAL_SCHEMA_KEY, physical_schema, fingerprint="bench")
+
+    catalog = SemanticCatalog(build_semantic_mappings(physical_schema))
+    set_semantic_catalog(catalog)
+
+    if not use_rollups:
+        return []
+
+    now = time.time()
+    definitions = define_rollups(catalog, physical_schema, attribute_cardinalities(spec))
+    return [(rollup, now) for rollup in definitions]
+
+
+def setup_live(spec: StarSchemaSpec, create_schema: bool, use_rollups: bool):
+    """
+    Optionally (re)creates the star schema, then builds the catalog from
+    the introspected bench tables.
+    """
+    if create_schema:
+        conn = get_db_connection()
+        try:
+            create_star_schema(conn, spec)
+        finally:
+            release_db_connection(conn)
+
+    physical_schema = load_physical_schema(force_refresh=True)
+    bench_schema = {t: meta for t, meta in physical_schema.items() if t.startswith(TABLE_PREFIX)}
+    if not bench_schema:
+        raise ValueError("No bench tables found; run with --create-schema first")
+
+    catalog = SemanticCatalog(build_semantic_mappings(bench_schema))
+    set_semantic_catalog(catalog)
+
+    if not use_rollups:
+        return []
+
+    rollups = []
+    for rollup in define_rollups(catalog, physical_schema):
+        refresh_rollup(rollup)
+        rollups.append((rollup, time.time()))
+    return rollups
+
+
+# ---------------------------------
+# Pipeline Replay
+# ---------------------------------
+
+def run_plan(llm, question: str, rollups: list, execute: bool, measure):
+    """
+    Runs one question through every stage; measure(stage, fn) times fn().
+    """
+    semantic_plan = measure("llm_stub", lambda: llm.generate_plan(question))
+    plan = semantic_plan["plan"]
+
+    measures = measure("resolve_measures", lambda: resolve_measures(plan))
+    dimensions = measure("resolve_dimensions", lambda: resolve_dimensions(plan))
+    filters = measure("resolve_filters", lambda: resolve_filters(plan, measures))
+    join_plan = measure(
+        "build_join_plan", lambda: build_join_plan(measures, dimensions, filter_tables=filters["tables"])
+    )
+    measure("resolve_time_filter", lambda: resolve_time_filter(plan, join_plan["base_table"]))
+
+    query = measure("build_query", lambda: build_query(plan))
+    query = measure("enforce_limit", lambda: enforce_query_limit(query, max_limit=DEFAULT_MAX_LIMIT))
+    measure("allowlist", lambda: validate_query_allowlist(query))
+    query = measure("rollup_routing", lambda: route_to_rollup(query, rollups) or query)
+
+    sql, params = measure("render", query.render)
+    measure("validate_sql", lambda: validate_sql(sql))
+
+    if execute:
+        measure("execution", lambda: execute_with_timeout(sql, timeout_ms=DEFAULT_TIMEOUT_MS, params=params))
+
+
+def replay(llm, questions: list, rollups: list, execute: bool, iterations: int, trace_allocations: bool):
+    """
+    Returns ({stage: [ns, ...]}, {stage: [(peak bytes, retained bytes), ...]}, {error: count}).
+    """
+    timings = {stage: [] for stage in STAGES}
+    allocations = {stage: [] for stage in STAGES}
+    errors = {}
+
+    def timed(stage, fn):
+        start = time.perf_counter_ns()
+        result = fn()
+        timings[stage].append(time.perf_counter_ns() - start)
+        return result
+
+    def traced(stage, fn):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        allocations[stage].append((peak - before, current - before))
+        return result
+
+    def run_all(measure, record_total):
+        for question in questions:
+            start = time.perf_counter_ns()
+            try:
+                run_plan(llm, question, rollups, execute, measure)
+            except Exception as e:
+                key = f"{type(e).__name__}: {e}"
+                errors[key] = errors.get(key, 0) + 1
+                continue
+            if record_total:
+                timings["total"].append(time.perf_counter_ns() - start)
+
+    for _ in range(iterations):
+        run_all(timed, record_total=True)
+
+    # Allocations are measured in a separate pass: tracemalloc skews timings
+    if trace_allocations:
+        tracemalloc.start()
+        try:
+            run_all(traced, record_total=False)
+        finally:
+            tracemalloc.stop()
+
+    return timings, allocations, errors
+
+
+# ---------------------------------
+# Report
+# ---------------------------------
+
+def percentile(sorted_values: list, pct: float):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(timings: dict, allocations: dict) -> dict:
+    """
+    {stage: percentiles (and allocation stats)} for every stage in timings
+    that has samples, in timings order.
+    """
+    stages = {}
+
+    for stage in timings:
+        values = sorted(timings[stage])
+        if not values:
+            continue
+
+        summary = {
+            "count": len(values),
+            "p50_us": percentile(values, 50) / 1000.0,
+            "p90_us": percentile(values, 90) / 1000.0,
+            "p99_us": percentile(values, 99) / 1000.0,
+            "mean_us": statistics.fmean(values) / 1000.0,
+            "max_us": values[-1] / 1000.0,
+        }
+
+        allocs = allocations.get(stage)
+        if allocs:
+            peaks = sorted(peak for peak, _ in allocs)
+            summary["alloc_peak_bytes_p50"] = percentile(peaks, 50)
+            summary["alloc_peak_bytes_max"] = peaks[-1]
+            summary["retained_bytes_mean"] = statistics.fmean(retained for _, retained in allocs)
+
+        stages[stage] = summary
+
+    return stages
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+# ---------------------------------
+# CLI
+# ---------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="WhareIQ pipeline benchmark")
+    parser.add_argument("--mode", choices=("offline", "live"), default="offline")
+    parser.add_argument("--plans", type=int, default=200, help="corpus size (ignored with --corpus)")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes over the corpus")
+    parser.add_argument("--corpus", help="replay a recorded corpus (JSON) instead of generating one")
+    parser.add_argument("--record", help="save the generated corpus to this path")
+    parser.add_argument("--rollups", action="store_true", help="route queries to daily rollups")
+    parser.add_argument("--create-schema", action="store_true", help="live mode: (re)create the bench tables")
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+
+    for field in fields(StarSchemaSpec):
+        parser.add_argument("--" + field.name.replace("_", "-"), type=int, default=field.default)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    spec = StarSchemaSpec(**{field.name: getattr(args, field.name) for field in fields(StarSchemaSpec)})
+
+    if args.mode == "offline":
+        rollups = setup_offline(spec, args.rollups)
+    else:
+        rollups = setup_live(spec, args.create_schema, args.rollups)
+
+    corpus = load_corpus(args.corpus) if args.corpus else generate_plan_corpus(spec, args.plans)
+    if args.record:
+        save_corpus(corpus, args.record)
+
+    llm = RecordedPlanLLM(corpus)
+    questions = list(corpus)
+    execute = args.mode == "live"
+
+    if args.warmup:
+        replay(llm, questions, rollups, execute, args.warmup, trace_allocations=False)
+
+    timings, allocations, errors = replay(
+        llm, questions, rollups, execute, args.iterations, trace_allocations=not args.no_allocations
+    )
+
+    result = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": args.mode,
+            "spec": spec.to_dict(),
+            "plans": len(questions),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "rollups": len(rollups),
+        },
+        "stages": summarize(timings, allocations),
+        "errors": errors,
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,158 @@
+"""
+Response serialization benchmark: encodes a synthetic aggregate result
+with each /query response format and reports latency percentiles and
+body size per encoder as JSON, in bench.run's format (bench.compare
+works on the output).
+
+Run from backend/:
+
+    python -m bench.serialization --rows 1000 --iterations 500
+    python -m bench.serialization --rows 1000 --output serialization.json
+
+Encoders:
+  rows_fastapi  the default "rows" response: jsonable_encoder + JSONResponse
+  rows_orjson   the same row layout through result_stream.dumps_json
+  columnar      format="columnar"
+  arrow         format="arrow" (needs pyarrow)
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from bench.run import git_commit, summarize
+from result_stream import arrow_available, dumps_json, encode_arrow_result, encode_columnar, orjson
+
+
+COLUMNS = ["city", "period", "revenue", "orders", "average_order_value"]
+
+
+# ---------------------------------
+# Synthetic Result
+# ---------------------------------
+
+def build_result(row_count: int, seed: int):
+    """
+    (columns, rows, response fields) shaped like a /query aggregate:
+    text and date dimensions, numeric sums, bigint counts and an
+    unconstrained numeric average.
+    """
+    rng = random.Random(seed)
+    start = datetime.date(2024, 1, 1)
+
+    rows = []
+    for n in range(row_count):
+        orders = rng.randint(1, 5000)
+        revenue = Decimal(rng.randint(100, 10_000_000)).scaleb(-2)
+        rows.append((
+            f"city_{n % 250}",
+            start + datetime.timedelta(days=n // 250),
+            revenue,
+            orders,
+            revenue / orders,  # 28 significant digits, like AVG(numeric)
+        ))
+
+    fields = {
+        "answer": f"{row_count} rows",
+        "sql": "SELECT ... GROUP BY users.city, period LIMIT %s",
+        "params": ("2024-01-01", "2024-02-01"),
+        "cache": {"hit": False, "ttl_s": 300},
+        "cost": {"total_cost": 1234.5, "plan_rows": row_count, "decision": "ok"},
+    }
+    return COLUMNS, rows, fields
+
+
+def encoders(columns: list, rows: list, fields: dict) -> dict:
+    """
+    {name: fn() → response body bytes}
+    """
+    result = dict(fields, rows=rows)
+
+    available = {
+        "rows_fastapi": lambda: JSONResponse(content=jsonable_encoder(result)).body,
+        "rows_orjson": lambda: dumps_json(result),
+        "columnar": lambda: encode_columnar(fields, columns, rows),
+    }
+    if arrow_available():
+        metadata = {"sql": fields["sql"], "answer": fields["answer"]}
+        available["arrow"] = lambda: encode_arrow_result(columns, rows, metadata)
+    return available
+
+
+def run(encode_fns: dict, iterations: int, warmup: int):
+    """
+    Returns ({encoder: [ns, ...]}, {encoder: body bytes}).
+    """
+    timings = {name: [] for name in encode_fns}
+    sizes = {}
+
+    for name, fn in encode_fns.items():
+        for _ in range(warmup):
+            fn()
+        for _ in range(iterations):
+            start = time.perf_counter_ns()
+            body = fn()
+            timings[name].append(time.perf_counter_ns() - start)
+        sizes[name] = len(body)
+
+    return timings, sizes
+
+
+# ---------------------------------
+# CLI
+# ---------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="WhareIQ response serialization benchmark")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    columns, rows, fields = build_result(args.rows, args.seed)
+
+    timings, sizes = run(encoders(columns, rows, fields), args.iterations, args.warmup)
+
+    stages = summarize(timings, {})
+    for name, size in sizes.items():
+        stages[name]["body_bytes"] = size
+
+    result = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows": args.rows,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "orjson": orjson is not None,
+        },
+        "stages": stages,
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,227 @@
+from dataclasses import asdict, dataclass
+
+from logical_domain_detector import build_logical_domain_map
+from measure_auto_mapper import build_measure_map
+from dimension_auto_mapper import build_dimension_map
+
+
+# ---------------------------------
+# Synthetic Star Schema
+# ---------------------------------
+#
+# Fact tables reference `fanout` dimension tables each (round-robin), so
+# the join graph is connected and every fact has a different neighbourhood.
+# Column names are unique per table, so the auto-mapped logical names are
+# unambiguous and every plan in the corpus resolves.
+
+TABLE_PREFIX = "bench_"
+
+
+@dataclass(frozen=True)
+class StarSchemaSpec:
+    fact_tables: int = 2
+    dimension_tables: int = 6
+    measures_per_fact: int = 4
+    attributes_per_dimension: int = 4
+    fanout: int = 3
+    fact_rows: int = 100000
+    dimension_rows: int = 1000
+    attribute_cardinality: int = 50
+    seed: int = 42
+
+    def __post_init__(self):
+        if self.fanout > self.dimension_tables:
+            raise ValueError("fanout cannot exceed the number of dimension tables")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def fact_table(j: int) -> str:
+    return f"{TABLE_PREFIX}fact_{j}"
+
+
+def dimension_table(i: int) -> str:
+    return f"{TABLE_PREFIX}dim_{i}"
+
+
+def measure_column(j: int, m: int) -> str:
+    return f"f{j}_metric_{m}"
+
+
+def attribute_column(i: int, k: int) -> str:
+    return f"d{i}_attr_{k}"
+
+
+def fact_dimensions(spec: StarSchemaSpec, j: int) -> list:
+    """
+    Dimension table indexes fact j references.
+    """
+    return [(j + k) % spec.dimension_tables for k in range(spec.fanout)]
+
+
+def _index(name: str, columns: list, unique: bool = False) -> dict:
+    return {"name": name, "method": "btree", "unique": unique, "partial": False, "columns": columns}
+
+
+def build_physical_schema(spec: StarSchemaSpec) -> dict:
+    """
+    The synthetic schema in schema_reader.load_physical_schema() format.
+    """
+    schema = {}
+
+    for i in range(spec.dimension_tables):
+        columns = {"id": "integer"}
+        columns.update({attribute_column(i, k): "text" for k in range(spec.attributes_per_dimension)})
+        schema[dimension_table(i)] = {
+            "schema": "public",
+            "columns": columns,
+            "primary_key": ["id"],
+            "foreign_keys": {},
+            "foreign_key_constraints": [],
+            "indexes": [_index(f"{dimension_table(i)}_pkey", ["id"], unique=True)],
+            "partition_key": None,
+            "partitions": [],
+        }
+
+    for j in range(spec.fact_tables):
+        table = fact_table(j)
+        columns = {"id": "bigint", "created_at": "timestamp without time zone"}
+        foreign_keys = {}
+        constraints = []
+
+        for i in fact_dimensions(spec, j):
+            fk_column = f"{dimension_table(i)}_id"
+            columns[fk_column] = "integer"
+            foreign_keys[fk_column] = {"references_table": dimension_table(i), "references_column": "id"}
+            constraints.append({
+                "name": f"{table}_{fk_column}_fkey",
+                "columns": [fk_column],
+                "references_table": dimension_table(i),
+                "references_columns": ["id"],
+            })
+
+        columns.update({measure_column(j, m): "numeric" for m in range(spec.measures_per_fact)})
+
+        schema[table] = {
+            "schema": "public",
+            "columns": columns,
+            "primary_key": ["id"],
+            "foreign_keys": foreign_keys,
+            "foreign_key_constraints": constraints,
+            "indexes": [
+                _index(f"{table}_created_at_idx", ["created_at"]),
+                _index(f"{table}_pkey", ["id"], unique=True),
+            ],
+            "partition_key": None,
+            "partitions": [],
+        }
+
+    return schema
+
+
+def build_semantic_mappings(physical_schema: dict) -> dict:
+    """
+    Runs the production classifiers / auto-mappers over the schema and
+    returns mappings in semantic_storage.load_semantic_mappings() format.
+    """
+    logical_schema = build_logical_domain_map(physical_schema)
+    measure_map = build_measure_map(logical_schema)
+    dimension_map = build_dimension_map(logical_schema)
+
+    return {
+        table: {
+            "table_domain": meta["table_domain"],
+            "dimensions": dimension_map.get(table, {}),
+            "measures": measure_map.get(table, {}),
+            "technical_fields": meta["technical_fields"],
+            "ignored_fields": meta["ignored_fields"],
+        }
+        for table, meta in logical_schema.items()
+    }
+
+
+def attribute_cardinalities(spec: StarSchemaSpec) -> dict:
+    """
+    {(table, column): distinct values}, as rollup_manager.define_rollups expects.
+    """
+    return {
+        (dimension_table(i), attribute_column(i, k)): spec.attribute_cardinality
+        for i in range(spec.dimension_tables)
+        for k in range(spec.attributes_per_dimension)
+    }
+
+
+# ---------------------------------
+# Live Postgres
+# ---------------------------------
+
+def ddl_statements(spec: StarSchemaSpec) -> list:
+    """
+    Statements that (re)create and load the schema in Postgres.
+    Data is deterministic for a given spec (setseed + generate_series).
+    """
+    physical_schema = build_physical_schema(spec)
+    statements = [f"SELECT setseed({(spec.seed % 1000) / 1000.0});"]
+
+    for table in sorted(physical_schema, reverse=True):  # facts before dimensions
+        statements.append(f"DROP TABLE IF EXISTS {table} CASCADE;")
+
+    for i in range(spec.dimension_tables):
+        table = dimension_table(i)
+        attributes = [attribute_column(i, k) for k in range(spec.attributes_per_dimension)]
+        statements.append(
+            f"CREATE TABLE {table} (id integer PRIMARY KEY"
+            + "".join(f", {a} text" for a in attributes) + ");"
+        )
+        values = "".join(
+            f", 'v' || ((g * {k + 7}) % {spec.attribute_cardinality})" for k in range(len(attributes))
+        )
+        statements.append(
+            f"INSERT INTO {table} SELECT g{values} FROM generate_series(1, {spec.dimension_rows}) AS g;"
+        )
+
+    for j in range(spec.fact_tables):
+        table = fact_table(j)
+        meta = physical_schema[table]
+        fk_columns = [fk["columns"][0] for fk in meta["foreign_key_constraints"]]
+        measures = [measure_column(j, m) for m in range(spec.measures_per_fact)]
+
+        statements.append(
+            f"CREATE TABLE {table} (id bigint PRIMARY KEY, created_at timestamp without time zone NOT NULL"
+            + "".join(f", {c} integer NOT NULL" for c in fk_columns)
+            + "".join(f", {m} numeric" for m in measures) + ");"
+        )
+        statements.append(
+            f"INSERT INTO {table} SELECT g, "
+            f"now()::timestamp - (g % 730) * interval '1 day' - random() * interval '1 day'"
+            + "".join(f", 1 + floor(random() * {spec.dimension_rows})::int" for _ in fk_columns)
+            + "".join(", round((random() * 1000)::numeric, 2)" for _ in measures)
+            + f" FROM generate_series(1, {spec.fact_rows}) AS g;"
+        )
+
+        for fk in meta["foreign_key_constraints"]:
+            statements.append(
+                f"ALTER TABLE {table} ADD CONSTRAINT {fk['name']} FOREIGN KEY ({fk['columns'][0]}) "
+                f"REFERENCES {fk['references_table']} (id);"
+            )
+        statements.append(f"CREATE INDEX {table}_created_at_idx ON {table} (created_at);")
+
+    statements.append("ANALYZE;")
+    return statements
+
+
+def create_star_schema(conn, spec: StarSchemaSpec):
+    """
+    Creates and loads the schema on conn (a psycopg2 connection) and commits.
+    """
+    cursor = conn.cursor()
+    try:
+        for statement in ddl_statements(spec):
+            cursor.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
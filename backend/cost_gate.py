@@ -0,0 +1,327 @@
+import asyncio
+import json
+import os
+import threading
+
+from psycopg import AsyncClientCursor
+
+from db import get_db_connection, release_db_connection
+from metrics import span
+from ttl_cache import TTLCache
+
+
+# ---------------------------------
+# Cost Budgets (PostgreSQL planner cost units)
+# ---------------------------------
+
+# Above the soft budget a query waits for a slot on the heavy lane;
+# above the hard budget it is rejected before it reaches the warehouse
+COST_SOFT_BUDGET = float(os.getenv("COST_SOFT_BUDGET", "100000"))
+COST_HARD_BUDGET = float(os.getenv("COST_HARD_BUDGET", "10000000"))
+
+HEAVY_LANE_CONCURRENCY = int(os.getenv("COST_HEAVY_LANE_CONCURRENCY", "2"))
+HEAVY_LANE_WAIT_S = float(os.getenv("COST_HEAVY_LANE_WAIT_S", "10"))
+
+COST_ESTIMATE_TTL_S = 300.0
+MAX_PLAN_NODES = 50
+
+# tenant -> (soft, hard); tenants without an entry use the defaults
+_TENANT_BUDGETS = {}
+
+
+def set_tenant_budget(tenant: str, soft: float, hard: float):
+    if soft > hard:
+        raise ValueError("Soft cost budget cannot exceed the hard budget")
+    _TENANT_BUDGETS[tenant] = (soft, hard)
+
+
+def load_tenant_budgets(raw: str) -> int:
+    """
+    Loads per-tenant budgets from a JSON object keyed by user id (or
+    "internal" for WhareIQ's own database):
+
+        {"<user id>": {"soft": 50000, "hard": 2000000}, "internal": {"hard": 1e8}}
+
+    A missing soft or hard value falls back to COST_SOFT_BUDGET /
+    COST_HARD_BUDGET. Returns the number of budgets loaded.
+    """
+    try:
+        budgets = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"COST_TENANT_BUDGETS is not valid JSON: {e}")
+
+    if not isinstance(budgets, dict):
+        raise ValueError("COST_TENANT_BUDGETS must be a JSON object keyed by tenant")
+
+    for tenant, budget in budgets.items():
+        if not isinstance(budget, dict):
+            raise ValueError(f"Cost budget for '{tenant}' must be an object with soft / hard")
+        set_tenant_budget(
+            tenant,
+            float(budget.get("soft", COST_SOFT_BUDGET)),
+            float(budget.get("hard", COST_HARD_BUDGET)),
+        )
+
+    return len(budgets)
+
+
+# Per-tenant overrides: inline JSON in COST_TENANT_BUDGETS, or a JSON file
+# at COST_TENANT_BUDGETS_FILE (both may be set; inline entries win)
+if os.getenv("COST_TENANT_BUDGETS_FILE"):
+    with open(os.environ["COST_TENANT_BUDGETS_FILE"]) as f:
+        load_tenant_budgets(f.read())
+if os.getenv("COST_TENANT_BUDGETS"):
+    load_tenant_budgets(os.environ["COST_TENANT_BUDGETS"])
+
+
+def get_tenant_budget(tenant: str):
+    return _TENANT_BUDGETS.get(tenant, (COST_SOFT_BUDGET, COST_HARD_BUDGET))
+
+
+class CostBudgetExceeded(ValueError):
+    """
+    Raised when a query's estimated cost is above the tenant's hard budget.
+    """
+
+    def __init__(self, message: str, estimate: dict):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+class HeavyLaneBusy(Exception):
+    """
+    Raised when a query over the soft budget cannot get a heavy-lane slot in time.
+    """
+
+
+# ---------------------------------
+# EXPLAIN Parsing
+# ---------------------------------
+
+def summarize_plan(explain_output) -> dict:
+    """
+    Turns EXPLAIN (FORMAT JSON) output into the estimate WhareIQ keeps:
+    total cost, estimated rows and a depth-first list of plan nodes.
+    """
+    if isinstance(explain_output, str):
+        explain_output = json.loads(explain_output)
+
+    root = explain_output[0]["Plan"]
+    nodes = []
+
+    def walk(node, depth):
+        if len(nodes) < MAX_PLAN_NODES:
+            nodes.append({
+                "depth": depth,
+                "node_type": node.get("Node Type"),
+                "relation": node.get("Relation Name"),
+                "startup_cost": node.get("Startup Cost"),
+                "total_cost": node.get("Total Cost"),
+                "plan_rows": node.get("Plan Rows"),
+            })
+        for child in node.get("Plans", []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+
+    return {
+        "total_cost": root.get("Total Cost"),
+        "plan_rows": root.get("Plan Rows"),
+        "nodes": nodes,
+    }
+
+
+def _most_expensive_scan(nodes: list):
+    scans = [n for n in nodes if n["relation"] is not None]
+    if not scans:
+        return None
+    return max(scans, key=lambda n: n["total_cost"] or 0)
+
+
+def explain_rejection(estimate: dict, hard_budget: float) -> str:
+    """
+    Human-readable reason for a rejected query.
+    """
+    message = (
+        f"Estimated query cost {estimate['total_cost']:,.0f} exceeds this workspace's "
+        f"budget of {hard_budget:,.0f}."
+    )
+
+    scan = _most_expensive_scan(estimate["nodes"])
+    if scan is not None:
+        message += (
+            f" Most of it comes from a {scan['node_type']} on '{scan['relation']}' "
+            f"(~{scan['plan_rows']:,} rows)."
+        )
+
+    return message + " Narrow the time range or group by fewer dimensions."
+
+
+# ---------------------------------
+# Cost Gate
+# ---------------------------------
+
+class CostGate:
+    """
+    Pre-execution cost stage.
+
+    - EXPLAIN (FORMAT JSON) is run once per (tenant, SQL, bound values)
+      and reused for COST_ESTIMATE_TTL_S. Values are part of the key:
+      time bounds and filters are parameters, and a 10-year range costs
+      far more than a 7-day one with the same SQL text.
+    - check() classifies the estimate against the tenant's budgets:
+      "ok", "heavy" (over soft: run on the heavy lane) or raises
+      CostBudgetExceeded (over hard).
+    """
+
+    def __init__(self, ttl_s: float = COST_ESTIMATE_TTL_S, heavy_lane_concurrency: int = HEAVY_LANE_CONCURRENCY):
+        self._estimates = TTLCache(maxsize=4096, ttl_s=ttl_s)
+        self.heavy_lane_concurrency = heavy_lane_concurrency
+
+        self._async_heavy_lane = None
+        self._heavy_lane = threading.BoundedSemaphore(heavy_lane_concurrency)
+
+    # -----------------------------
+    # Estimation
+    # -----------------------------
+
+    @staticmethod
+    def _key(tenant: str, sql: str, params) -> tuple:
+        return (tenant, sql, json.dumps(list(params or ()), default=str))
+
+    def lookup(self, tenant: str, sql: str, params=None):
+        """
+        Cached estimate for this SQL with these bound values, or None.
+        """
+        cached = self._estimates.get(self._key(tenant, sql, params))
+        if cached is None:
+            return None
+        return dict(cached, cached=True)
+
+    def estimate(self, cursor, tenant: str, sql: str, params=None) -> dict:
+        """
+        Sync (psycopg2) estimate; cursor binds params client-side.
+        """
+        cached = self.lookup(tenant, sql, params)
+        if cached is not None:
+            return cached
+
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        estimate = summarize_plan(cursor.fetchone()[0])
+        self._estimates.set(self._key(tenant, sql, params), estimate)
+        return dict(estimate, cached=False)
+
+    async def estimate_async(self, conn, tenant: str, sql: str, params=None) -> dict:
+        """
+        Async (psycopg 3) estimate on conn. Params are bound client-side,
+        so the planner sees the actual values.
+        """
+        cached = self.lookup(tenant, sql, params)
+        if cached is not None:
+            return cached
+
+        async with AsyncClientCursor(conn) as cur:
+            await cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            row = await cur.fetchone()
+
+        estimate = summarize_plan(row[0])
+        self._estimates.set(self._key(tenant, sql, params), estimate)
+        return dict(estimate, cached=False)
+
+    # -----------------------------
+    # Budget Check
+    # -----------------------------
+
+    def check(self, tenant: str, estimate: dict) -> dict:
+        """
+        Returns the estimate annotated with the decision and budgets, or
+        raises CostBudgetExceeded.
+        """
+        soft, hard = get_tenant_budget(tenant)
+        cost = estimate["total_cost"] or 0
+
+        decision = "ok"
+        if cost > hard:
+            decision = "rejected"
+        elif cost > soft:
+            decision = "heavy"
+
+        annotated = dict(estimate, decision=decision, budget={"soft": soft, "hard": hard})
+
+        if decision == "rejected":
+            raise CostBudgetExceeded(explain_rejection(estimate, hard), annotated)
+
+        return annotated
+
+    # -----------------------------
+    # Heavy Lane
+    # -----------------------------
+
+    def heavy_lane(self):
+        """
+        Sync context manager holding a heavy-lane slot.
+        """
+        gate = self
+
+        class _Slot:
+            def __enter__(self):
+                with span("heavy_lane_wait"):
+                    acquired = gate._heavy_lane.acquire(timeout=HEAVY_LANE_WAIT_S)
+                if not acquired:
+                    raise HeavyLaneBusy("Too many expensive queries are running. Try again shortly.")
+
+            def __exit__(self, *exc):
+                gate._heavy_lane.release()
+
+        return _Slot()
+
+    def async_heavy_lane(self):
+        """
+        Async context manager holding a heavy-lane slot.
+        """
+        if self._async_heavy_lane is None:
+            self._async_heavy_lane = asyncio.Semaphore(self.heavy_lane_concurrency)
+        semaphore = self._async_heavy_lane
+
+        class _Slot:
+            async def __aenter__(self):
+                try:
+                    with span("heavy_lane_wait"):
+                        await asyncio.wait_for(semaphore.acquire(), HEAVY_LANE_WAIT_S)
+                except asyncio.TimeoutError:
+                    raise HeavyLaneBusy("Too many expensive queries are running. Try again shortly.")
+
+            async def __aexit__(self, *exc):
+                semaphore.release()
+
+        return _Slot()
+
+    def clear(self):
+        self._estimates.clear()
+
+
+COST_GATE = CostGate()
+
+# Budget / cache key for queries on WhareIQ's own database
+INTERNAL_TENANT = "internal"
+
+
+def estimate_query_cost(sql: str, params=None, tenant: str = INTERNAL_TENANT) -> dict:
+    """
+    Estimates sql on the internal pool; only borrows a connection when
+    the estimate for these values is not cached yet.
+    """
+    cached = COST_GATE.lookup(tenant, sql, params)
+    if cached is not None:
+        return cached
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        estimate = COST_GATE.estimate(cursor, tenant, sql, params)
+        cursor.close()
+        return estimate
+    finally:
+        # EXPLAIN opened a transaction; don't hand the connection back in it
+        conn.rollback()
+        release_db_connection(conn)
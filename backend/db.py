@@ -1,9 +1,11 @@
 import psycopg2
 import psycopg2.pool
 import os
+import threading
 from dotenv import load_dotenv
 from pathlib import Path
 from crypto import decrypt
+from ttl_cache import TTLCache
 # ---------------------------------
 # Load .env from project root
 # ---------------------------------
@@ -13,15 +15,27 @@ load_dotenv(dotenv_path=ROOT_DIR / ".env")
 # ---------------------------------
 # Postgres Connection Pool
 # ---------------------------------
-DATABASE_POOL = psycopg2.pool.SimpleConnectionPool(
-    minconn=1,
-    maxconn=5,
-    host=os.getenv("POSTGRES_HOST"),
-    port=os.getenv("POSTGRES_PORT"),
-    database=os.getenv("POSTGRES_DB"),
-    user=os.getenv("POSTGRES_USER"),
-    password=os.getenv("POSTGRES_PASSWORD"),
-)
+# Created on first use, so modules that import db (resolvers, validators,
+# the benchmark harness) load without a reachable database
+_DATABASE_POOL = None
+_database_pool_lock = threading.Lock()
+
+
+def get_database_pool():
+    global _DATABASE_POOL
+    if _DATABASE_POOL is None:
+        with _database_pool_lock:
+            if _DATABASE_POOL is None:
+                _DATABASE_POOL = psycopg2.pool.SimpleConnectionPool(
+                    minconn=1,
+                    maxconn=5,
+                    host=os.getenv("POSTGRES_HOST"),
+                    port=os.getenv("POSTGRES_PORT"),
+                    database=os.getenv("POSTGRES_DB"),
+                    user=os.getenv("POSTGRES_USER"),
+                    password=os.getenv("POSTGRES_PASSWORD"),
+                )
+    return _DATABASE_POOL
 
 # ---------------------------------
 # Internal DB Alias (Semantic Clarity)
@@ -37,14 +51,14 @@ def get_internal_db_connection():
 # ---------------------------------
 def get_db_connection():
     try:
-        return DATABASE_POOL.getconn()
+        return get_database_pool().getconn()
     except Exception as e:
         raise Exception(f"Failed to get DB connection: {str(e)}")
 
 
 def release_db_connection(conn):
     if conn is not None:
-        DATABASE_POOL.putconn(conn)
+        get_database_pool().putconn(conn)
 
 
 # ---------------------------------
@@ -77,27 +91,94 @@ def execute_select(query: str, params=None):
         if conn is not None:
             release_db_connection(conn)
 
+# ---------------------------------
+# User Database Credentials (decrypted, cached)
+# ---------------------------------
+CREDENTIALS_CACHE_TTL_S = float(os.getenv("CREDENTIALS_CACHE_TTL_S", "300"))
+
+_CREDENTIALS_CACHE = TTLCache(maxsize=1024, ttl_s=CREDENTIALS_CACHE_TTL_S)
+
+
+USER_DATABASE_CREDENTIALS_SQL = """
+    SELECT host, port, db_name, username, encrypted_password
+    FROM user_database
+    WHERE user_id = %s
+"""
+
+
 def get_user_database_credentials(user_id: str):
+    """
+    Returns the user's decrypted database credentials.
+
+    Results are cached in memory for CREDENTIALS_CACHE_TTL_S so repeated
+    /query calls skip both the internal DB read and Fernet decryption.
+    """
+    cached = peek_user_database_credentials(user_id)
+    if cached is not None:
+        return cached
+
     conn = get_internal_db_connection()
-    cur = conn.cursor()
+    try:
+        cur = conn.cursor()
+        cur.execute(USER_DATABASE_CREDENTIALS_SQL, (user_id,))
+        row = cur.fetchone()
+        cur.close()
+    finally:
+        release_db_connection(conn)
 
-    cur.execute("""
-        SELECT host, port, db_name, username, encrypted_password
-        FROM user_database
-        WHERE user_id = %s
-    """, (user_id,))
+    return remember_user_database_credentials(user_id, row)
 
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
 
+def peek_user_database_credentials(user_id: str):
+    """
+    Returns cached credentials for user_id without touching the database.
+    """
+    return _CREDENTIALS_CACHE.get(user_id)
+
+
+def remember_user_database_credentials(user_id: str, row):
+    """
+    Decrypts a user_database row and caches the result. Returns None for no row.
+    """
     if not row:
         return None
 
-    return {
+    creds = {
         "host": row[0],
         "port": row[1],
         "db_name": row[2],
         "username": row[3],
         "password": decrypt(row[4]),
     }
+    _CREDENTIALS_CACHE.set(user_id, creds)
+    return creds
+
+
+def invalidate_user_database_credentials(user_id: str):
+    """
+    Drops cached credentials for user_id (call after they are upserted).
+    """
+    _CREDENTIALS_CACHE.pop(user_id)
+
+
+def tenant_key(user_id: str, creds: dict) -> str:
+    """
+    Identifies the database a user's queries run on, for per-tenant caches
+    and registries (results, cost estimates, rollups).
+    """
+    return f"{user_id}@{creds['host']}:{creds['port']}/{creds['db_name']}"
+
+
+def connect_user_database(creds: dict, connect_timeout: int = 5):
+    """
+    Opens a dedicated (unpooled) psycopg2 connection to a user's database,
+    for maintenance work such as rollup refreshes. The caller closes it.
+    """
+    return psycopg2.connect(
+        host=creds["host"],
+        port=creds["port"],
+        dbname=creds["db_name"],
+        user=creds["username"],
+        password=creds["password"],
+        connect_timeout=connect_timeout,
+    )
@@ -4,7 +4,7 @@ from logical_domain_detector import build_logical_domain_map
 # Dimension Auto-Mapping
 # ---------------------------------
 
-def build_dimension_map():
+def build_dimension_map(logical_schema: dict = None):
     """
     Automatically map logical dimensions to physical dimension columns.
 
@@ -14,9 +14,13 @@ def build_dimension_map():
             "logical_dimension_name": "physical_column_name"
         }
     }
+
+    - logical_schema: optional output of build_logical_domain_map(), so
+      callers that already classified the schema don't introspect again
     """
 
-    logical_schema = build_logical_domain_map()
+    if logical_schema is None:
+        logical_schema = build_logical_domain_map()
     dimension_map = {}
 
     for table, meta in logical_schema.items():
@@ -1,4 +1,4 @@
-from semantic_storage import load_semantic_mappings
+from semantic_catalog import get_semantic_catalog
 
 
 # ---------------------------------
@@ -24,7 +24,6 @@ def resolve_dimensions(plan: dict):
     ]
     """
 
-    semantic_mappings = load_semantic_mappings()
     resolved_dimensions = []
 
     dimensions = plan.get("dimensions", [])
@@ -33,33 +32,13 @@ def resolve_dimensions(plan: dict):
     if not dimensions:
         return resolved_dimensions
 
+    catalog = get_semantic_catalog()
+
     for logical_dim in dimensions:
         logical_name = logical_dim.lower()
 
-        found_table = None
-        found_column = None
-
-        # Search across all tables for this logical dimension
-        for table_name, meta in semantic_mappings.items():
-            table_dimensions = meta.get("dimensions", {})
-
-            if logical_name in table_dimensions:
-                # Ambiguity check (same logical dim in multiple tables)
-                if found_table is not None:
-                    raise ValueError(
-                        f"Dimension '{logical_name}' is defined in multiple tables "
-                        f"('{found_table}' and '{table_name}'). Resolution is ambiguous."
-                    )
-
-                found_table = table_name
-                found_column = table_dimensions[logical_name]
-
-        # Not found anywhere → fail early
-        if found_table is None or found_column is None:
-            raise ValueError(
-                f"Dimension '{logical_name}' could not be resolved to any physical column "
-                f"using stored semantic mappings."
-            )
+        # O(1) lookup; ambiguity / unknown names raise ValueError
+        found_table, found_column = catalog.resolve_dimension(logical_name)
 
         resolved_dimensions.append({
             "logical_name": logical_name,
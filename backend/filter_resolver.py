@@ -0,0 +1,314 @@
+import functools
+import re
+from decimal import Decimal, InvalidOperation
+
+from semantic_catalog import get_semantic_catalog
+from schema_reader import load_physical_schema
+from sql_ast import Aggregate, Column, Fragment, OrderBy, Param, Predicate
+
+
+# ---------------------------------
+# Filter Operators
+# ---------------------------------
+
+COMPARISON_OPERATORS = {
+    "=": "=",
+    "!=": "<>",
+    ">": ">",
+    ">=": ">=",
+    "<": "<",
+    "<=": "<=",
+}
+
+FILTER_MAX_IN_VALUES = 1000
+
+INTEGER_TYPES = ("smallint", "integer", "bigint")
+NUMERIC_TYPES = INTEGER_TYPES + ("numeric", "decimal", "real", "double precision")
+
+LIKE_TYPES = ("text", "character varying", "character", "citext", "name")
+
+# Byte-wise prefix ranges equal LIKE 'prefix%' only for case-sensitive text
+PREFIX_RANGE_TYPES = ("text", "character varying")
+
+# Column types that are safe to write after :: (no user-defined / array types)
+_CASTABLE_TYPE = re.compile(r"^[a-z][a-z ]*$")
+
+
+@functools.lru_cache(maxsize=1024)
+def base_type(dtype: str):
+    """
+    Column type without its modifiers: "character varying(255)" → "character varying".
+    Casting a value to the modified type could truncate or round it.
+    """
+    if not dtype:
+        return None
+    return " ".join(re.sub(r"\([^)]*\)", "", dtype).split()).lower()
+
+
+def _array_cast(dtype: str):
+    dtype = base_type(dtype)
+    return f"{dtype}[]" if dtype and _CASTABLE_TYPE.match(dtype) else None
+
+
+def _array_literal(values: list) -> str:
+    """
+    PostgreSQL array literal text, e.g. {"Paris","New York"}. Bound as a single
+    parameter, so an IN list of any length renders as the same SQL.
+    """
+    quoted = ('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return "{" + ",".join(quoted) + "}"
+
+
+def split_values(value) -> list:
+    """
+    IN / NOT IN values: a list, or a comma-separated string ("Paris, Berlin").
+    Duplicates are dropped, order is kept.
+    """
+    if isinstance(value, (list, tuple)):
+        raw = [str(v) for v in value]
+    else:
+        raw = str(value).split(",")
+
+    values = []
+    for v in raw:
+        v = v.strip()
+        if v and v not in values:
+            values.append(v)
+
+    if not values:
+        raise ValueError("IN / NOT IN filters require at least one value")
+    if len(values) > FILTER_MAX_IN_VALUES:
+        raise ValueError(f"IN / NOT IN filters accept at most {FILTER_MAX_IN_VALUES} values")
+    return values
+
+
+def _check_value(field: str, value: str, dtype: str):
+    """
+    Rejects values PostgreSQL could never compare to a numeric column, so a
+    bad plan fails with a clear message instead of a cast error mid-query.
+    """
+    if dtype not in NUMERIC_TYPES:
+        return
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"Filter value '{value}' for '{field}' is not a number")
+    if dtype in INTEGER_TYPES and number != number.to_integral_value():
+        raise ValueError(f"Filter value '{value}' for '{field}' is not an integer")
+
+
+def prefix_successor(prefix: str):
+    """
+    Smallest string greater than every string starting with prefix, in
+    code point order (= byte order for UTF-8), or None if there is none.
+    """
+    chars = list(prefix)
+    while chars:
+        code = ord(chars[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF:  # surrogates never occur in text
+            code = 0xE000
+        if code <= 0x10FFFF:
+            chars[-1] = chr(code)
+            return "".join(chars)
+        chars.pop()
+    return None
+
+
+# ---------------------------------
+# Filter → Predicate Compilation
+# ---------------------------------
+
+def compile_filter(expr, field: str, operator: str, value, dtype: str = None) -> list:
+    """
+    Compiles one filter on expr (a Column or Aggregate) into predicates
+    that are ANDed together. Values are always bound parameters.
+
+    - =, !=, <, ... → expr op %s (the column keeps its type, so indexes apply)
+    - in / not_in   → expr = ANY(%s) / expr <> ALL(%s), with the list bound
+                      as one array parameter
+    - like 'abc%'   → expr COLLATE "C" >= 'abc' AND expr COLLATE "C" < 'abd',
+                      an exact rewrite usable by a C-collated index
+    - like 'abc'    → expr = 'abc' (no wildcards)
+    - other like    → expr LIKE %s
+    """
+    dtype = base_type(dtype)
+
+    if operator in COMPARISON_OPERATORS:
+        value = str(value)
+        _check_value(field, value, dtype)
+        return [Predicate(expr, COMPARISON_OPERATORS[operator], Param(value))]
+
+    if operator in ("in", "not_in"):
+        values = split_values(value)
+        for v in values:
+            _check_value(field, v, dtype)
+
+        cast = _array_cast(dtype) if isinstance(expr, Column) else None
+        if operator == "in":
+            return [Predicate(expr, "=", Fragment("ANY({})", (Param(_array_literal(values), cast),)))]
+        return [Predicate(expr, "<>", Fragment("ALL({})", (Param(_array_literal(values), cast),)))]
+
+    if operator == "like":
+        if not isinstance(expr, Column) or dtype not in LIKE_TYPES:
+            raise ValueError(f"LIKE filters require a text field; '{field}' is not one")
+
+        pattern = str(value)
+        if "\\" not in pattern:
+            body = pattern[:-1] if pattern.endswith("%") else pattern
+
+            if "%" not in body and "_" not in body:
+                if body == pattern:
+                    return [Predicate(expr, "=", Param(pattern))]
+
+                successor = prefix_successor(body) if dtype in PREFIX_RANGE_TYPES else None
+                if body and successor is not None:
+                    collated = Fragment('{} COLLATE "C"', (expr,))
+                    return [
+                        Predicate(collated, ">=", Param(body)),
+                        Predicate(collated, "<", Param(successor)),
+                    ]
+
+        return [Predicate(expr, "LIKE", Param(pattern))]
+
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def _resolve_field(catalog, field: str):
+    """
+    (kind, table, column) for a filter / sort field: dimensions first, then measures.
+    """
+    if field in catalog.dimension_index or field in catalog.ambiguous_dimensions:
+        return ("dimension",) + catalog.resolve_dimension(field)
+    if field in catalog.measure_index or field in catalog.ambiguous_measures:
+        return ("measure",) + catalog.resolve_measure(field)
+    raise ValueError(f"Field '{field}' is not a known dimension or measure")
+
+
+def resolve_filters(plan: dict, resolved_measures: list):
+    """
+    Resolves plan['filters'] through the semantic catalog.
+
+    - Filters on a measure the plan aggregates become HAVING predicates on
+      that aggregate ("revenue > 1000" → HAVING SUM(orders.total) > %s).
+    - Every other filter is a row filter on the physical column (WHERE).
+
+    Returns:
+      {
+        "where": [Predicate(...), ...],
+        "having": [Predicate(...), ...],
+        "tables": {"users", ...}   # tables the WHERE predicates read
+      }
+    """
+    result = {"where": [], "having": [], "tables": set()}
+
+    filters = plan.get("filters") or []
+    if not filters:
+        return result
+
+    catalog = get_semantic_catalog()
+    physical_schema = load_physical_schema()
+
+    aggregates = {}
+    for m in resolved_measures:
+        aggregates.setdefault(m["logical_name"], m)
+
+    for f in filters:
+        field = str(f.get("field", "")).lower()
+        operator = f.get("operator")
+        value = f.get("value")
+
+        if not field or value is None:
+            raise ValueError("Filters require a field and a value")
+
+        measure = aggregates.get(field)
+        if measure is not None:
+            expr = Aggregate(measure["operation"], Column(measure["table"], measure["column"]))
+            # The aggregate's type differs from the column's (COUNT is bigint,
+            # AVG numeric); every aggregate here is numeric
+            result["having"].extend(compile_filter(expr, field, operator, value, "numeric"))
+            continue
+
+        _, table, column = _resolve_field(catalog, field)
+        dtype = physical_schema.get(table, {}).get("columns", {}).get(column)
+
+        result["where"].extend(compile_filter(Column(table, column), field, operator, value, dtype))
+        result["tables"].add(table)
+
+    return result
+
+
+# ---------------------------------
+# Sorting → ORDER BY
+# ---------------------------------
+
+def resolve_sorting(plan: dict, resolved_measures: list, resolved_dimensions: list, grouped: bool,
+                    time_bucket=None, period_alias: str = "period") -> list:
+    """
+    Resolves plan['sorting'] into OrderBy nodes.
+
+    Sort fields must be selected dimensions or measures (or the time bucket,
+    as period_alias or its grain name); a plain row listing (no aggregation)
+    may also sort by any dimension. Descending aggregates put NULLs last, so
+    a "top N" is not led by empty groups. Without sorting, a time-bucketed
+    query is ordered chronologically. Grouped queries get the group-by
+    columns as tie-breakers, which keeps LIMIT deterministic.
+    """
+    sorting = plan.get("sorting") or []
+    if not sorting and time_bucket is None:
+        return []
+
+    selected = {}
+    if time_bucket is not None:
+        selected[period_alias] = time_bucket
+    for d in resolved_dimensions:
+        selected.setdefault(d["logical_name"], Column(d["table"], d["column"]))
+    for m in resolved_measures:
+        selected.setdefault(
+            m["logical_name"], Aggregate(m["operation"], Column(m["table"], m["column"]))
+        )
+    if time_bucket is not None:
+        selected.setdefault(time_bucket.grain, time_bucket)
+
+    aggregated = grouped or bool(resolved_measures)
+    catalog = None
+    order_by = []
+
+    for s in sorting:
+        field = str(s.get("field", "")).lower()
+        direction = str(s.get("direction", "asc")).lower()
+
+        if direction not in ("asc", "desc"):
+            raise ValueError(f"Unsupported sort direction: {direction}")
+
+        expr = selected.get(field)
+        if expr is None:
+            if aggregated:
+                raise ValueError(
+                    f"Sort field '{field}' must be one of the selected dimensions or measures"
+                )
+            catalog = catalog or get_semantic_catalog()
+            _, table, column = _resolve_field(catalog, field)
+            expr = Column(table, column)
+
+        if direction == "asc":
+            order_by.append(OrderBy(expr, "ASC"))
+        elif isinstance(expr, Aggregate):
+            order_by.append(OrderBy(expr, "DESC NULLS LAST"))
+        else:
+            order_by.append(OrderBy(expr, "DESC"))
+
+    if time_bucket is not None and not sorting:
+        order_by.append(OrderBy(time_bucket, "ASC"))
+
+    if grouped:
+        group_exprs = [Column(d["table"], d["column"]) for d in resolved_dimensions]
+        if time_bucket is not None:
+            group_exprs.insert(0, time_bucket)
+
+        sorted_exprs = {o.expr for o in order_by}
+        for expr in group_exprs:
+            if expr not in sorted_exprs:
+                order_by.append(OrderBy(expr, "ASC"))
+                sorted_exprs.add(expr)
+
+    return order_by
@@ -1,18 +1,215 @@
-from schema_reader import load_physical_schema
+import threading
+from collections import deque
+
+from schema_reader import (
+    load_physical_schema, get_schema_version, foreign_key_constraints, INTERNAL_SCHEMA_KEY,
+)
+
+
+# ---------------------------------
+# FK Join Graph (built once per schema version)
+# ---------------------------------
+
+class JoinGraph:
+    """
+    Undirected foreign-key graph over the physical schema.
+
+    - Adjacency lists are sorted, so every traversal is deterministic.
+    - BFS trees are computed lazily per source table and cached, which gives
+      an all-pairs shortest-path cache that fills up as pairs are requested.
+    """
+
+    def __init__(self, physical_schema: dict):
+        # adjacency: table_name -> list of (neighbor_table, join_condition, on)
+        # where on is ((table, column), (ref_table, ref_column)) pairs, one
+        # per column of the foreign key constraint
+        adjacency = {table: [] for table in physical_schema.keys()}
+        self.out_degree = {table: 0 for table in physical_schema.keys()}
+
+        for table, meta in physical_schema.items():
+            for fk in foreign_key_constraints(table, meta):
+                ref_table = fk["references_table"]
+                on = tuple(
+                    ((table, col), (ref_table, ref_col))
+                    for col, ref_col in zip(fk["columns"], fk["references_columns"])
+                )
+
+                # Composite keys join on every column pair of the constraint
+                condition = " AND ".join(f"{l[0]}.{l[1]} = {r[0]}.{r[1]}" for l, r in on)
+
+                adjacency.setdefault(table, []).append((ref_table, condition, on))
+                adjacency.setdefault(ref_table, []).append((table, condition, on))
+                self.out_degree[table] = self.out_degree.get(table, 0) + 1
+
+        self.adjacency = {table: sorted(edges) for table, edges in adjacency.items()}
+
+        self._bfs_trees = {}
+        self._lock = threading.Lock()
+
+    def _bfs_tree(self, source: str) -> dict:
+        """
+        Returns {table: (parent_table, (condition, on), distance)} for every table
+        reachable from source. Cached per source.
+        """
+        tree = self._bfs_trees.get(source)
+        if tree is not None:
+            return tree
+
+        tree = {source: (None, None, 0)}
+        queue = deque([source])
+
+        while queue:
+            current = queue.popleft()
+            distance = tree[current][2]
+            for neighbor, condition, on in self.adjacency.get(current, []):
+                if neighbor not in tree:
+                    tree[neighbor] = (current, (condition, on), distance + 1)
+                    queue.append(neighbor)
+
+        with self._lock:
+            self._bfs_trees[source] = tree
+        return tree
+
+    def distance(self, source: str, target: str):
+        entry = self._bfs_tree(source).get(target)
+        return entry[2] if entry is not None else None
+
+    def shortest_path(self, source: str, target: str):
+        """
+        Returns the join edges from source to target as a list of
+        (from_table, to_table, condition, on), or None if unreachable.
+        """
+        tree = self._bfs_tree(target)
+        if source not in tree:
+            return None
+
+        # Walk the BFS tree rooted at target, starting from source
+        path = []
+        current = source
+        while current != target:
+            parent, (condition, on), _ = tree[current]
+            path.append((current, parent, condition, on))
+            current = parent
+        return path
+
+    def steiner_joins(self, base_table: str, tables: list) -> list:
+        """
+        Greedy Steiner-tree approximation: starting from base_table, repeatedly
+        attach the closest remaining involved table through its shortest path
+        to any table already joined. Only tables on those paths are joined.
+
+        Returns JOIN dicts in an order where every right_table is joined
+        onto a table that is already part of the FROM clause.
+        """
+        joined = [base_table]
+        joined_set = {base_table}
+        remaining = sorted(set(tables) - joined_set)
+        joins = []
+
+        while remaining:
+            best = None  # (distance, target, source)
+
+            for target in remaining:
+                tree = self._bfs_tree(target)
+                for source in joined:
+                    if source not in tree:
+                        continue
+                    candidate = (tree[source][2], target, source)
+                    if best is None or candidate < best:
+                        best = candidate
+
+            if best is None:
+                raise ValueError(
+                    f"Cannot build a deterministic join path: table '{remaining[0]}' "
+                    f"is not connected via foreign keys to '{base_table}'."
+                )
+
+            _, target, source = best
+
+            for left_table, right_table, condition, on in self.shortest_path(source, target):
+                if right_table in joined_set:
+                    continue
+                joins.append({
+                    "left_table": left_table,
+                    "right_table": right_table,
+                    "condition": condition,
+                    "on": on,
+                    "join_type": "INNER"
+                })
+                joined.append(right_table)
+                joined_set.add(right_table)
+
+            remaining = [t for t in remaining if t not in joined_set]
+
+        return joins
+
+
+_join_graphs = {}
+_join_graphs_lock = threading.Lock()
+
+
+def get_join_graph(cache_key: str = INTERNAL_SCHEMA_KEY) -> JoinGraph:
+    """
+    Returns the JoinGraph for the current schema version of cache_key,
+    rebuilding it only when the schema cache reports a new version.
+    """
+    physical_schema = load_physical_schema(cache_key=cache_key)
+    version = get_schema_version(cache_key)
+
+    with _join_graphs_lock:
+        cached = _join_graphs.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        graph = JoinGraph(physical_schema)
+        _join_graphs[cache_key] = (version, graph)
+        return graph
+
+
+# ---------------------------------
+# Base (Fact) Table Selection
+# ---------------------------------
+
+def choose_base_table(resolved_measures: list, resolved_dimensions: list, join_graph: JoinGraph) -> str:
+    """
+    Deterministically picks the fact table to put in FROM:
+
+      1. Tables holding measures win over dimension-only tables.
+      2. Then the table with more measures.
+      3. Then the table with more outgoing FKs (facts reference dimensions).
+      4. Then the table name, so the choice never depends on set order.
+    """
+    measure_counts = {}
+    for m in resolved_measures:
+        measure_counts[m["table"]] = measure_counts.get(m["table"], 0) + 1
+
+    candidates = set(measure_counts.keys()) or {d["table"] for d in resolved_dimensions}
+
+    return min(
+        candidates,
+        key=lambda t: (-measure_counts.get(t, 0), -join_graph.out_degree.get(t, 0), t)
+    )
 
 
 # ---------------------------------
 # Join Resolver (FK-only, storage-backed schema)
 # ---------------------------------
 
-def build_join_plan(resolved_measures: list, resolved_dimensions: list):
+def build_join_plan(resolved_measures: list, resolved_dimensions: list, join_graph: JoinGraph = None,
+                    filter_tables=()):
     """
     Build a FROM + JOIN plan based on resolved measures and dimensions
     and the physical foreign key graph from PostgreSQL.
 
+    Only the tables on shortest FK paths between the involved tables are
+    joined (greedy Steiner tree), starting from the fact table.
+
     Inputs:
       - resolved_measures: list of dicts from resolve_measures()
       - resolved_dimensions: list of dicts from resolve_dimensions()
+      - join_graph: optional prebuilt JoinGraph (defaults to the cached one)
+      - filter_tables: tables only filters read; they are joined but never
+        chosen as the base table
 
     Output example (for multi-table case):
       {
@@ -22,6 +219,7 @@ def build_join_plan(resolved_measures: list, resolved_dimensions: list):
             "left_table": "orders",
             "right_table": "users",
             "condition": "orders.user_id = users.id",
+            "on": ((("orders", "user_id"), ("users", "id")),),
             "join_type": "INNER"
           }
         ],
@@ -37,8 +235,6 @@ def build_join_plan(resolved_measures: list, resolved_dimensions: list):
       }
     """
 
-    physical_schema = load_physical_schema()
-
     # ---------------------------------
     # 1. Collect all involved tables
     # ---------------------------------
@@ -58,6 +254,9 @@ def build_join_plan(resolved_measures: list, resolved_dimensions: list):
             "from_sql": ""
         }
 
+    # Filters narrow a query but don't define it: joined, never the base
+    involved_tables.update(filter_tables)
+
     # If only one table is involved, no joins are needed
     if len(involved_tables) == 1:
         base_table = next(iter(involved_tables))
@@ -68,102 +267,21 @@ def build_join_plan(resolved_measures: list, resolved_dimensions: list):
         }
 
     # ---------------------------------
-    # 2. Build FK-based adjacency graph between tables
+    # 2. Pick the base table and connect the rest
     # ---------------------------------
-    # adjacency: table_name -> list of (neighbor_table, join_condition)
-    adjacency = {table: [] for table in physical_schema.keys()}
-
-    for table, meta in physical_schema.items():
-        fks = meta.get("foreign_keys", {})
+    if join_graph is None:
+        join_graph = get_join_graph()
 
-        for col, fk in fks.items():
-            ref_table = fk["references_table"]
-            ref_col = fk["references_column"]
-
-            # edge: table -> ref_table
-            condition = f"{table}.{col} = {ref_table}.{ref_col}"
-
-            if table not in adjacency:
-                adjacency[table] = []
-            if ref_table not in adjacency:
-                adjacency[ref_table] = []
-
-            # undirected graph for connectivity, but condition stored once
-            adjacency[table].append((ref_table, condition))
-            adjacency[ref_table].append((table, condition))
-
-    # ---------------------------------
-    # 3. BFS to find join paths connecting all involved tables
-    # ---------------------------------
-    involved_tables = list(involved_tables)
-    start_table = involved_tables[0]
-
-    from collections import deque
-
-    queue = deque([start_table])
-    parent = {start_table: None}
-    edge_to_parent = {}  # child_table -> (parent_table, condition)
-
-    while queue:
-        current = queue.popleft()
-        for neighbor, condition in adjacency.get(current, []):
-            if neighbor not in parent:
-                parent[neighbor] = current
-                edge_to_parent[neighbor] = (current, condition)
-                queue.append(neighbor)
-
-    # Ensure all involved tables are reachable
-    for table in involved_tables:
-        if table not in parent:
-            raise ValueError(
-                f"Cannot build a deterministic join path: table '{table}' "
-                f"is not connected via foreign keys to '{start_table}'."
-            )
-
-    # ---------------------------------
-    # 4. Build join edges from BFS tree
-    # ---------------------------------
-    # We may include intermediate tables (bridge tables) if needed.
-    join_edges = set()  # use set to avoid duplicates
-
-    for table in parent:
-        if table == start_table:
-            continue
-        if table not in edge_to_parent:
-            continue
-
-        parent_table, condition = edge_to_parent[table]
-
-        # Normalize edge key so A-B and B-A are treated the same
-        key = tuple(sorted([table, parent_table]) + [condition])
-
-        join_edges.add((parent_table, table, condition, key))
-
-    # ---------------------------------
-    # 5. Construct JOIN clauses
-    # ---------------------------------
-    joins = []
-    used_edges = set()
-
-    for parent_table, child_table, condition, key in join_edges:
-        if key in used_edges:
-            continue
-        used_edges.add(key)
-
-        joins.append({
-            "left_table": parent_table,
-            "right_table": child_table,
-            "condition": condition,
-            "join_type": "INNER"
-        })
+    base_table = choose_base_table(resolved_measures, resolved_dimensions, join_graph)
+    joins = join_graph.steiner_joins(base_table, sorted(involved_tables))
 
     # Build FROM SQL
-    from_sql = start_table
+    from_sql = base_table
     for j in joins:
         from_sql += f" INNER JOIN {j['right_table']} ON {j['condition']}"
 
     return {
-        "base_table": start_table,
+        "base_table": base_table,
         "joins": joins,
         "from_sql": from_sql
     }
@@ -1,35 +1,50 @@
-import re
+from sql_lexer import analyze_sql
 
 
 # ---------------------------------
 # Hard Row Limit Enforcer (V1)
 # ---------------------------------
 
-LIMIT_REGEX = re.compile(r"\blimit\s+(\d+)\b", re.IGNORECASE)
-
-
 def enforce_limit(sql: str, max_limit: int = 1000) -> str:
     """
     Ensures SQL has a LIMIT and that it does not exceed max_limit.
 
     - If no LIMIT exists → append LIMIT max_limit
-    - If LIMIT exists and > max_limit → replace with max_limit
+    - If LIMIT exists and > max_limit (or LIMIT ALL) → replace with max_limit
+
+    Only the top-level LIMIT counts; LIMITs inside subqueries or string
+    literals are ignored.
     """
 
     if not sql or not isinstance(sql, str):
         raise ValueError("Invalid SQL")
 
-    match = LIMIT_REGEX.search(sql)
+    limit = analyze_sql(sql).limit
 
     # No LIMIT → append one
-    if not match:
+    if limit is None:
         return sql.rstrip() + f" LIMIT {max_limit}"
 
-    current_limit = int(match.group(1))
+    current_limit, start, end = limit
+
+    if current_limit == "param":
+        raise ValueError("LIMIT must be a literal integer")
 
     # LIMIT is acceptable
-    if current_limit <= max_limit:
+    if current_limit != "all" and current_limit <= max_limit:
         return sql
 
     # LIMIT too large → replace
-    return LIMIT_REGEX.sub(f"LIMIT {max_limit}", sql)
+    return sql[:start] + f"LIMIT {max_limit}" + sql[end:]
+
+
+def enforce_query_limit(query, max_limit: int = 1000):
+    """
+    AST counterpart of enforce_limit: returns a sql_ast.Select whose LIMIT
+    is present and no larger than max_limit.
+    """
+
+    if query.limit is None or query.limit.count > max_limit:
+        return query.with_limit(max_limit)
+
+    return query
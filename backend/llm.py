@@ -1,9 +1,13 @@
-from groq import Groq
+from groq import Groq, AsyncGroq
 import os
 import json
 from dotenv import load_dotenv
 from pathlib import Path
-from jsonschema import validate, ValidationError
+from jsonschema import validators
+from jsonschema.exceptions import best_match
+from plan_cache import make_plan_cache_key
+from scheduler import LLM_SCHEDULER, ANONYMOUS_TENANT
+from metrics import span
 
 # ---------------------------------
 # Load Environment Variables
@@ -19,22 +23,36 @@ SCHEMA_PATH = ROOT_DIR / "backend" / "specs" / "semantic_plan.schema.json"
 with open(SCHEMA_PATH, "r") as f:
     SEMANTIC_PLAN_SCHEMA = json.load(f)
 
+# Compiled once: jsonschema.validate() re-checks the schema itself on every call
+PLAN_VALIDATOR = validators.validator_for(SEMANTIC_PLAN_SCHEMA)(SEMANTIC_PLAN_SCHEMA)
+
+PLANNER_PROMPT_PATH = ROOT_DIR / "backend" / "specs" / "planner_prompt.txt"
+
+with open(PLANNER_PROMPT_PATH, "r") as f:
+    PLANNER_PROMPT = f.read()
+
+DEFAULT_MODEL = "llama3-8b-8192"
+
 
 # ---------------------------------
 # Universal LLM Client
 # ---------------------------------
 class UniversalLLM:
-    def __init__(self, provider: str = "groq"):
+    def __init__(self, provider: str = "groq", plan_cache=None):
         self.provider = provider
+        self.plan_cache = plan_cache
         self.client = self._init_client()
+        self.async_client = self._init_client(use_async=True)
 
-    def _init_client(self):
+    def _init_client(self, use_async: bool = False):
         if self.provider == "groq":
             api_key = os.getenv("GROQ_API_KEY")
 
             if not api_key:
                 raise ValueError("GROQ_API_KEY not found in environment variables")
 
+            if use_async:
+                return AsyncGroq(api_key=api_key)
             return Groq(api_key=api_key)
 
         raise ValueError(f"Unsupported LLM provider: {self.provider}")
@@ -52,24 +70,67 @@ class UniversalLLM:
         """
         Validate the parsed JSON against the WhareIQ semantic plan schema.
         """
-        try:
-            validate(instance=plan, schema=SEMANTIC_PLAN_SCHEMA)
-        except ValidationError as e:
+        error = best_match(PLAN_VALIDATOR.iter_errors(plan))
+        if error is not None:
             raise ValueError(
-                f"Semantic plan does not match schema: {e.message}"
+                f"Semantic plan does not match schema: {error.message}"
             )
 
         return plan
 
+    def validate_plan(self, plan: dict) -> dict:
+        """
+        Wraps a caller-supplied semantic plan as planner output and
+        validates it like LLM output.
+        """
+        return self._validate_against_schema({
+            "needs_clarification": False,
+            "clarification_question": None,
+            "plan": plan,
+        })
+
+    def _cached_plan(self, system_prompt: str, user_input: str, model: str, catalog_version: str):
+        """
+        Returns (cache_key, validated cached plan or None).
+        """
+        if self.plan_cache is None:
+            return None, None
+
+        cache_key = make_plan_cache_key(user_input, system_prompt, catalog_version, model)
+        cached = self.plan_cache.get(cache_key)
+        if cached is not None:
+            return cache_key, self._validate_against_schema(cached)
+        return cache_key, None
+
+    def _finalize(self, raw_output: str, cache_key: str) -> dict:
+        with span("plan_validation"):
+            parsed = self._safe_json_load(raw_output)
+            validated = self._validate_against_schema(parsed)
+
+        # Only cache executable plans; clarifications are re-asked
+        if cache_key is not None and validated.get("needs_clarification") is False:
+            self.plan_cache.set(cache_key, validated)
+
+        return validated
+
     def generate_json(
         self,
         system_prompt: str,
         user_input: str,
-        model: str = "llama3-8b-8192",
+        model: str = DEFAULT_MODEL,
+        catalog_version: str = None,
     ) -> dict:
         """
         Generate a semantic plan JSON using the LLM, then validate it.
+
+        If a plan cache is configured, identical (normalized) questions for the
+        same prompt, catalog version and model skip the LLM call. Cached plans
+        are still validated against the schema.
         """
+        cache_key, cached = self._cached_plan(system_prompt, user_input, model, catalog_version)
+        if cached is not None:
+            return cached
+
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_input},
@@ -84,9 +145,58 @@ class UniversalLLM:
         except Exception as e:
             raise RuntimeError(f"LLM call failed: {str(e)}")
 
-        raw_output = completion.choices[0].message.content
+        return self._finalize(completion.choices[0].message.content, cache_key)
 
-        parsed = self._safe_json_load(raw_output)
-        validated = self._validate_against_schema(parsed)
+    async def agenerate_json(
+        self,
+        system_prompt: str,
+        user_input: str,
+        model: str = DEFAULT_MODEL,
+        catalog_version: str = None,
+        tenant: str = ANONYMOUS_TENANT,
+    ) -> dict:
+        """
+        Async counterpart of generate_json (does not block the event loop).
 
-        return validated
+        Provider calls (not plan cache hits) go through LLM_SCHEDULER under
+        tenant, which may raise scheduler.SchedulerOverloaded.
+        """
+        cache_key, cached = self._cached_plan(system_prompt, user_input, model, catalog_version)
+        if cached is not None:
+            return cached
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_input},
+        ]
+
+        async with LLM_SCHEDULER.slot(tenant):
+            try:
+                completion = await self.async_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0,
+                )
+            except Exception as e:
+                raise RuntimeError(f"LLM call failed: {str(e)}")
+
+        return self._finalize(completion.choices[0].message.content, cache_key)
+
+    def generate_plan(self, question: str, catalog_version: str = None) -> dict:
+        """
+        Generate a semantic plan for a user question with the planner prompt.
+        """
+        return self.generate_json(
+            system_prompt=PLANNER_PROMPT,
+            user_input=question,
+            catalog_version=catalog_version,
+        )
+
+    async def agenerate_plan(self, question: str, catalog_version: str = None,
+                             tenant: str = ANONYMOUS_TENANT) -> dict:
+        return await self.agenerate_json(
+            system_prompt=PLANNER_PROMPT,
+            user_input=question,
+            catalog_version=catalog_version,
+            tenant=tenant,
+        )
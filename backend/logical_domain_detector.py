@@ -1,6 +1,8 @@
-from schema_reader import load_physical_schema
+import hashlib
 import re
 
+from schema_reader import load_physical_schema
+
 # ---------------------------------
 # Rule Dictionaries
 # ---------------------------------
@@ -19,44 +21,133 @@ NUMERIC_METRIC_TYPES = ["integer", "numeric", "double precision", "real", "bigin
 
 IGNORE_FIELDS = ["password", "hash", "token", "secret"]
 
+# Bump whenever the rules above change, so stored mappings get reclassified
+CLASSIFICATION_VERSION = 1
+
 
 # ---------------------------------
-# Column Classification Logic
+# Compiled Rule Engine
 # ---------------------------------
 
-def classify_column(column_name: str, data_type: str, primary_keys: list):
-    col = column_name.lower()
+class ColumnRuleSet:
+    """
+    The rule dictionaries compiled into one regex.
+
+    Each category becomes a lookahead alternative, listed in priority
+    order; regex alternation is tried left to right, so the first category
+    that matches wins, exactly like the original if-chain:
+
+      ignored → technical_key → contact → name → location → time
+      → numeric_metric (by data type) → categorical
+
+    Primary keys are always technical keys. Results for a column name are
+    memoized, since the same names (id, created_at, ...) repeat across
+    tables and tenants.
+    """
+
+    def __init__(
+        self,
+        ignore_fields=IGNORE_FIELDS,
+        technical_key_patterns=TECHNICAL_KEY_PATTERNS,
+        contact_fields=CONTACT_FIELDS,
+        name_fields=NAME_FIELDS,
+        location_fields=LOCATION_FIELDS,
+        time_fields=TIME_FIELDS,
+        numeric_metric_types=NUMERIC_METRIC_TYPES,
+    ):
+        self.rules = (
+            ("ignored", tuple(ignore_fields), "contains"),
+            ("technical_key", tuple(technical_key_patterns), "endswith"),
+            ("contact_dimension", tuple(contact_fields), "contains"),
+            ("name_dimension", tuple(name_fields), "contains"),
+            ("location_dimension", tuple(location_fields), "contains"),
+            ("time_dimension", tuple(time_fields), "contains"),
+        )
+        self.numeric_metric_types = frozenset(numeric_metric_types)
+
+        alternatives = []
+        for category, patterns, mode in self.rules:
+            if not patterns:
+                continue
+            words = "|".join(re.escape(p) for p in sorted(patterns, key=len, reverse=True))
+            tail = "$" if mode == "endswith" else ""
+            alternatives.append(f"(?=.*(?:{words}){tail})(?P<{category}>)")
+
+        self._regex = re.compile("|".join(alternatives), re.DOTALL) if alternatives else None
+        self._name_cache = {}
+
+        self.fingerprint = hashlib.sha256(
+            repr((self.rules, sorted(self.numeric_metric_types))).encode()
+        ).hexdigest()[:16]
+
+    def _name_category(self, col: str):
+        """
+        Category decided by the column name alone (or None).
+        """
+        try:
+            return self._name_cache[col]
+        except KeyError:
+            pass
+
+        match = self._regex.match(col) if self._regex is not None else None
+        category = match.lastgroup if match else None
+
+        if len(self._name_cache) < 100000:
+            self._name_cache[col] = category
+        return category
+
+    def classify(self, column_name: str, data_type: str, primary_keys) -> str:
+        category = self._name_category(column_name.lower())
+
+        if category == "ignored":
+            return category
+
+        if column_name in primary_keys:
+            return "technical_key"
+
+        if category is not None:
+            return category
+
+        if data_type in self.numeric_metric_types:
+            return "numeric_metric"
+
+        return "categorical_dimension"
+
+    def classify_columns(self, columns: dict, primary_keys) -> dict:
+        """
+        Classifies a whole table's {column: data_type} in one call.
+        """
+        primary_keys = frozenset(primary_keys)
+        return {
+            column: self.classify(column, dtype, primary_keys)
+            for column, dtype in columns.items()
+        }
+
 
-    # 1. Ignore sensitive fields
-    if any(x in col for x in IGNORE_FIELDS):
-        return "ignored"
+DEFAULT_RULE_SET = ColumnRuleSet()
 
-    # 2. Technical identifiers
-    if column_name in primary_keys or any(col.endswith(x) for x in TECHNICAL_KEY_PATTERNS):
-        return "technical_key"
+# tenant -> ColumnRuleSet (tenants without an entry use DEFAULT_RULE_SET)
+_TENANT_RULE_SETS = {}
 
-    # 3. Contact dimensions
-    if any(x in col for x in CONTACT_FIELDS):
-        return "contact_dimension"
 
-    # 4. Name dimensions
-    if any(x in col for x in NAME_FIELDS):
-        return "name_dimension"
+def register_rule_set(tenant: str, rule_set: ColumnRuleSet):
+    _TENANT_RULE_SETS[tenant] = rule_set
 
-    # 5. Location dimensions
-    if any(x in col for x in LOCATION_FIELDS):
-        return "location_dimension"
 
-    # 6. Time dimensions
-    if any(x in col for x in TIME_FIELDS):
-        return "time_dimension"
+def get_rule_set(tenant: str = None) -> ColumnRuleSet:
+    return _TENANT_RULE_SETS.get(tenant, DEFAULT_RULE_SET)
 
-    # 7. Numeric metrics
-    if data_type in NUMERIC_METRIC_TYPES:
-        return "numeric_metric"
 
-    # 8. Generic grouping dimension
-    return "categorical_dimension"
+# ---------------------------------
+# Column Classification Logic
+# ---------------------------------
+
+def classify_column(column_name: str, data_type: str, primary_keys: list):
+    return DEFAULT_RULE_SET.classify(column_name, data_type, primary_keys)
+
+
+def classify_columns(columns: dict, primary_keys: list, rule_set: ColumnRuleSet = None) -> dict:
+    return (rule_set or DEFAULT_RULE_SET).classify_columns(columns, primary_keys)
 
 
 # ---------------------------------
@@ -85,38 +176,50 @@ def detect_table_domain(table_name: str):
 # Full Logical Domain Mapping
 # ---------------------------------
 
-def build_logical_domain_map():
+def classify_table(table: str, meta: dict, rule_set: ColumnRuleSet = None) -> dict:
     """
-    Converts physical schema → logical semantic schema
+    Converts one physical table → its logical semantic entry
     """
+    logical = {
+        "table_domain": detect_table_domain(table),
+        "dimensions": [],
+        "metrics": [],
+        "technical_fields": [],
+        "ignored_fields": []
+    }
 
-    physical_schema = load_physical_schema()
-    logical_schema = {}
+    classifications = classify_columns(meta["columns"], meta["primary_key"], rule_set)
 
-    for table, meta in physical_schema.items():
-        logical_schema[table] = {
-            "table_domain": detect_table_domain(table),
-            "dimensions": [],
-            "metrics": [],
-            "technical_fields": [],
-            "ignored_fields": []
-        }
+    for column, classification in classifications.items():
+        if classification == "technical_key":
+            logical["technical_fields"].append(column)
 
-        primary_keys = meta["primary_key"]
+        elif classification == "numeric_metric":
+            logical["metrics"].append(column)
 
-        for column, dtype in meta["columns"].items():
-            classification = classify_column(column, dtype, primary_keys)
+        elif classification == "ignored":
+            logical["ignored_fields"].append(column)
 
-            if classification == "technical_key":
-                logical_schema[table]["technical_fields"].append(column)
+        else:
+            logical["dimensions"].append(column)
 
-            elif classification == "numeric_metric":
-                logical_schema[table]["metrics"].append(column)
+    return logical
 
-            elif classification == "ignored":
-                logical_schema[table]["ignored_fields"].append(column)
 
-            else:
-                logical_schema[table]["dimensions"].append(column)
+def build_logical_domain_map(physical_schema: dict = None, rule_set: ColumnRuleSet = None):
+    """
+    Converts physical schema → logical semantic schema
+
+    - physical_schema: optional, already-introspected schema (or a subset
+      of its tables); defaults to load_physical_schema()
+    - rule_set: optional tenant rules (see get_rule_set); defaults to the
+      built-in rule dictionaries
+    """
+
+    if physical_schema is None:
+        physical_schema = load_physical_schema()
 
-    return logical_schema
+    return {
+        table: classify_table(table, meta, rule_set)
+        for table, meta in physical_schema.items()
+    }
@@ -4,7 +4,7 @@ from logical_domain_detector import build_logical_domain_map
 # Measure Auto-Mapping
 # ---------------------------------
 
-def build_measure_map():
+def build_measure_map(logical_schema: dict = None):
     """
     Automatically map logical measures to physical numeric columns.
 
@@ -14,9 +14,13 @@ def build_measure_map():
             "logical_metric_name": "physical_column_name"
         }
     }
+
+    - logical_schema: optional output of build_logical_domain_map(), so
+      callers that already classified the schema don't introspect again
     """
 
-    logical_schema = build_logical_domain_map()
+    if logical_schema is None:
+        logical_schema = build_logical_domain_map()
     measure_map = {}
 
     for table, meta in logical_schema.items():
@@ -1,4 +1,4 @@
-from semantic_storage import load_semantic_mappings
+from semantic_catalog import get_semantic_catalog
 
 
 # ---------------------------------
@@ -15,7 +15,7 @@ def resolve_measures(plan: dict):
         { "name": "revenue", "operation": "sum" }
     ]
 
-    Using semantic mappings stored in PostgreSQL, we resolve:
+    Using the indexed semantic catalog (backed by PostgreSQL), we resolve:
 
     - Which table the metric belongs to
     - Which physical column implements it
@@ -34,7 +34,6 @@ def resolve_measures(plan: dict):
     ]
     """
 
-    semantic_mappings = load_semantic_mappings()
     resolved_measures = []
 
     measures = plan.get("measures", [])
@@ -43,35 +42,14 @@ def resolve_measures(plan: dict):
     if not measures:
         return resolved_measures
 
+    catalog = get_semantic_catalog()
+
     for measure in measures:
         logical_name = measure["name"].lower()
         operation = measure["operation"].lower()
 
-        found_table = None
-        found_column = None
-
-        # Search across all tables stored in semantic_mappings
-        for table_name, meta in semantic_mappings.items():
-            table_measures = meta.get("measures", {})
-
-            # measures is a dict: { logical_metric_name: physical_column_name }
-            if logical_name in table_measures:
-                # If already found once in another table -> ambiguous
-                if found_table is not None:
-                    raise ValueError(
-                        f"Measure '{logical_name}' is defined in multiple tables "
-                        f"('{found_table}' and '{table_name}'). Resolution is ambiguous."
-                    )
-
-                found_table = table_name
-                found_column = table_measures[logical_name]
-
-        # If not found at all → cannot resolve this measure
-        if found_table is None or found_column is None:
-            raise ValueError(
-                f"Measure '{logical_name}' could not be resolved to any physical column "
-                f"using stored semantic mappings."
-            )
+        # O(1) lookup; ambiguity / unknown names raise ValueError
+        found_table, found_column = catalog.resolve_measure(logical_name)
 
         sql_expr = f"{operation.upper()}({found_table}.{found_column}) AS {logical_name}"
 
@@ -0,0 +1,224 @@
+import contextvars
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry export is optional
+    otel_trace = None
+
+
+# ---------------------------------
+# Request Context
+# ---------------------------------
+
+OTEL_TRACING_ENABLED = os.getenv("OTEL_TRACING_ENABLED", "true").lower() == "true"
+
+STAGE_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_ID = contextvars.ContextVar("whareiq_request_id", default=None)
+
+# [(stage, seconds), ...] for the current request; the list object is
+# shared with worker threads (asyncio.to_thread copies the context)
+_STAGE_TIMINGS = contextvars.ContextVar("whareiq_stage_timings", default=None)
+
+_tracer = otel_trace.get_tracer("whareiq") if otel_trace is not None and OTEL_TRACING_ENABLED else None
+
+
+def otel_available() -> bool:
+    return _tracer is not None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+# Client-supplied IDs are echoed into headers and logs, so keep them tame
+_CLIENT_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def start_request(request_id: str = None):
+    """
+    Starts timing a request in the current context; returns (request_id, tokens).
+    A missing or malformed request_id is replaced by a generated one.
+    """
+    if not request_id or not _CLIENT_REQUEST_ID.match(request_id):
+        request_id = new_request_id()
+    tokens = (REQUEST_ID.set(request_id), _STAGE_TIMINGS.set([]))
+    return request_id, tokens
+
+
+def end_request(tokens):
+    REQUEST_ID.reset(tokens[0])
+    _STAGE_TIMINGS.reset(tokens[1])
+
+
+def stage_timings() -> list:
+    """
+    (stage, seconds) pairs recorded so far in this request.
+    """
+    return list(_STAGE_TIMINGS.get() or ())
+
+
+# ---------------------------------
+# Histograms
+# ---------------------------------
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram with one label set per series.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = STAGE_BUCKETS_S):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [0] * len(self.buckets) + [0.0, 0]
+                self._series[label_values] = series
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+
+        for label_values, series in sorted(self.snapshot().items()):
+            labels = _labels(zip(self.label_names, label_values))
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+STAGE_DURATION = Histogram(
+    "whareiq_stage_duration_seconds",
+    "Time spent in each query pipeline stage.",
+    ("stage",),
+)
+
+REQUEST_DURATION = Histogram(
+    "whareiq_request_duration_seconds",
+    "End-to-end HTTP request time (to the first response byte for streams).",
+    ("route", "method", "status"),
+)
+
+
+# ---------------------------------
+# Spans
+# ---------------------------------
+
+@contextmanager
+def span(stage: str, **attributes):
+    """
+    Times a pipeline stage.
+
+    - observed in the STAGE_DURATION histogram
+    - appended to the request's timings (Server-Timing header)
+    - mirrored as an OpenTelemetry span when opentelemetry is installed
+    """
+    otel_span = nullcontext()
+    if _tracer is not None:
+        request_id = REQUEST_ID.get()
+        if request_id is not None:
+            attributes["whareiq.request_id"] = request_id
+        otel_span = _tracer.start_as_current_span(f"whareiq.{stage}", attributes=attributes)
+
+    start = time.perf_counter()
+    try:
+        with otel_span:
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage)
+
+        timings = _STAGE_TIMINGS.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+# ---------------------------------
+# Export
+# ---------------------------------
+
+_SERVER_TIMING_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def server_timing_header(timings: list, total_s: float = None) -> str:
+    """
+    Server-Timing value, e.g. "llm;dur=412.3, execution;dur=18.0, total;dur=451.2".
+    Repeated stages are summed, in first-seen order.
+    """
+    totals = {}
+    for stage, seconds in timings:
+        name = _SERVER_TIMING_NAME.sub("_", stage)
+        totals[name] = totals.get(name, 0.0) + seconds
+
+    if total_s is not None:
+        totals["total"] = total_s
+
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+# Other modules add series here:
+# fn() -> [(name, "gauge" | "counter", help, [(labels dict, value), ...]), ...]
+_COLLECTORS = []
+
+
+def register_collector(fn):
+    _COLLECTORS.append(fn)
+    return fn
+
+
+def render_prometheus() -> str:
+    """
+    Prometheus text exposition (version 0.0.4) of all WhareIQ metrics.
+    """
+    lines = STAGE_DURATION.render() + REQUEST_DURATION.render()
+
+    for collector in _COLLECTORS:
+        for name, metric_type, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                label_text = _labels(sorted(labels.items()))
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
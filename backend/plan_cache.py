@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+
+# ---------------------------------
+# Semantic Plan Cache (LLM planner)
+# ---------------------------------
+
+PLAN_CACHE_MAXSIZE = 2048
+PLAN_CACHE_TTL_S = 24 * 3600.0
+PLAN_CACHE_SQLITE_PATH = os.getenv("PLAN_CACHE_SQLITE_PATH")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# Bumped when normalize_question changes, so keys persisted in SQLite by
+# an older normalization are never looked up again (v2: case preserved)
+PLAN_CACHE_KEY_VERSION = "v2"
+
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form of a question for cache lookups: collapsed whitespace,
+    no trailing punctuation. Case is kept: the planner copies filter values
+    from the question, and "status Shipped" and "status SHIPPED" compile
+    to different (case-sensitive) predicates.
+    """
+    normalized = _WHITESPACE.sub(" ", question.strip())
+    return normalized.rstrip("?.! ")
+
+
+def make_plan_cache_key(question: str, system_prompt: str, catalog_version: str, model: str) -> str:
+    prompt_hash = hashlib.sha256(system_prompt.encode()).hexdigest()
+    raw = "\x00".join([
+        PLAN_CACHE_KEY_VERSION,
+        normalize_question(question),
+        prompt_hash,
+        catalog_version or "",
+        model,
+    ])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class PlanCache:
+    """
+    Two-tier plan cache:
+
+    - an in-memory LRU (per process)
+    - an optional SQLite file shared across processes / restarts
+
+    Plans are stored as JSON. Callers must still validate a cached plan
+    against the semantic plan schema before using it.
+    """
+
+    def __init__(self, maxsize: int = PLAN_CACHE_MAXSIZE, ttl_s: float = PLAN_CACHE_TTL_S, sqlite_path: str = None):
+        self.ttl_s = ttl_s
+        self._memory = TTLCache(maxsize=maxsize, ttl_s=ttl_s)
+        self._sqlite = None
+        self._sqlite_lock = threading.Lock()
+
+        if sqlite_path:
+            self._sqlite = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._sqlite.execute("""
+                CREATE TABLE IF NOT EXISTS plan_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    plan TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._sqlite.commit()
+
+    def get(self, key: str):
+        plan = self._memory.get(key)
+        if plan is not None:
+            return json.loads(plan)
+
+        if self._sqlite is None:
+            return None
+
+        with self._sqlite_lock:
+            row = self._sqlite.execute(
+                "SELECT plan, created_at FROM plan_cache WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        plan, created_at = row
+        remaining = self.ttl_s - (time.time() - created_at)
+        if remaining <= 0:
+            return None
+
+        # Promote to the memory tier
+        self._memory.set(key, plan, ttl_s=remaining)
+        return json.loads(plan)
+
+    def set(self, key: str, plan: dict):
+        serialized = json.dumps(plan, sort_keys=True)
+        self._memory.set(key, serialized)
+
+        if self._sqlite is None:
+            return
+
+        with self._sqlite_lock:
+            self._sqlite.execute(
+                "INSERT OR REPLACE INTO plan_cache (cache_key, plan, created_at) VALUES (?, ?, ?)",
+                (key, serialized, time.time())
+            )
+            self._sqlite.commit()
+
+    def clear(self):
+        self._memory.clear()
+
+        if self._sqlite is None:
+            return
+
+        with self._sqlite_lock:
+            self._sqlite.execute("DELETE FROM plan_cache")
+            self._sqlite.commit()
+
+
+PLAN_CACHE = PlanCache(sqlite_path=PLAN_CACHE_SQLITE_PATH)
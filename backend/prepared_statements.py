@@ -0,0 +1,226 @@
+import hashlib
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+
+from psycopg import AsyncClientCursor
+
+from sql_lexer import analyze_sql
+
+
+# ---------------------------------
+# Prepared Statement Registry (per pooled connection)
+# ---------------------------------
+
+PREPARED_STATEMENTS_PER_CONNECTION = int(os.getenv("PREPARED_STATEMENTS_PER_CONNECTION", "100"))
+MAX_UNPREPARABLE_TEMPLATES = 1024
+
+# Statement kinds PostgreSQL accepts after PREPARE ... AS
+PREPARABLE_KEYWORDS = ("select", "with", "values")
+
+
+def statement_name(sql: str) -> str:
+    """
+    Stable server-side name for a SQL template (same shape → same name).
+    """
+    return "whareiq_" + hashlib.sha256(sql.encode()).hexdigest()[:24]
+
+
+# Driver placeholder syntax: the driver scans the whole string (literals
+# included), so the rewrite must too
+_DRIVER_PLACEHOLDER = re.compile(r"%%|%s|%\([^)]*\)s")
+
+
+@lru_cache(maxsize=512)
+def to_positional(sql: str):
+    """
+    Rewrites driver placeholders (%s) into PostgreSQL positional
+    parameters ($1, $2, ...) for PREPARE, and "%%" into "%".
+
+    Returns (template, param_count), or None if sql cannot be prepared
+    (not a SELECT, or it uses named / positional placeholders).
+    """
+    analysis = analyze_sql(sql)
+
+    if analysis.first_keyword not in PREPARABLE_KEYWORDS:
+        return None
+
+    if any(t.kind == "param" and t.text.startswith("$") for t in analysis.tokens):
+        return None
+
+    count = 0
+    named = False
+
+    def replace(match):
+        nonlocal count, named
+        text = match.group()
+        if text == "%%":
+            return "%"
+        if text != "%s":
+            named = True
+            return text
+        count += 1
+        return f"${count}"
+
+    template = _DRIVER_PLACEHOLDER.sub(replace, sql)
+    if named:
+        return None
+    return template, count
+
+
+def execute_statement_sql(name: str, param_count: int) -> str:
+    if not param_count:
+        return f"EXECUTE {name}"
+    return f"EXECUTE {name} (" + ", ".join(["%s"] * param_count) + ")"
+
+
+class PreparedStatementRegistry:
+    """
+    Tracks which statements are PREPAREd on which connection.
+
+    - Keyed weakly by connection object, so entries disappear with the
+      connection (pool reconnects get a fresh, empty registry).
+    - Each connection keeps an LRU of statement names; past
+      max_per_connection the least recently used one is DEALLOCATEd.
+    - PREPARE / DEALLOCATE are session-level (not undone by ROLLBACK),
+      so the registry stays valid across the pool's per-checkout rollback.
+    """
+
+    def __init__(self, max_per_connection: int = PREPARED_STATEMENTS_PER_CONNECTION):
+        self.max_per_connection = max_per_connection
+
+        self._by_connection = weakref.WeakKeyDictionary()  # conn -> OrderedDict(name -> None)
+        self._unpreparable = OrderedDict()  # statement names PREPARE rejected
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_prepared(self, conn, name: str) -> bool:
+        with self._lock:
+            statements = self._by_connection.get(conn)
+            if statements is not None and name in statements:
+                statements.move_to_end(name)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def remember(self, conn, name: str) -> list:
+        """
+        Records name as prepared on conn; returns the names to DEALLOCATE.
+        """
+        evicted = []
+        with self._lock:
+            statements = self._by_connection.get(conn)
+            if statements is None:
+                statements = OrderedDict()
+                self._by_connection[conn] = statements
+
+            statements[name] = None
+            statements.move_to_end(name)
+
+            while len(statements) > self.max_per_connection:
+                old_name, _ = statements.popitem(last=False)
+                evicted.append(old_name)
+                self.evictions += 1
+        return evicted
+
+    def forget(self, conn):
+        """
+        Drops everything known about conn (e.g. after the server lost its
+        prepared statements).
+        """
+        with self._lock:
+            self._by_connection.pop(conn, None)
+
+    def skip(self, sql: str):
+        """
+        Marks sql as executed directly from now on (e.g. PREPARE could not
+        infer a parameter type, as in "SELECT %s").
+        """
+        with self._lock:
+            self._unpreparable[statement_name(sql)] = None
+            while len(self._unpreparable) > MAX_UNPREPARABLE_TEMPLATES:
+                self._unpreparable.popitem(last=False)
+
+    def _steps(self, conn, sql: str):
+        """
+        Returns (prepare_sql or None, execute_sql, name), or None if sql
+        must be executed directly.
+        """
+        positional = to_positional(sql)
+        if positional is None:
+            return None
+
+        template, param_count = positional
+        name = statement_name(sql)
+        if name in self._unpreparable:
+            return None
+
+        prepare_sql = None if self.is_prepared(conn, name) else f"PREPARE {name} AS {template}"
+        return prepare_sql, execute_statement_sql(name, param_count), name
+
+    # -----------------------------
+    # Execution helpers
+    # -----------------------------
+
+    def execute(self, cursor, sql: str, params=None):
+        """
+        Executes sql on a psycopg2 cursor through a prepared statement.
+        """
+        steps = self._steps(cursor.connection, sql)
+        if steps is None:
+            cursor.execute(sql, params)
+            return
+
+        prepare_sql, execute_sql, name = steps
+        if prepare_sql is not None:
+            cursor.execute(prepare_sql)
+            for old_name in self.remember(cursor.connection, name):
+                cursor.execute(f"DEALLOCATE {old_name}")
+
+        cursor.execute(execute_sql, params)
+
+    async def execute_async(self, conn, sql: str, params=None):
+        """
+        Executes sql on a psycopg 3 async connection through a prepared
+        statement and returns all rows.
+
+        EXECUTE is a utility statement and cannot take bind parameters,
+        so its arguments are bound client-side (AsyncClientCursor).
+        """
+        steps = self._steps(conn, sql)
+
+        async with AsyncClientCursor(conn) as cur:
+            if steps is None:
+                await cur.execute(sql, params)
+                return await cur.fetchall()
+
+            prepare_sql, execute_sql, name = steps
+            if prepare_sql is not None:
+                await cur.execute(prepare_sql)
+                for old_name in self.remember(conn, name):
+                    await cur.execute(f"DEALLOCATE {old_name}")
+
+            await cur.execute(execute_sql, params)
+            return await cur.fetchall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            connections = len(self._by_connection)
+            statements = sum(len(s) for s in self._by_connection.values())
+        return {
+            "connections": connections,
+            "statements": statements,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+PREPARED_STATEMENTS = PreparedStatementRegistry()
@@ -0,0 +1,334 @@
+import dataclasses
+import os
+from dataclasses import dataclass, field
+
+from sql_ast import Aggregate, Fragment, GROUPING_MAX_ARGS, GroupingSetsQuery, Limit, Select, SelectItem
+from sql_validator import validate_sql
+from semantic_catalog import pinned_semantic_catalog
+from secure_executor import prepare_query_ast, render_checked_sql, DEFAULT_TIMEOUT_MS
+from async_db import execute_pipelined_async, execute_with_timeout_async
+from cost_gate import COST_GATE, CostBudgetExceeded, HeavyLaneBusy
+from metrics import span
+
+
+# ---------------------------------
+# Batch Settings
+# ---------------------------------
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "25"))
+BATCH_GROUPING_SETS_ENABLED = os.getenv("BATCH_GROUPING_SETS_ENABLED", "true").lower() == "true"
+
+
+@dataclass(frozen=True)
+class BatchMember:
+    """
+    One batch query answered by a statement: its rows are the statement
+    rows of its grouping set (grouping_id, GROUPING SETS statements only),
+    projected onto positions and capped at limit.
+    """
+    index: int
+    positions: tuple
+    limit: int = None
+    grouping_id: int = None
+
+
+@dataclass
+class BatchStatement:
+    query: object  # Select | GroupingSetsQuery
+    members: list = field(default_factory=list)
+
+    def render(self):
+        return self.query.render()
+
+    @property
+    def merged(self) -> bool:
+        return len({m.index for m in self.members}) > 1
+
+
+# ---------------------------------
+# Preparation (one catalog snapshot)
+# ---------------------------------
+
+def prepare_batch(plans: dict, catalog, rollups: list = None) -> dict:
+    """
+    {index: plan} → {index: checked query AST, or the exception that
+    rejected the plan}.
+
+    Every plan goes through the same stages as prepare_semantic_query
+    (build, limit, allowlist, rollup routing, SQL validation), all against
+    catalog, so the batch never mixes two catalog versions. rollups is the
+    registry of the database the batch runs on.
+    """
+    prepared = {}
+
+    with pinned_semantic_catalog(catalog):
+        for index, plan in plans.items():
+            try:
+                query = prepare_query_ast(plan, rollups)
+                render_checked_sql(query)
+                prepared[index] = query
+            except Exception as e:
+                prepared[index] = e
+
+    return prepared
+
+
+# ---------------------------------
+# Batch Planning (dedupe + merge)
+# ---------------------------------
+
+def _is_mergeable(query) -> bool:
+    """
+    Plain aggregate queries: grouped, or a single row of aggregates.
+    HAVING filters groups per query and gap filling wraps the query,
+    so neither can share a GROUP BY with another query.
+    """
+    if not isinstance(query, Select) or query.having or query.gap_fill is not None or query.limit is None:
+        return False
+    if query.group_by:
+        return True
+    # Rollup-routed aggregates are Fragments (e.g. COALESCE(SUM(...), 0))
+    return all(isinstance(item.expr, (Aggregate, Fragment)) for item in query.items)
+
+
+def _single(index: int, query) -> BatchStatement:
+    return BatchStatement(query, [BatchMember(index, tuple(range(len(query.items))))])
+
+
+def _distinct_exprs(queries) -> list:
+    exprs = []
+    for query in queries:
+        for item in query.items:
+            if item.expr not in exprs:
+                exprs.append(item.expr)
+    return exprs
+
+
+def _merge_same_grouping(members: list) -> BatchStatement:
+    """
+    Queries with the same FROM / WHERE / GROUP BY / ORDER BY: one query
+    selecting the union of their columns, with the largest LIMIT. The
+    order (tie-broken on the group-by columns) is the same for every
+    member, so each member's rows are a prefix of the merged rows.
+    """
+    if len(members) == 1:
+        return _single(*members[0])
+
+    queries = [query for _, query in members]
+    exprs = _distinct_exprs(queries)
+
+    merged = dataclasses.replace(
+        queries[0],
+        items=tuple(SelectItem(expr, f"c{n}") for n, expr in enumerate(exprs)),
+        limit=Limit(max(query.limit.count for query in queries)),
+    )
+
+    return BatchStatement(merged, [
+        BatchMember(index, tuple(exprs.index(item.expr) for item in query.items), query.limit.count)
+        for index, query in members
+    ])
+
+
+def _merge_grouping_sets(statements: list) -> list:
+    """
+    Unordered aggregate statements over the same FROM / WHERE with
+    different GROUP BYs: one GROUPING SETS query. Returns the statements
+    to run (the merged one first, plus any that could not join it).
+    """
+    seen_sets = set()
+    included, rest = [], []
+    grouping_columns = []
+
+    for statement in statements:
+        group_by = statement.query.group_by
+        columns = grouping_columns + [e for e in group_by if e not in grouping_columns]
+        if len(columns) > GROUPING_MAX_ARGS:
+            rest.append(statement)
+            continue
+
+        # (a, b) and (b, a) are the same set: only one of them can join
+        grouping_set = frozenset(group_by)
+        if grouping_set in seen_sets:
+            rest.append(statement)
+            continue
+
+        seen_sets.add(grouping_set)
+        grouping_columns = columns
+        included.append(statement)
+
+    if len(included) < 2 or not grouping_columns:
+        return statements
+
+    exprs = _distinct_exprs(s.query for s in included)
+    query = GroupingSetsQuery(
+        items=tuple(SelectItem(expr, f"c{n}") for n, expr in enumerate(exprs)),
+        from_table=included[0].query.from_table,
+        joins=included[0].query.joins,
+        where=included[0].query.where,
+        grouping_columns=tuple(grouping_columns),
+        sets=tuple(s.query.group_by for s in included),
+        set_limits=tuple(s.query.limit.count for s in included),
+    )
+
+    try:
+        validate_sql(query.render()[0])
+    except ValueError:
+        return statements
+
+    members = []
+    for statement in included:
+        grouping_id = query.grouping_id(statement.query.group_by)
+        items = statement.query.items
+
+        for m in statement.members:
+            members.append(BatchMember(
+                m.index,
+                tuple(exprs.index(items[p].expr) for p in m.positions),
+                m.limit if m.limit is not None else statement.query.limit.count,
+                grouping_id,
+            ))
+
+    return [BatchStatement(query, members)] + rest
+
+
+def plan_batch(queries: dict, use_grouping_sets: bool = None) -> list:
+    """
+    Turns {index: query AST} into the statements that answer all of them.
+
+    - Identical queries (same SQL and params) run once.
+    - Aggregate queries over the same FROM / JOINs / WHERE (same values)
+      with the same GROUP BY and ORDER BY become one query.
+    - Unordered aggregate queries over the same FROM / WHERE with different
+      GROUP BYs become one GROUPING SETS query (use_grouping_sets).
+    - Everything else runs as is.
+    """
+    if use_grouping_sets is None:
+        use_grouping_sets = BATCH_GROUPING_SETS_ENABLED
+
+    # 1. Deduplicate
+    unique = {}
+    duplicates = {}
+    for index, query in queries.items():
+        key = query.render()
+        if key in unique:
+            duplicates[unique[key]].append(index)
+        else:
+            unique[key] = index
+            duplicates[index] = []
+
+    # 2. Group mergeable queries by scan, then by grouping and order
+    statements = []
+    scans = {}
+    for index in unique.values():
+        query = queries[index]
+        if not _is_mergeable(query):
+            statements.append(_single(index, query))
+            continue
+
+        scan = scans.setdefault((query.from_table, query.joins, query.where), {})
+        scan.setdefault((query.group_by, query.order_by), []).append((index, query))
+
+    # 3. Merge
+    for units in scans.values():
+        merged = [_merge_same_grouping(members) for members in units.values()]
+        unordered = [s for s in merged if not s.query.order_by]
+
+        if use_grouping_sets and len(unordered) > 1:
+            statements.extend(_merge_grouping_sets(unordered))
+            statements.extend(s for s in merged if s.query.order_by)
+        else:
+            statements.extend(merged)
+
+    # 4. Duplicates read the same rows as their first occurrence
+    for statement in statements:
+        statement.members = [
+            dataclasses.replace(m, index=index)
+            for m in statement.members
+            for index in [m.index] + duplicates[m.index]
+        ]
+
+    return statements
+
+
+def split_rows(statement: BatchStatement, rows: list) -> dict:
+    """
+    {index: rows} for every member of statement, from the statement's rows.
+    """
+    if len(statement.members) == 1:
+        m = statement.members[0]
+        if m.grouping_id is None and m.limit is None and m.positions == tuple(range(len(statement.query.items))):
+            return {m.index: rows}
+
+    results = {m.index: [] for m in statement.members}
+
+    for row in rows:
+        for m in statement.members:
+            if m.grouping_id is not None and row[-1] != m.grouping_id:
+                continue
+            member_rows = results[m.index]
+            if m.limit is None or len(member_rows) < m.limit:
+                member_rows.append(tuple(row[p] for p in m.positions))
+
+    return results
+
+
+# ---------------------------------
+# Batch Execution (one connection)
+# ---------------------------------
+
+async def execute_batch_async(conn, statements: list, tenant: str, budget_tenant: str = None) -> list:
+    """
+    Cost-gates and runs statements on conn. Returns one outcome per
+    statement: {"rows": [...], "cost": {...}} or {"error": message,
+    "status": HTTP status, "cost": ...}.
+
+    Statements within the soft budget are pipelined (one round trip);
+    heavy ones then run one by one in the heavy lane. A failing statement
+    only fails its own members.
+    """
+    outcomes = [None] * len(statements)
+    light, heavy = [], []
+
+    with span("cost_estimate"):
+        for i, statement in enumerate(statements):
+            sql, params = statement.render()
+            try:
+                estimate = await COST_GATE.estimate_async(conn, tenant, sql, params)
+                cost = COST_GATE.check(budget_tenant or tenant, estimate)
+            except CostBudgetExceeded as e:
+                outcomes[i] = {"error": str(e), "status": 422, "cost": e.estimate}
+                continue
+            except Exception as e:
+                await conn.rollback()
+                outcomes[i] = {"error": str(e), "status": 400, "cost": None}
+                continue
+
+            outcomes[i] = {"cost": cost}
+            (heavy if cost["decision"] == "heavy" else light).append(i)
+
+    with span("execution"):
+        results = await execute_pipelined_async(
+            [statements[i].render() for i in light], timeout_ms=DEFAULT_TIMEOUT_MS, conn=conn
+        )
+
+    for i, rows in zip(light, results):
+        if isinstance(rows, Exception):
+            outcomes[i].update(error=str(rows), status=400)
+        else:
+            outcomes[i]["rows"] = rows
+
+    for i in heavy:
+        sql, params = statements[i].render()
+        try:
+            async with COST_GATE.async_heavy_lane():
+                with span("execution"):
+                    outcomes[i]["rows"] = await execute_with_timeout_async(
+                        sql, params, timeout_ms=DEFAULT_TIMEOUT_MS, conn=conn
+                    )
+        except HeavyLaneBusy as e:
+            outcomes[i].update(error=str(e), status=429)
+        except Exception as e:
+            await conn.rollback()
+            outcomes[i].update(error=str(e), status=400)
+
+    return outcomes
@@ -1,16 +1,36 @@
+from psycopg2.errors import IndeterminateDatatype, InvalidSqlStatementName
+
 from db import get_db_connection, release_db_connection
+from prepared_statements import PREPARED_STATEMENTS
 
 
 # ---------------------------------
 # Query Timeout Executor (V1)
 # ---------------------------------
 
-def execute_with_timeout(sql: str, timeout_ms: int = 2000):
+def _set_statement_timeout(cursor, timeout_ms: int):
+    cursor.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def _retry_unprepared(conn, cursor, sql: str, params, timeout_ms: int):
+    """
+    Re-runs sql without a prepared statement after a failed attempt.
+    The rollback also discards the timeout, so it is set again first.
+    """
+    conn.rollback()
+    _set_statement_timeout(cursor, timeout_ms)
+    cursor.execute(sql, params)
+
+
+def execute_with_timeout(sql: str, timeout_ms: int = 2000, params=None, prepare: bool = True):
     """
     Executes a SQL query with a hard PostgreSQL statement timeout.
 
     - timeout_ms is enforced by the database
     - Query is automatically canceled if it exceeds the limit
+    - params are bound by the driver (sql uses %s placeholders)
+    - prepare: run SELECTs through the per-connection prepared statement
+      registry, so repeat shapes skip parsing and planning
     """
 
     conn = None
@@ -19,9 +39,21 @@ def execute_with_timeout(sql: str, timeout_ms: int = 2000):
         cursor = conn.cursor()
 
         # Set timeout for this transaction
-        cursor.execute(f"SET statement_timeout = {timeout_ms}")
+        _set_statement_timeout(cursor, timeout_ms)
+
+        if prepare:
+            try:
+                PREPARED_STATEMENTS.execute(cursor, sql, params)
+            except InvalidSqlStatementName:
+                # The server dropped our statements (e.g. DISCARD ALL): start over
+                PREPARED_STATEMENTS.forget(conn)
+                _retry_unprepared(conn, cursor, sql, params, timeout_ms)
+            except IndeterminateDatatype:
+                PREPARED_STATEMENTS.skip(sql)
+                _retry_unprepared(conn, cursor, sql, params, timeout_ms)
+        else:
+            cursor.execute(sql, params)
 
-        cursor.execute(sql)
         rows = cursor.fetchall()
 
         cursor.close()
@@ -30,4 +62,3 @@ def execute_with_timeout(sql: str, timeout_ms: int = 2000):
     finally:
         if conn is not None:
             release_db_connection(conn)
-
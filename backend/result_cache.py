@@ -0,0 +1,436 @@
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # the payload codec falls back to the json module
+    orjson = None
+
+
+# ---------------------------------
+# Result-Set Cache (time-aware TTLs)
+# ---------------------------------
+
+RESULT_CACHE_MEMORY_BUDGET_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BUDGET_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL")
+
+# Socket timeout for the shared backend: a slow or unreachable backend
+# turns into a cache miss after this long, not a hung request
+RESULT_CACHE_BACKEND_TIMEOUT_S = float(os.getenv("RESULT_CACHE_BACKEND_TIMEOUT_S", "0.5"))
+
+# TTL policy (seconds)
+TTL_OPEN_RANGE_S = 60             # this_month, this_year, relative_* (data still arriving)
+TTL_NO_TIME_RANGE_S = 300         # whole-table aggregates
+TTL_CLOSED_PERIOD_S = 6 * 3600    # last_month, last_year (capped at the next date rollover)
+TTL_ABSOLUTE_PAST_S = 24 * 3600   # absolute ranges that ended before today
+
+OPEN_RANGE_TYPES = ("this_month", "this_year", "relative_days", "relative_months")
+CLOSED_PERIOD_TYPES = ("last_month", "last_year")
+
+
+def _seconds_until_midnight(now: datetime.datetime = None) -> int:
+    now = now or datetime.datetime.now()
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return max(int((tomorrow - now).total_seconds()), 1)
+
+
+def ttl_for_time_range(time_range) -> int:
+    """
+    Derives a result TTL from the plan's time_range.
+
+    - open ranges that include today get short TTLs
+    - closed calendar periods relative to today are stable, but their date
+      bounds (and so the cache key) change at midnight, so they expire then
+    - absolute ranges entirely in the past can be cached for a long time
+    """
+    if not time_range:
+        return TTL_NO_TIME_RANGE_S
+
+    range_type = time_range.get("type")
+
+    if range_type in OPEN_RANGE_TYPES:
+        return TTL_OPEN_RANGE_S
+
+    if range_type in CLOSED_PERIOD_TYPES:
+        return min(TTL_CLOSED_PERIOD_S, _seconds_until_midnight())
+
+    if range_type == "absolute_range":
+        try:
+            end_date = datetime.date.fromisoformat(time_range.get("end_date") or "")
+        except ValueError:
+            return TTL_OPEN_RANGE_S
+
+        if end_date < datetime.date.today():
+            return TTL_ABSOLUTE_PAST_S
+        return TTL_OPEN_RANGE_S
+
+    return TTL_OPEN_RANGE_S
+
+
+def make_result_cache_key(tenant: str, sql: str, role: str = None, params=None) -> str:
+    raw = "\x00".join([tenant or "", role or "", sql, repr(params)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# ---------------------------------
+# Payload Codec (data only)
+# ---------------------------------
+#
+# Payloads can come back from a shared backend, so they are plain JSON,
+# never pickle. Types JSON lacks are tagged as single-key objects, e.g.
+# {"$dec": "10.50"}; dicts themselves are tagged too ({"$map": {...}}), so
+# a json column value can never be mistaken for a tag.
+
+def _encode(value):
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else {"$float": str(value)}
+    if isinstance(value, tuple):
+        return {"$tuple": [_encode(v) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {"$map": {str(k): _encode(v) for k, v in value.items()}}
+    if isinstance(value, Decimal):
+        return {"$dec": str(value)}
+    # datetime is a date: check it first
+    if isinstance(value, datetime.datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {"$td": [value.days, value.seconds, value.microseconds]}
+    if isinstance(value, uuid.UUID):
+        return {"$uuid": str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode()}
+
+    raise ValueError(f"Result cache cannot store values of type {type(value).__name__}")
+
+
+_DECODERS = {
+    "$float": float,
+    "$tuple": lambda data: tuple(_decode(v) for v in data),
+    "$map": lambda data: {k: _decode(v) for k, v in data.items()},
+    "$dec": Decimal,
+    "$dt": datetime.datetime.fromisoformat,
+    "$date": datetime.date.fromisoformat,
+    "$time": datetime.time.fromisoformat,
+    "$td": lambda data: datetime.timedelta(*data),
+    "$uuid": uuid.UUID,
+    "$bytes": base64.b64decode,
+}
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        (tag, data), = value.items()
+        return _DECODERS[tag](data)
+    return value
+
+
+def dumps_payload(value) -> bytes:
+    """
+    Serializes a cached value (rows, dicts, scalars) to tagged JSON bytes.
+    Raises ValueError for types the codec does not know.
+    """
+    encoded = _encode(value)
+    if orjson is not None:
+        return orjson.dumps(encoded)
+    return json.dumps(encoded, separators=(",", ":")).encode()
+
+
+def loads_payload(payload: bytes):
+    """
+    Inverse of dumps_payload: the value with its Python types restored.
+    """
+    return _decode(orjson.loads(payload) if orjson is not None else json.loads(payload))
+
+
+# ---------------------------------
+# Shared Backends (Redis-compatible)
+# ---------------------------------
+
+class LocalKVBackend:
+    """
+    In-process stand-in for a Redis-compatible backend (get / setex / delete).
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def setex(self, key: str, ttl_s: int, value: bytes):
+        with self._lock:
+            self._data[key] = (time.time() + ttl_s, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+def redis_backend(url: str):
+    """
+    Returns a redis-py client for url. Requires the optional 'redis' package.
+    """
+    try:
+        import redis
+    except ImportError:
+        raise ValueError("RESULT_CACHE_REDIS_URL is set but the 'redis' package is not installed")
+
+    return redis.Redis.from_url(
+        url,
+        socket_timeout=RESULT_CACHE_BACKEND_TIMEOUT_S,
+        socket_connect_timeout=RESULT_CACHE_BACKEND_TIMEOUT_S,
+    )
+
+
+# ---------------------------------
+# Result Cache
+# ---------------------------------
+
+class ResultCache:
+    """
+    LRU result cache bounded by a memory budget (serialized bytes), with
+    per-entry TTLs and an optional shared backend behind it.
+
+    Values are stored as tagged JSON (dumps_payload), so cached rows keep
+    their Python types (Decimal, date, datetime) on a hit and nothing read
+    back from the shared backend is ever executed.
+
+    Backend calls are blocking network I/O: async callers use get_async /
+    set_async (and the *_many variants), which run them in a worker thread.
+    Backend errors count as a miss on read and skip the write on set.
+    """
+
+    # v2: tagged JSON payloads (v1 entries were pickles and are never read)
+    KEY_PREFIX = "whareiq:result:v2:"
+
+    def __init__(self, memory_budget_bytes: int = RESULT_CACHE_MEMORY_BUDGET_BYTES, backend=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.backend = backend
+
+        self._entries = OrderedDict()  # key -> (expires_at, payload bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+
+    # ---- memory tier (never blocks) ----
+
+    def _get_memory(self, key: str):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, payload = entry
+            if expires_at <= now:
+                self._remove_locked(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return loads_payload(payload), int(expires_at - now)
+
+    def _set_memory(self, key: str, payload: bytes, ttl_s: int):
+        # Entries larger than the whole budget are only kept in the backend
+        if len(payload) > self.memory_budget_bytes:
+            return
+
+        with self._lock:
+            self._remove_locked(key)
+            self._entries[key] = (time.monotonic() + ttl_s, payload)
+            self._bytes += len(payload)
+
+            while self._bytes > self.memory_budget_bytes:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+
+    # ---- shared backend (blocking) ----
+
+    def _read_backend(self, key: str):
+        try:
+            payload = self.backend.get(self.KEY_PREFIX + key)
+        except Exception:
+            # Backend down or timing out: a miss, not a failed query
+            self.backend_errors += 1
+            return None
+
+        if payload is None:
+            return None
+        try:
+            return loads_payload(payload)
+        except (ValueError, KeyError, TypeError):
+            # Unreadable shared entry: treat it as a miss
+            return None
+
+    def _read_backend_many(self, keys: list) -> dict:
+        return {key: self._read_backend(key) for key in keys}
+
+    def _write_backend_many(self, entries: list):
+        for key, payload, ttl_s in entries:
+            try:
+                self.backend.setex(self.KEY_PREFIX + key, int(ttl_s), payload)
+            except Exception:
+                self.backend_errors += 1
+
+    @staticmethod
+    def _encode(value, ttl_s: int):
+        """
+        Payload bytes for value, or None if it should not be cached.
+        """
+        if ttl_s <= 0:
+            return None
+        try:
+            return dumps_payload(value)
+        except (ValueError, TypeError):
+            # A column type the codec cannot represent: serve it uncached
+            return None
+
+    def _count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    # ---- public API ----
+
+    def get(self, key: str):
+        """
+        Returns (value, remaining_ttl_s) on a hit, or None on a miss.
+        Blocking; use get_async on the event loop.
+        """
+        return self.get_many([key])[key]
+
+    def get_many(self, keys: list) -> dict:
+        """
+        {key: (value, remaining_ttl_s) or None}, backend hits with ttl None.
+        """
+        results = {key: self._get_memory(key) for key in keys}
+        missing = [key for key, result in results.items() if result is None]
+
+        if missing and self.backend is not None:
+            for key, value in self._read_backend_many(missing).items():
+                if value is not None:
+                    results[key] = (value, None)
+
+        for result in results.values():
+            self._count(result is not None)
+        return results
+
+    async def get_async(self, key: str):
+        """
+        get() for async callers: the backend read runs in a worker thread.
+        """
+        return (await self.get_many_async([key]))[key]
+
+    async def get_many_async(self, keys: list) -> dict:
+        """
+        get_many() for async callers: memory hits are answered inline and
+        every backend read goes through one worker thread.
+        """
+        results = {key: self._get_memory(key) for key in keys}
+        missing = [key for key, result in results.items() if result is None]
+
+        if missing and self.backend is not None:
+            found = await asyncio.to_thread(self._read_backend_many, missing)
+            for key, value in found.items():
+                if value is not None:
+                    results[key] = (value, None)
+
+        for result in results.values():
+            self._count(result is not None)
+        return results
+
+    def set(self, key: str, value, ttl_s: int):
+        """
+        Blocking; use set_async on the event loop.
+        """
+        self.set_many([(key, value, ttl_s)])
+
+    def set_many(self, entries: list):
+        """
+        Caches every (key, value, ttl_s) of entries.
+        """
+        encoded = self._encode_many(entries)
+        if encoded and self.backend is not None:
+            self._write_backend_many(encoded)
+
+    async def set_async(self, key: str, value, ttl_s: int):
+        await self.set_many_async([(key, value, ttl_s)])
+
+    async def set_many_async(self, entries: list):
+        """
+        set_many() for async callers: backend writes run in a worker thread.
+        """
+        encoded = self._encode_many(entries)
+        if encoded and self.backend is not None:
+            await asyncio.to_thread(self._write_backend_many, encoded)
+
+    def _encode_many(self, entries: list) -> list:
+        """
+        Encodes entries and stores them in memory; returns the
+        [(key, payload, ttl_s)] still to be written to the backend.
+        """
+        encoded = []
+        for key, value, ttl_s in entries:
+            payload = self._encode(value, ttl_s)
+            if payload is None:
+                continue
+            self._set_memory(key, payload, ttl_s)
+            encoded.append((key, payload, ttl_s))
+        return encoded
+
+    def _remove_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "backend_errors": self.backend_errors,
+        }
+
+
+RESULT_CACHE = ResultCache(
+    backend=redis_backend(RESULT_CACHE_REDIS_URL) if RESULT_CACHE_REDIS_URL else None
+)
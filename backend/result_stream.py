@@ -0,0 +1,286 @@
+import datetime
+import io
+import json
+from decimal import Decimal, localcontext
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow streaming is optional
+    pa = None
+
+try:
+    import orjson
+except ImportError:  # columnar responses fall back to the json module
+    orjson = None
+
+
+# ---------------------------------
+# Streaming Result Encoders
+# ---------------------------------
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+STREAM_FORMATS = ("ndjson", "arrow")
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _json_line(value) -> bytes:
+    # default=str covers Decimal, date and datetime values
+    return (json.dumps(value, default=str) + "\n").encode()
+
+
+async def encode_ndjson(batches, sql: str):
+    """
+    Encodes (columns, rows) batches as NDJSON:
+
+      {"type": "meta", "sql": ..., "columns": [...]}
+      [row values...]            one line per row
+      {"type": "end", "row_count": n}
+
+    Errors after the first byte cannot change the HTTP status, so they are
+    reported as a final {"type": "error"} line.
+    """
+    row_count = 0
+    sent_meta = False
+
+    try:
+        async for columns, rows in batches:
+            if not sent_meta:
+                yield _json_line({"type": "meta", "sql": sql, "columns": columns})
+                sent_meta = True
+
+            if rows:
+                yield b"".join(_json_line(list(row)) for row in rows)
+                row_count += len(rows)
+
+    except Exception as e:
+        yield _json_line({"type": "error", "detail": str(e)})
+        return
+
+    if not sent_meta:
+        yield _json_line({"type": "meta", "sql": sql, "columns": []})
+
+    yield _json_line({"type": "end", "row_count": row_count})
+
+
+# Unconstrained numeric (e.g. SUM(numeric)) has no fixed scale, so the
+# stream schema uses a wide decimal and rounds values to it. Columns
+# with values that do not fit (or NaN / Infinity) are sent as doubles.
+ARROW_DECIMAL_PRECISION = 38
+ARROW_DECIMAL_SCALE = 10
+
+
+def _fits_decimal(value: Decimal) -> bool:
+    # decimal128(38, 10) leaves 28 digits before the point
+    return value.is_finite() and value.adjusted() < ARROW_DECIMAL_PRECISION - ARROW_DECIMAL_SCALE
+
+
+def _stream_field_type(values: list):
+    """
+    Arrow type for a column, from the first batch's values, widened so
+    later batches still fit.
+    """
+    decimals = [v for v in values if isinstance(v, Decimal)]
+    if decimals:
+        if all(_fits_decimal(v) for v in decimals):
+            return pa.decimal128(ARROW_DECIMAL_PRECISION, ARROW_DECIMAL_SCALE)
+        # Too wide for decimal128, or NaN / Infinity: doubles
+        return pa.float64()
+
+    inferred = pa.array(values).type
+    if pa.types.is_null(inferred):
+        # All-NULL first batch: fall back to text for the rest of the stream
+        return pa.string()
+    return inferred
+
+
+def _arrow_array(values: list, arrow_type):
+    if pa.types.is_decimal(arrow_type):
+        if not all(_fits_decimal(v) for v in values if isinstance(v, Decimal)):
+            # The schema was fixed by an earlier batch
+            raise ValueError(
+                f"numeric value does not fit the stream's {arrow_type} column"
+            )
+        quantum = Decimal(1).scaleb(-arrow_type.scale)
+        with localcontext() as ctx:
+            ctx.prec = arrow_type.precision
+            values = [v.quantize(quantum) if isinstance(v, Decimal) else v for v in values]
+    elif pa.types.is_floating(arrow_type):
+        values = [float(v) if isinstance(v, Decimal) else v for v in values]
+    elif pa.types.is_string(arrow_type):
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def _record_batch(columns: list, rows: list, schema=None):
+    if not rows:
+        # Nothing to infer types from: text columns, so the schema still
+        # carries the column names
+        if schema is None:
+            schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+        return pa.record_batch([pa.array([], field.type) for field in schema], schema=schema)
+
+    arrays = [list(values) for values in zip(*rows)]
+
+    if schema is None:
+        schema = pa.schema([
+            pa.field(name, _stream_field_type(values))
+            for name, values in zip(columns, arrays)
+        ])
+
+    return pa.record_batch(
+        [_arrow_array(values, field.type) for values, field in zip(arrays, schema)],
+        schema=schema,
+    )
+
+
+async def encode_arrow(batches, sql: str):
+    """
+    Encodes (columns, rows) batches as an Arrow IPC stream.
+    The schema is inferred from the first batch and reused afterwards;
+    the executed SQL is attached as schema metadata. A result without
+    rows is still a valid stream (schema only).
+    """
+    if pa is None:
+        raise ValueError("Arrow streaming requires the 'pyarrow' package")
+
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+
+    async for columns, rows in batches:
+        batch = _record_batch(columns, rows, schema)
+
+        if writer is None:
+            batch = batch.replace_schema_metadata({"sql": sql})
+            schema = batch.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(batch)
+
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, pa.schema([], metadata={"sql": sql}))
+
+    writer.close()
+    yield sink.getvalue()
+
+
+# ---------------------------------
+# Columnar Response Encoders (/query)
+# ---------------------------------
+#
+# "rows" (the default) leaves the response to FastAPI, whose
+# jsonable_encoder walks every value in Python. "columnar" sends column
+# names and types once, then one value array per column, serialized by
+# orjson; "arrow" sends the result as a single Arrow IPC record batch.
+
+JSON_MEDIA_TYPE = "application/json"
+
+RESPONSE_FORMATS = ("rows", "columnar", "arrow")
+
+# Checked in order: bool is an int, datetime is a date
+COLUMN_TYPES = (
+    (bool, "boolean"),
+    (int, "bigint"),
+    (float, "double precision"),
+    (Decimal, "numeric"),
+    (datetime.datetime, "timestamp"),
+    (datetime.date, "date"),
+    (datetime.time, "time"),
+    (datetime.timedelta, "interval"),
+    (str, "text"),
+)
+
+
+def column_type(values) -> str:
+    """
+    Type of a result column, from its first non-NULL value ("null" if none).
+    """
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+            return "timestamptz"
+        for python_type, name in COLUMN_TYPES:
+            if isinstance(value, python_type):
+                return name
+        return "text"
+    return "null"
+
+
+def _json_default(value):
+    # Same numbers as FastAPI's Decimal encoder, so "rows" and "columnar" agree
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            return None
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps_json(content) -> bytes:
+    """
+    Compact JSON: orjson when installed (dates natively, Decimal through
+    _json_default), else the json module with the same conversions.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default)
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode()
+
+
+def _numeric_values(values) -> list:
+    # A typed numeric column needs no int / float distinction per value;
+    # float() per column is far cheaper than a serializer callback per value
+    return [None if v is None or not v.is_finite() else float(v) for v in values]
+
+
+def to_columns(columns: list, rows: list) -> dict:
+    """
+    {"columns": [{"name", "type"}, ...], "data": [[column values], ...], "row_count": n}
+
+    numeric columns are sent as JSON numbers (doubles, like the rows format).
+    """
+    data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    types = [column_type(values) for values in data]
+
+    for i, dtype in enumerate(types):
+        if dtype == "numeric":
+            data[i] = _numeric_values(data[i])
+
+    return {
+        "columns": [{"name": name, "type": dtype} for name, dtype in zip(columns, types)],
+        "data": data,
+        "row_count": len(rows),
+    }
+
+
+def encode_columnar(result: dict, columns: list, rows: list) -> bytes:
+    """
+    A /query response body in columnar form: every key of result (answer,
+    sql, cache, ...) plus to_columns(columns, rows).
+    """
+    return dumps_json({**result, **to_columns(columns, rows)})
+
+
+def encode_arrow_result(columns: list, rows: list, metadata: dict) -> bytes:
+    """
+    The whole result as an Arrow IPC stream with one record batch;
+    metadata (str → str) is attached to the schema.
+    """
+    if pa is None:
+        raise ValueError("Arrow responses require the 'pyarrow' package")
+
+    batch = _record_batch(columns, rows).replace_schema_metadata(metadata)
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue()
@@ -0,0 +1,712 @@
+import asyncio
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+from db import (
+    execute_select, get_db_connection, release_db_connection,
+    get_user_database_credentials, connect_user_database, tenant_key,
+)
+from schema_reader import load_physical_schema, foreign_key_constraints, ROLLUP_TABLE_PREFIX, INTERNAL_SCHEMA_KEY
+from semantic_catalog import get_semantic_catalog
+from time_filter_resolver import select_time_column
+from sql_ast import Aggregate, Column, Fragment, Join, Param, Predicate, Select, SelectItem, TimeBucket
+from ttl_cache import TTLCache
+
+
+# ---------------------------------
+# Rollup Settings
+# ---------------------------------
+
+# Dimensions whose estimated distinct count (pg_stats) is above this are
+# left out of rollups, so a rollup stays much smaller than its fact table
+ROLLUP_MAX_DIMENSION_CARDINALITY = int(os.getenv("ROLLUP_MAX_DIMENSION_CARDINALITY", "1000"))
+ROLLUP_MAX_DIMENSIONS = int(os.getenv("ROLLUP_MAX_DIMENSIONS", "6"))
+
+# Days before the refresh watermark that are recomputed (late-arriving rows)
+ROLLUP_REFRESH_LOOKBACK_DAYS = int(os.getenv("ROLLUP_REFRESH_LOOKBACK_DAYS", "1"))
+
+# Queries are only routed to rollups refreshed at most this long ago
+ROLLUP_MAX_STALENESS_S = int(os.getenv("ROLLUP_MAX_STALENESS_S", "3600"))
+
+# Background refresh period (0 disables it); well under the staleness
+# limit, so routing never lapses between two refreshes
+ROLLUP_REFRESH_INTERVAL_S = float(os.getenv("ROLLUP_REFRESH_INTERVAL_S", "1800"))
+
+ROLLUP_OPERATIONS = ("sum", "count", "avg", "min", "max")
+
+# SUM over stored per-day sums / counts widens the type; cast back to what
+# the same aggregate returns on the fact table
+_INTEGER_TYPES = ("smallint", "integer")
+_FLOAT_TYPES = ("real", "double precision")
+
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def _identifier(*parts: str) -> str:
+    """
+    Builds a PostgreSQL-safe column / table name from parts, hashing it
+    down when it would exceed the identifier length limit.
+    """
+    name = "_".join(parts).replace(".", "_").lower()
+    if len(name) <= MAX_IDENTIFIER_LENGTH:
+        return name
+    digest = hashlib.sha256(name.encode()).hexdigest()[:10]
+    return name[:MAX_IDENTIFIER_LENGTH - 11] + "_" + digest
+
+
+# ---------------------------------
+# Rollup Definition
+# ---------------------------------
+
+@dataclasses.dataclass(frozen=True)
+class RollupDefinition:
+    """
+    A daily-grain pre-aggregation of one fact table.
+
+    - dimensions: (table, column) pairs, from the fact table or a table it
+      references directly; joined tables are LEFT JOINed and a per-table
+      "matched" flag is kept, so INNER JOIN queries stay exact
+    - measures: (column, data_type) numeric columns of the fact table;
+      each gets sum / count / min / max columns
+    """
+    fact_table: str
+    time_column: str
+    time_type: str
+    dimensions: tuple
+    measures: tuple
+    joins: tuple  # ((table, on), ...) with on as ((left, right), ...) column pairs
+
+    @property
+    def name(self) -> str:
+        digest = hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:8]
+        return _identifier(ROLLUP_TABLE_PREFIX + self.fact_table, digest)
+
+    def dimension_column(self, table: str, column: str) -> str:
+        return _identifier("d", table, column)
+
+    def matched_column(self, table: str) -> str:
+        return _identifier("j", table)
+
+    def measure_column(self, operation: str, column: str) -> str:
+        return _identifier(operation, column)
+
+    def to_dict(self) -> dict:
+        return {
+            "fact_table": self.fact_table,
+            "time_column": self.time_column,
+            "time_type": self.time_type,
+            "dimensions": [list(d) for d in self.dimensions],
+            "measures": [list(m) for m in self.measures],
+            "joins": [[table, [[list(l), list(r)] for l, r in on]] for table, on in self.joins],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            fact_table=data["fact_table"],
+            time_column=data["time_column"],
+            time_type=data["time_type"],
+            dimensions=tuple(tuple(d) for d in data["dimensions"]),
+            measures=tuple(tuple(m) for m in data["measures"]),
+            joins=tuple(
+                (table, tuple((tuple(l), tuple(r)) for l, r in on))
+                for table, on in data["joins"]
+            ),
+        )
+
+
+# ---------------------------------
+# Definitions from semantic_mappings
+# ---------------------------------
+
+DIMENSION_CARDINALITIES_SQL = """
+    SELECT schemaname, tablename, attname, n_distinct
+    FROM pg_catalog.pg_stats;
+"""
+
+
+def fetch_dimension_cardinalities(cursor=None) -> dict:
+    """
+    Returns {(table, column): estimated distinct values} from pg_stats, of
+    the internal database or of cursor's database. Negative n_distinct (a
+    fraction of the row count) means the column grows with the table, so
+    it is reported as unbounded.
+    """
+    if cursor is None:
+        rows = execute_select(DIMENSION_CARDINALITIES_SQL)
+    else:
+        cursor.execute(DIMENSION_CARDINALITIES_SQL)
+        rows = cursor.fetchall()
+
+    cardinalities = {}
+    for schema, table, column, n_distinct in rows:
+        key = table if schema == "public" else f"{schema}.{table}"
+        cardinalities[(key, column)] = n_distinct if n_distinct is not None and n_distinct > 0 else float("inf")
+    return cardinalities
+
+
+def define_rollups(catalog=None, physical_schema: dict = None, cardinalities: dict = None) -> list:
+    """
+    Proposes one daily rollup per fact table (a mapped table with measures
+    and a time column), over its low-cardinality mapped dimensions and
+    those of the tables it references directly.
+    """
+    catalog = catalog or get_semantic_catalog()
+    physical_schema = physical_schema or load_physical_schema()
+    if cardinalities is None:
+        cardinalities = fetch_dimension_cardinalities()
+
+    definitions = []
+
+    for fact_table in sorted(catalog.tables):
+        mapping = catalog.mappings[fact_table]
+        measure_columns = sorted(set((mapping.get("measures") or {}).values()))
+        if not measure_columns or fact_table not in physical_schema:
+            continue
+
+        time_column = select_time_column(physical_schema[fact_table])
+        if time_column is None:
+            continue
+
+        fact_columns = physical_schema[fact_table]["columns"]
+
+        # Candidate tables: the fact table plus direct foreign-key targets
+        joins = {}
+        for fk in foreign_key_constraints(fact_table, physical_schema[fact_table]):
+            ref_table = fk["references_table"]
+            if ref_table in catalog.tables and ref_table not in joins:
+                joins[ref_table] = tuple(
+                    ((fact_table, col), (ref_table, ref_col))
+                    for col, ref_col in zip(fk["columns"], fk["references_columns"])
+                )
+
+        candidates = []
+        for table in [fact_table] + sorted(joins.keys()):
+            for column in sorted(set((catalog.mappings[table].get("dimensions") or {}).values())):
+                if table == fact_table and column == time_column:
+                    continue
+                cardinality = cardinalities.get((table, column), float("inf"))
+                if cardinality <= ROLLUP_MAX_DIMENSION_CARDINALITY:
+                    candidates.append((cardinality, table, column))
+
+        candidates.sort()
+        dimensions = tuple((table, column) for _, table, column in candidates[:ROLLUP_MAX_DIMENSIONS])
+        used_tables = {table for table, _ in dimensions}
+
+        definitions.append(RollupDefinition(
+            fact_table=fact_table,
+            time_column=time_column,
+            time_type=fact_columns[time_column],
+            dimensions=dimensions,
+            measures=tuple((column, fact_columns.get(column, "numeric")) for column in measure_columns),
+            joins=tuple((table, on) for table, on in sorted(joins.items()) if table in used_tables),
+        ))
+
+    return definitions
+
+
+# ---------------------------------
+# Rollup Build / Incremental Refresh
+# ---------------------------------
+
+def build_rollup_query(rollup: RollupDefinition, since: datetime.date = None) -> Select:
+    """
+    The aggregation that fills the rollup, as a query AST. With since,
+    only days on or after it are aggregated.
+    """
+    fact = rollup.fact_table
+    bucket = Fragment("date_trunc('day', {})::date", (Column(fact, rollup.time_column),))
+
+    items = [SelectItem(bucket, "bucket")]
+    group_by = [bucket]
+
+    for table, column in rollup.dimensions:
+        items.append(SelectItem(Column(table, column), rollup.dimension_column(table, column)))
+        group_by.append(Column(table, column))
+
+    for table, on in rollup.joins:
+        ref_table, ref_column = on[0][1]
+        matched = Fragment("({} IS NOT NULL)", (Column(ref_table, ref_column),))
+        items.append(SelectItem(matched, rollup.matched_column(table)))
+        group_by.append(matched)
+
+    for column, _ in rollup.measures:
+        for operation in ("sum", "count", "min", "max"):
+            items.append(SelectItem(
+                Aggregate(operation, Column(fact, column)),
+                rollup.measure_column(operation, column)
+            ))
+    items.append(SelectItem(Fragment("COUNT(*)"), "row_count"))
+
+    joins = tuple(
+        Join(table, tuple((Column(*l), Column(*r)) for l, r in on), "LEFT")
+        for table, on in rollup.joins
+    )
+
+    where = ()
+    if since is not None:
+        where = (Predicate(Column(fact, rollup.time_column), ">=", Param(since.isoformat(), cast="date")),)
+
+    return Select(
+        items=tuple(items),
+        from_table=fact,
+        joins=joins,
+        where=where,
+        group_by=tuple(group_by),
+    )
+
+
+def ensure_rollup_registry(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS semantic_rollups (
+            name TEXT PRIMARY KEY,
+            fact_table TEXT NOT NULL,
+            definition JSONB NOT NULL,
+            refreshed_through DATE,
+            refreshed_at TIMESTAMPTZ
+        );
+    """)
+
+
+def refresh_rollup(rollup: RollupDefinition, conn=None, tenant: str = INTERNAL_SCHEMA_KEY) -> dict:
+    """
+    Creates the rollup table on first use, then recomputes only the days
+    from (watermark - ROLLUP_REFRESH_LOOKBACK_DAYS) onward, in one
+    transaction. The watermark advances to today.
+
+    The table and its registry row live in conn's database (the internal
+    database if omitted); tenant is that database's registry key.
+    """
+    borrowed = conn is None
+    if borrowed:
+        conn = get_db_connection()
+
+    name = rollup.name
+
+    try:
+        cursor = conn.cursor()
+        ensure_rollup_registry(cursor)
+
+        create_sql, create_params = build_rollup_query(rollup).render()
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} AS {create_sql} WITH NO DATA", create_params)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {_identifier(name, 'bucket')} ON {name} (bucket)")
+
+        cursor.execute("SELECT refreshed_through FROM semantic_rollups WHERE name = %s", (name,))
+        row = cursor.fetchone()
+        watermark = row[0] if row else None
+
+        since = None
+        if watermark is not None:
+            since = watermark - datetime.timedelta(days=ROLLUP_REFRESH_LOOKBACK_DAYS)
+            cursor.execute(f"DELETE FROM {name} WHERE bucket >= %s", (since,))
+        else:
+            cursor.execute(f"TRUNCATE {name}")
+
+        fill_sql, fill_params = build_rollup_query(rollup, since).render()
+        cursor.execute(f"INSERT INTO {name} {fill_sql}", fill_params)
+        inserted = cursor.rowcount
+
+        cursor.execute("""
+            INSERT INTO semantic_rollups (name, fact_table, definition, refreshed_through, refreshed_at)
+            VALUES (%s, %s, %s, CURRENT_DATE, now())
+            ON CONFLICT (name)
+            DO UPDATE SET
+                definition = EXCLUDED.definition,
+                refreshed_through = EXCLUDED.refreshed_through,
+                refreshed_at = EXCLUDED.refreshed_at;
+        """, (name, rollup.fact_table, json.dumps(rollup.to_dict())))
+
+        conn.commit()
+        cursor.close()
+
+        invalidate_rollups(tenant)
+        return {"name": name, "since": since, "rows": inserted}
+
+    except Exception as e:
+        conn.rollback()
+        raise Exception(f"Rollup refresh failed for {name}: {str(e)}")
+
+    finally:
+        if borrowed:
+            release_db_connection(conn)
+
+
+def refresh_rollups(definitions: list = None, conn=None, tenant: str = INTERNAL_SCHEMA_KEY) -> list:
+    """
+    Refreshes every rollup of conn's database (the internal database if
+    omitted). Without definitions, they are derived from the semantic
+    mappings and that database's own schema and statistics.
+    """
+    if definitions is None:
+        if conn is None:
+            definitions = define_rollups()
+        else:
+            cursor = conn.cursor()
+            try:
+                cardinalities = fetch_dimension_cardinalities(cursor)
+            finally:
+                cursor.close()
+            definitions = define_rollups(
+                physical_schema=load_physical_schema(conn=conn, cache_key=tenant),
+                cardinalities=cardinalities,
+            )
+    return [refresh_rollup(rollup, conn=conn, tenant=tenant) for rollup in definitions]
+
+
+def refresh_tenant_rollups(user_id: str, creds: dict = None) -> list:
+    """
+    Refreshes the rollups in a user's own database, over a dedicated
+    connection (rollup DDL and long INSERTs stay off the query pools).
+    """
+    creds = creds or get_user_database_credentials(user_id)
+    if not creds:
+        raise ValueError("No database connected for this user")
+
+    conn = connect_user_database(creds)
+    try:
+        return refresh_rollups(conn=conn, tenant=tenant_key(user_id, creds))
+    finally:
+        conn.close()
+
+
+# ---------------------------------
+# Scheduled Refresh
+# ---------------------------------
+#
+# Every ROLLUP_REFRESH_INTERVAL_S the internal database and every tenant
+# that asked for rollups (POST /rollups/refresh) since startup are
+# refreshed. After a restart a tenant rejoins on its next request; until
+# then its rollups go stale and routing stops reading them.
+
+_ROLLUP_USERS = set()
+_rollup_users_lock = threading.Lock()
+_last_refresh = {}
+
+
+def register_rollup_user(user_id: str):
+    with _rollup_users_lock:
+        _ROLLUP_USERS.add(user_id)
+
+
+def refresh_all_rollups() -> dict:
+    """
+    One scheduled pass: {database: [refresh results] or {"error": ...}}.
+    A failing database does not stop the others.
+    """
+    with _rollup_users_lock:
+        user_ids = sorted(_ROLLUP_USERS)
+
+    targets = [(INTERNAL_SCHEMA_KEY, refresh_rollups)]
+    targets += [(f"user:{user_id}", lambda user_id=user_id: refresh_tenant_rollups(user_id)) for user_id in user_ids]
+
+    results = {}
+    for name, refresh in targets:
+        try:
+            results[name] = refresh()
+        except Exception as e:
+            results[name] = {"error": str(e)}
+
+    _last_refresh.update(finished_at=time.time(), results=results)
+    return results
+
+
+def rollup_refresh_status() -> dict:
+    """
+    Registered tenants and the outcome of the last scheduled pass.
+    """
+    with _rollup_users_lock:
+        users = len(_ROLLUP_USERS)
+    return {"interval_s": ROLLUP_REFRESH_INTERVAL_S, "tenants": users, "last_refresh": dict(_last_refresh)}
+
+
+async def run_rollup_refresh_loop(interval_s: float = None):
+    """
+    Runs refresh_all_rollups (in a worker thread) every interval_s until
+    cancelled; started with the app.
+    """
+    interval_s = ROLLUP_REFRESH_INTERVAL_S if interval_s is None else interval_s
+    while True:
+        await asyncio.to_thread(refresh_all_rollups)
+        await asyncio.sleep(interval_s)
+
+
+# ---------------------------------
+# Active Rollups (for routing)
+# ---------------------------------
+#
+# Each database has its own registry (semantic_rollups); queries are only
+# routed to rollups registered in the database they run on.
+
+ROLLUP_REGISTRY_EXISTS_SQL = "SELECT to_regclass('semantic_rollups') IS NOT NULL;"
+ROLLUP_REGISTRY_SQL = "SELECT definition, refreshed_at FROM semantic_rollups;"
+
+# registry key (INTERNAL_SCHEMA_KEY or a tenant key) -> rollups
+_ACTIVE_ROLLUPS = TTLCache(maxsize=1024, ttl_s=60.0)
+
+
+def _registered_rollups(rows) -> list:
+    return [
+        (RollupDefinition.from_dict(definition), refreshed_at.timestamp() if refreshed_at else 0.0)
+        for definition, refreshed_at in rows
+    ]
+
+
+def get_rollups() -> list:
+    """
+    Returns [(RollupDefinition, refreshed_at epoch seconds)] for every
+    rollup registered in the internal database, cached for a minute.
+    """
+    cached = _ACTIVE_ROLLUPS.get(INTERNAL_SCHEMA_KEY)
+    if cached is not None:
+        return cached
+
+    # No registry yet (no rollup was ever refreshed) → nothing to route to
+    rows = []
+    if execute_select(ROLLUP_REGISTRY_EXISTS_SQL)[0][0]:
+        rows = execute_select(ROLLUP_REGISTRY_SQL)
+
+    rollups = _registered_rollups(rows)
+    _ACTIVE_ROLLUPS.set(INTERNAL_SCHEMA_KEY, rollups)
+    return rollups
+
+
+async def get_tenant_rollups_async(tenant: str, connect) -> list:
+    """
+    get_rollups() for a tenant database. connect() returns an async
+    context manager yielding a connection to it (e.g. a tenant pool
+    connection), only entered when the cached registry has expired.
+    """
+    cached = _ACTIVE_ROLLUPS.get(tenant)
+    if cached is not None:
+        return cached
+
+    rows = []
+    async with connect() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(ROLLUP_REGISTRY_EXISTS_SQL)
+            if (await cur.fetchone())[0]:
+                await cur.execute(ROLLUP_REGISTRY_SQL)
+                rows = await cur.fetchall()
+
+    rollups = _registered_rollups(rows)
+    _ACTIVE_ROLLUPS.set(tenant, rollups)
+    return rollups
+
+
+def invalidate_rollups(tenant: str = None):
+    """
+    Drops the cached registry of tenant (every database if None).
+    """
+    if tenant is None:
+        _ACTIVE_ROLLUPS.clear()
+    else:
+        _ACTIVE_ROLLUPS.pop(tenant)
+
+
+# ---------------------------------
+# Query Rewrite (fact query → rollup query)
+# ---------------------------------
+
+def _rewrite_aggregate(rollup: RollupDefinition, name: str, aggregate: Aggregate):
+    column = aggregate.arg
+    if not isinstance(column, Column) or column.table != rollup.fact_table:
+        return None
+
+    measures = dict(rollup.measures)
+    if column.name not in measures or aggregate.operation not in ROLLUP_OPERATIONS:
+        return None
+
+    dtype = measures[column.name]
+
+    def stored(operation: str) -> Column:
+        return Column(name, rollup.measure_column(operation, column.name))
+
+    if aggregate.operation == "sum":
+        if dtype in _INTEGER_TYPES:
+            return Fragment("SUM({})::bigint", (stored("sum"),))
+        return Aggregate("sum", stored("sum"))
+
+    if aggregate.operation == "count":
+        return Fragment("COALESCE(SUM({}), 0)::bigint", (stored("count"),))
+
+    if aggregate.operation in ("min", "max"):
+        return Aggregate(aggregate.operation, stored(aggregate.operation))
+
+    # avg = SUM(per-day sums) / SUM(per-day non-null counts)
+    cast = "double precision" if dtype in _FLOAT_TYPES else "numeric"
+    return Fragment(f"(SUM({{}})::{cast} / NULLIF(SUM({{}}), 0))", (stored("sum"), stored("count")))
+
+
+def _is_day_bound(bound) -> bool:
+    """
+    True when bound is a bound parameter that starts a whole day: cast to
+    date, or a plain ISO date ("2024-01-15", as resolve_time_filter emits)
+    whatever the cast. "2024-01-15 12:00" is not.
+    """
+    if not isinstance(bound, Param):
+        return False
+    if bound.cast == "date":
+        return True
+
+    value = bound.value
+    if isinstance(value, datetime.datetime):
+        return value.time() == datetime.time(0) and value.tzinfo is None
+    if isinstance(value, datetime.date):
+        return True
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def rewrite_for_rollup(query: Select, rollup: RollupDefinition):
+    """
+    Rewrites a fact-table query to read rollup instead, or returns None if
+    the rollup cannot answer it exactly.
+
+    Answerable when every selected column is a rollup dimension (or a time
+    grain of the fact table's time column), every
+    aggregate is SUM / COUNT / AVG / MIN / MAX over a rollup measure, every
+    join is one of the rollup's joins, and every WHERE predicate is either a
+    day-aligned bound on the fact table's time column (a midnight >= / <
+    bound for timestamps) or a filter on a rollup dimension. HAVING and
+    ORDER BY are rewritten the same way as the items.
+    """
+    if query.from_table != rollup.fact_table:
+        return None
+
+    name = rollup.name
+    dimensions = {
+        (table, column): Column(name, rollup.dimension_column(table, column))
+        for table, column in rollup.dimensions
+    }
+    rollup_joins = dict(rollup.joins)
+    time_column = (rollup.fact_table, rollup.time_column)
+
+    # Joins → "matched" flags (INNER JOIN keeps only rows that matched)
+    where = []
+    for join in query.joins:
+        on = tuple(((l.table, l.name), (r.table, r.name)) for l, r in join.on)
+        if join.join_type != "INNER" or rollup_joins.get(join.table) != on:
+            return None
+        where.append(Predicate(Column(name, rollup.matched_column(join.table)), "IS TRUE"))
+
+    def rewrite_expr(expr):
+        if isinstance(expr, Column):
+            return dimensions.get((expr.table, expr.name))
+        if isinstance(expr, Aggregate):
+            return _rewrite_aggregate(rollup, name, expr)
+        if isinstance(expr, Fragment):
+            args = tuple(rewrite_expr(arg) if arg.columns() else arg for arg in expr.args)
+            return None if None in args else Fragment(expr.sql, args)
+        if isinstance(expr, TimeBucket):
+            # Daily buckets nest exactly in every coarser grain
+            column = expr.column
+            if not isinstance(column, Column) or (column.table, column.name) != time_column:
+                return None
+            return TimeBucket(expr.grain, Column(name, "bucket"), date_column=True)
+        return None
+
+    def rewrite_predicate(predicate):
+        left = rewrite_expr(predicate.left)
+        if left is None or (predicate.right is not None and predicate.right.columns()):
+            return None
+        return Predicate(left, predicate.op, predicate.right)
+
+    items = []
+    has_aggregate = False
+    for item in query.items:
+        expr = rewrite_expr(item.expr)
+        if expr is None:
+            return None
+        has_aggregate = has_aggregate or isinstance(item.expr, Aggregate)
+        items.append(SelectItem(expr, item.alias))
+
+    # Plain row listings cannot be reproduced from aggregated days
+    if not has_aggregate:
+        return None
+
+    group_by = []
+    for expr in query.group_by:
+        rewritten = rewrite_expr(expr)
+        if rewritten is None:
+            return None
+        group_by.append(rewritten)
+
+    # Bounds on a timestamp are exact on the daily bucket only for >= / <
+    # and a bound at midnight; with a date column every comparison is exact
+    date_column = rollup.time_type == "date"
+    exact_ops = (">=", "<", ">", "<=", "=") if date_column else (">=", "<")
+
+    for predicate in query.where:
+        left = predicate.left
+        if isinstance(left, Column) and (left.table, left.name) == time_column:
+            if predicate.op not in exact_ops or predicate.right is None or predicate.right.columns():
+                return None
+            if not date_column and not _is_day_bound(predicate.right):
+                return None
+            where.append(Predicate(Column(name, "bucket"), predicate.op, predicate.right))
+            continue
+
+        # Rollup rows are grouped by every dimension, so filtering them on a
+        # dimension keeps exactly the fact rows the original filter would
+        rewritten = rewrite_predicate(predicate)
+        if rewritten is None or isinstance(predicate.left, Aggregate):
+            return None
+        where.append(rewritten)
+
+    having = []
+    for predicate in query.having:
+        rewritten = rewrite_predicate(predicate)
+        if rewritten is None:
+            return None
+        having.append(rewritten)
+
+    order_by = []
+    for order in query.order_by:
+        expr = rewrite_expr(order.expr)
+        if expr is None:
+            return None
+        order_by.append(dataclasses.replace(order, expr=expr))
+
+    return dataclasses.replace(
+        query,
+        items=tuple(items),
+        from_table=name,
+        joins=(),
+        where=tuple(where),
+        group_by=tuple(group_by),
+        having=tuple(having),
+        order_by=tuple(order_by),
+    )
+
+
+def route_to_rollup(query: Select, rollups: list = None):
+    """
+    Returns query rewritten onto the smallest fresh rollup that can answer
+    it, or None.
+    """
+    if rollups is None:
+        rollups = get_rollups()
+
+    now = time.time()
+    candidates = sorted(
+        (len(rollup.dimensions), rollup.name, rollup)
+        for rollup, refreshed_at in rollups
+        if rollup.fact_table == query.from_table and now - refreshed_at <= ROLLUP_MAX_STALENESS_S
+    )
+
+    for _, _, rollup in candidates:
+        rewritten = rewrite_for_rollup(query, rollup)
+        if rewritten is not None:
+            return rewritten
+
+    return None
@@ -0,0 +1,367 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from metrics import register_collector, span
+
+
+# ---------------------------------
+# Admission Control Settings
+# ---------------------------------
+
+def _env_float(name: str, default: str):
+    value = os.getenv(name, default)
+    return float(value) if value else None
+
+
+# LLM provider calls (the provider's rate limit is shared by every user)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TENANT_CONCURRENCY = int(os.getenv("LLM_TENANT_CONCURRENCY", "2"))
+LLM_TENANT_RATE_PER_S = _env_float("LLM_TENANT_RATE_PER_S", "1")
+LLM_TENANT_BURST = int(os.getenv("LLM_TENANT_BURST", "5"))
+LLM_GLOBAL_RATE_PER_S = _env_float("LLM_GLOBAL_RATE_PER_S", "")  # empty = no global limit
+
+# Warehouse queries
+SQL_MAX_CONCURRENCY = int(os.getenv("SQL_MAX_CONCURRENCY", "5"))
+SQL_TENANT_CONCURRENCY = int(os.getenv("SQL_TENANT_CONCURRENCY", "2"))
+SQL_TENANT_RATE_PER_S = _env_float("SQL_TENANT_RATE_PER_S", "5")
+SQL_TENANT_BURST = int(os.getenv("SQL_TENANT_BURST", "10"))
+
+# Bounded queues: past these, requests are turned away immediately (429)
+SCHEDULER_TENANT_QUEUE_LIMIT = int(os.getenv("SCHEDULER_TENANT_QUEUE_LIMIT", "20"))
+SCHEDULER_QUEUE_LIMIT = int(os.getenv("SCHEDULER_QUEUE_LIMIT", "200"))
+SCHEDULER_MAX_WAIT_S = float(os.getenv("SCHEDULER_MAX_WAIT_S", "30"))
+
+ANONYMOUS_TENANT = "anonymous"
+
+
+class SchedulerOverloaded(Exception):
+    """
+    Raised when a request cannot be admitted (queue full or waited too long).
+    retry_after_s is a hint for the Retry-After header.
+    """
+
+    def __init__(self, message: str, retry_after_s: float = 1.0):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+# ---------------------------------
+# Token Bucket
+# ---------------------------------
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at rate_per_s up to burst tokens.
+    Not thread-safe; schedulers only touch it from the event loop.
+    """
+
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_s)
+        self.updated = now
+
+    def available(self, n: float = 1.0) -> bool:
+        self._refill()
+        return self.tokens >= n
+
+    def take(self, n: float = 1.0):
+        self._refill()
+        self.tokens -= n
+
+    def delay(self, n: float = 1.0) -> float:
+        """
+        Seconds until n tokens are available.
+        """
+        self._refill()
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate_per_s
+
+
+# ---------------------------------
+# Weighted Fair Scheduler
+# ---------------------------------
+
+class _Waiter:
+    __slots__ = ("tenant", "cost", "start", "finish", "seq", "future", "enqueued_at")
+
+    def __init__(self, tenant, cost, start, finish, seq, future):
+        self.tenant = tenant
+        self.cost = cost
+        self.start = start
+        self.finish = finish
+        self.seq = seq
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class FairScheduler:
+    """
+    Admission control for one shared resource (LLM calls or SQL).
+
+    - capacity: concurrent slots overall
+    - tenant_concurrency: concurrent slots per tenant
+    - tenant_rate_per_s / tenant_burst: per-tenant token bucket
+      (None disables it); global_rate_per_s adds one shared bucket
+    - queues are bounded per tenant and overall; a full queue raises
+      SchedulerOverloaded immediately instead of queueing
+
+    Waiting requests are served by weighted fair queueing: each request
+    gets a virtual finish tag start + cost / weight, where start is the
+    later of the scheduler's virtual time and the tenant's previous tag.
+    The eligible request with the smallest tag goes next, so a tenant
+    with a hundred queued requests cannot push another tenant's single
+    request to the back of the line.
+    """
+
+    def __init__(self, name: str, capacity: int, tenant_concurrency: int,
+                 tenant_rate_per_s: float = None, tenant_burst: int = 1,
+                 global_rate_per_s: float = None,
+                 tenant_queue_limit: int = SCHEDULER_TENANT_QUEUE_LIMIT,
+                 queue_limit: int = SCHEDULER_QUEUE_LIMIT,
+                 max_wait_s: float = SCHEDULER_MAX_WAIT_S):
+        self.name = name
+        self.capacity = capacity
+        self.tenant_concurrency = tenant_concurrency
+        self.tenant_rate_per_s = tenant_rate_per_s
+        self.tenant_burst = tenant_burst
+        self.tenant_queue_limit = tenant_queue_limit
+        self.queue_limit = queue_limit
+        self.max_wait_s = max_wait_s
+
+        self._global_bucket = None
+        if global_rate_per_s:
+            self._global_bucket = TokenBucket(global_rate_per_s, max(1, int(global_rate_per_s)))
+
+        self._queues = {}       # tenant -> deque[_Waiter]
+        self._running = {}      # tenant -> running count
+        self._buckets = {}      # tenant -> TokenBucket
+        self._weights = {}      # tenant -> weight (default 1.0)
+        self._last_finish = {}  # tenant -> last virtual finish tag
+        self._virtual_time = 0.0
+        self._queued = 0
+        self._running_total = 0
+        self._seq = itertools.count()
+        self._timer = None
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait_s = 0.0
+
+    def set_weight(self, tenant: str, weight: float):
+        if weight <= 0:
+            raise ValueError("Scheduler weight must be positive")
+        self._weights[tenant] = weight
+
+    # -----------------------------
+    # Queueing
+    # -----------------------------
+
+    def _bucket(self, tenant: str):
+        if self.tenant_rate_per_s is None:
+            return None
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = TokenBucket(self.tenant_rate_per_s, self.tenant_burst)
+            self._buckets[tenant] = bucket
+        return bucket
+
+    def _enqueue(self, tenant: str, cost: float) -> _Waiter:
+        queue = self._queues.get(tenant)
+
+        if self._queued >= self.queue_limit or (queue is not None and len(queue) >= self.tenant_queue_limit):
+            self.rejected += 1
+            raise SchedulerOverloaded(f"Too many pending {self.name} requests. Try again shortly.")
+
+        start = max(self._virtual_time, self._last_finish.get(tenant, 0.0))
+        finish = start + cost / self._weights.get(tenant, 1.0)
+        self._last_finish[tenant] = finish
+
+        waiter = _Waiter(tenant, cost, start, finish, next(self._seq), asyncio.get_running_loop().create_future())
+
+        if queue is None:
+            queue = deque()
+            self._queues[tenant] = queue
+        queue.append(waiter)
+        self._queued += 1
+
+        self._dispatch()
+        return waiter
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.tenant)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[waiter.tenant]
+
+    # -----------------------------
+    # Dispatch
+    # -----------------------------
+
+    def _dispatch(self):
+        """
+        Grants slots to queued requests in finish-tag order while capacity
+        remains. Requests blocked only by their token bucket are retried
+        from a timer once tokens are due.
+        """
+        retry_in = None
+
+        while self._running_total < self.capacity and self._queued:
+            if self._global_bucket is not None and not self._global_bucket.available():
+                retry_in = self._global_bucket.delay()
+                break
+
+            chosen = None
+            for tenant, queue in self._queues.items():
+                if self._running.get(tenant, 0) >= self.tenant_concurrency:
+                    continue
+
+                bucket = self._bucket(tenant)
+                if bucket is not None and not bucket.available():
+                    delay = bucket.delay()
+                    retry_in = delay if retry_in is None else min(retry_in, delay)
+                    continue
+
+                head = queue[0]
+                if chosen is None or (head.finish, head.seq) < (chosen.finish, chosen.seq):
+                    chosen = head
+
+            if chosen is None:
+                break
+
+            self._remove(chosen)
+
+            bucket = self._bucket(chosen.tenant)
+            if bucket is not None:
+                bucket.take()
+            if self._global_bucket is not None:
+                self._global_bucket.take()
+
+            self._virtual_time = max(self._virtual_time, chosen.start)
+            self._running[chosen.tenant] = self._running.get(chosen.tenant, 0) + 1
+            self._running_total += 1
+            self.admitted += 1
+            self.total_wait_s += time.monotonic() - chosen.enqueued_at
+            chosen.future.set_result(None)
+
+        if retry_in is not None and self._queued and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(retry_in, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, tenant: str):
+        self._running_total -= 1
+        running = self._running[tenant] - 1
+        if running:
+            self._running[tenant] = running
+        else:
+            del self._running[tenant]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, cost: float = 1.0):
+        """
+        Holds one slot of this resource for tenant for the duration of the
+        block. Raises SchedulerOverloaded when the request is turned away.
+        """
+        waiter = self._enqueue(tenant, cost)
+
+        try:
+            with span(f"{self.name}_queue"):
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait_s)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._remove(waiter)
+                waiter.future.cancel()
+                self.timed_out += 1
+                raise SchedulerOverloaded(f"Timed out waiting for a {self.name} slot. Try again shortly.")
+        except asyncio.CancelledError:
+            # Client went away: give up the queue position or the granted slot
+            if waiter.future.done():
+                self._release(tenant)
+            else:
+                self._remove(waiter)
+                waiter.future.cancel()
+            raise
+
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    # -----------------------------
+    # Metrics
+    # -----------------------------
+
+    def stats(self) -> dict:
+        tenants = set(self._queues) | set(self._running)
+        return {
+            "name": self.name,
+            "capacity": self.capacity,
+            "running": self._running_total,
+            "queued": self._queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(1000 * self.total_wait_s / self.admitted, 2) if self.admitted else 0.0,
+            "tenants": {
+                t: {"running": self._running.get(t, 0), "queued": len(self._queues.get(t, ()))}
+                for t in sorted(tenants)
+            },
+        }
+
+
+LLM_SCHEDULER = FairScheduler(
+    "llm",
+    capacity=LLM_MAX_CONCURRENCY,
+    tenant_concurrency=LLM_TENANT_CONCURRENCY,
+    tenant_rate_per_s=LLM_TENANT_RATE_PER_S,
+    tenant_burst=LLM_TENANT_BURST,
+    global_rate_per_s=LLM_GLOBAL_RATE_PER_S,
+)
+
+SQL_SCHEDULER = FairScheduler(
+    "sql",
+    capacity=SQL_MAX_CONCURRENCY,
+    tenant_concurrency=SQL_TENANT_CONCURRENCY,
+    tenant_rate_per_s=SQL_TENANT_RATE_PER_S,
+    tenant_burst=SQL_TENANT_BURST,
+)
+
+
+def scheduler_stats() -> dict:
+    return {"llm": LLM_SCHEDULER.stats(), "sql": SQL_SCHEDULER.stats()}
+
+
+@register_collector
+def _scheduler_gauges():
+    stats = scheduler_stats().values()
+    return [
+        ("whareiq_scheduler_running", "gauge", "Requests holding a scheduler slot.",
+         [({"scheduler": s["name"]}, s["running"]) for s in stats]),
+        ("whareiq_scheduler_queued", "gauge", "Requests waiting for a scheduler slot.",
+         [({"scheduler": s["name"]}, s["queued"]) for s in stats]),
+        ("whareiq_scheduler_tenant_queued", "gauge", "Requests waiting for a scheduler slot, per tenant.",
+         [({"scheduler": s["name"], "tenant": t}, v["queued"]) for s in stats for t, v in s["tenants"].items()]),
+        ("whareiq_scheduler_admitted_total", "counter", "Requests admitted since start.",
+         [({"scheduler": s["name"]}, s["admitted"]) for s in stats]),
+        ("whareiq_scheduler_rejected_total", "counter", "Requests turned away (queue full) since start.",
+         [({"scheduler": s["name"]}, s["rejected"]) for s in stats]),
+        ("whareiq_scheduler_timed_out_total", "counter", "Requests that gave up waiting since start.",
+         [({"scheduler": s["name"]}, s["timed_out"]) for s in stats]),
+    ]
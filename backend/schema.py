@@ -2,3 +2,17 @@ from pydantic import BaseModel
 
 class QueryRequest(BaseModel):
     question: str
+    format: str = "rows"  # "rows" | "columnar" | "arrow"
+
+
+class StreamQueryRequest(QueryRequest):
+    format: str = "ndjson"  # "ndjson" | "arrow"
+
+
+class BatchQueryItem(BaseModel):
+    question: str | None = None
+    plan: dict | None = None  # a semantic plan, skipping the planner
+
+
+class BatchQueryRequest(BaseModel):
+    queries: list[BatchQueryItem]
@@ -0,0 +1,132 @@
+import threading
+import time
+
+
+# ---------------------------------
+# Versioned Physical Schema Cache
+# ---------------------------------
+
+DEFAULT_FINGERPRINT_CHECK_INTERVAL_S = 30.0
+
+
+class SchemaCache:
+    """
+    Process-wide cache of introspected physical schemas, keyed by tenant.
+
+    Each entry stores the schema together with the catalog fingerprint it was
+    built from and a monotonically increasing version number.
+
+    - Within check_interval_s of the last check, get() does no round-trips.
+    - After that, get() runs the (cheap) fingerprint query and only re-runs
+      the full introspection if the fingerprint changed.
+    - invalidate() / refresh() are explicit hooks for callers that know a
+      DDL change just happened (e.g. after a migration or a remap).
+    """
+
+    def __init__(self, check_interval_s: float = DEFAULT_FINGERPRINT_CHECK_INTERVAL_S):
+        self.check_interval_s = check_interval_s
+        self._entries = {}
+        self._lock = threading.Lock()  # guards _entries / _key_locks only, never held during I/O
+        self._key_locks = {}
+        self._version_counter = 0
+
+    def _next_version(self) -> int:
+        self._version_counter += 1
+        return self._version_counter
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _fresh_entry(self, key: str, now: float):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["checked_at"] < self.check_interval_s:
+                return entry
+            return None
+
+    def get(self, key: str, fingerprint_fn, load_fn) -> dict:
+        """
+        Returns the cached schema for key, loading or revalidating it if needed.
+
+        fingerprint_fn() -> str   cheap DDL fingerprint of the catalog
+        load_fn() -> dict         full introspection
+        """
+        entry = self._fresh_entry(key, time.monotonic())
+        if entry is not None:
+            return entry["schema"]
+
+        return self._revalidate(key, fingerprint_fn, load_fn)
+
+    def _revalidate(self, key: str, fingerprint_fn, load_fn, force: bool = False) -> dict:
+        """
+        Runs the fingerprint / introspection round-trips for key. They run
+        under the key's own lock: concurrent callers for the same key wait
+        for one load, while cache hits and other keys are never blocked.
+        """
+        with self._key_lock(key):
+            now = time.monotonic()
+
+            if not force:
+                # Another caller may have revalidated while we waited
+                entry = self._fresh_entry(key, now)
+                if entry is not None:
+                    return entry["schema"]
+
+            with self._lock:
+                entry = self._entries.get(key)
+
+            fingerprint = fingerprint_fn()
+
+            if not force and entry is not None and entry["fingerprint"] == fingerprint:
+                with self._lock:
+                    entry["checked_at"] = now
+                return entry["schema"]
+
+            schema = load_fn()
+
+            with self._lock:
+                self._entries[key] = {
+                    "schema": schema,
+                    "fingerprint": fingerprint,
+                    "checked_at": now,
+                    "version": self._next_version(),
+                }
+            return schema
+
+    def refresh(self, key: str, fingerprint_fn, load_fn) -> dict:
+        """
+        Forces a full reload for key, regardless of the stored fingerprint.
+        """
+        self.invalidate(key)
+        return self._revalidate(key, fingerprint_fn, load_fn, force=True)
+
+    def prime(self, key: str, schema: dict, fingerprint: str = None):
+        """
+        Seeds the cache with an already-known schema (no database access).
+        """
+        with self._lock:
+            self._entries[key] = {
+                "schema": schema,
+                "fingerprint": fingerprint,
+                "checked_at": time.monotonic(),
+                "version": self._next_version(),
+            }
+
+    def invalidate(self, key: str = None):
+        """
+        Drops the entry for key, or every entry if key is None.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def version(self, key: str):
+        """
+        Returns the version of the cached schema for key, or None if not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry["version"] if entry is not None else None
@@ -1,16 +1,92 @@
+import os
+
 from db import get_db_connection, release_db_connection
+from metrics import span
+from schema_cache import SchemaCache
+
+
+# ---------------------------------
+# Schema Cache (process-wide)
+# ---------------------------------
+
+INTERNAL_SCHEMA_KEY = "internal"
+
+SCHEMA_CACHE = SchemaCache()
+
+# Schemas to introspect (comma-separated). Tables outside "public" are
+# keyed (and referenced in SQL) as "schema.table".
+INTROSPECTION_SCHEMAS = tuple(
+    s.strip() for s in os.getenv("INTROSPECTION_SCHEMAS", "public").split(",") if s.strip()
+)
+DEFAULT_SCHEMA = "public"
+
+# "pg_catalog" (single query) or "information_schema" (legacy, public only)
+INTROSPECTION_BACKEND = os.getenv("SCHEMA_INTROSPECTION_BACKEND", "pg_catalog")
+
+# WhareIQ's own tables are never part of the user-facing schema
+EXCLUDED_TABLES = ("semantic_mappings", "semantic_rollups")
+ROLLUP_TABLE_PREFIX = "whareiq_rollup_"
+
+# Cheap DDL fingerprint over the catalog rows the introspection reads:
+# - pg_class (oid, relfilenode, xmin): CREATE / DROP of tables, views and
+#   indexes, table rewrites, ADD / DROP COLUMN (relnatts), ATTACH / DETACH
+#   PARTITION.
+# - pg_attribute (attnum, attname, atttypid, attisdropped): RENAME COLUMN
+#   and ALTER COLUMN TYPE without a rewrite leave pg_class untouched.
+# - pg_constraint (oid, xmin): primary and foreign keys.
+SCHEMA_FINGERPRINT_SQL = """
+    SELECT md5(
+        coalesce((
+            SELECT string_agg(c.oid::text || ':' || c.relfilenode::text || ':' || c.xmin::text,
+                              ',' ORDER BY c.oid)
+            FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = ANY(%(schemas)s)
+              AND c.relkind IN ('r', 'p', 'v', 'm', 'f', 'i', 'I')
+        ), '')
+        || '|' ||
+        coalesce((
+            SELECT string_agg(a.attrelid::text || '.' || a.attnum::text || ':' || a.attname || ':'
+                              || a.atttypid::text || ':' || a.attisdropped::text,
+                              ',' ORDER BY a.attrelid, a.attnum)
+            FROM pg_catalog.pg_attribute a
+            JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = ANY(%(schemas)s)
+              AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+              AND a.attnum > 0
+        ), '')
+        || '|' ||
+        coalesce((
+            SELECT string_agg(con.oid::text || ':' || con.xmin::text, ',' ORDER BY con.oid)
+            FROM pg_catalog.pg_constraint con
+            JOIN pg_catalog.pg_namespace n ON n.oid = con.connamespace
+            WHERE n.nspname = ANY(%(schemas)s)
+              AND con.contype IN ('p', 'f')
+        ), '')
+    );
+"""
 
 
 # ---------------------------------
 # Load Full Physical Schema
 # ---------------------------------
-def load_physical_schema():
+
+def load_physical_schema(conn=None, cache_key: str = INTERNAL_SCHEMA_KEY, force_refresh: bool = False):
     """
-    Introspects PostgreSQL and returns a full physical schema map.
+    Returns the full physical schema map, served from the process-wide
+    SCHEMA_CACHE.
+
+    - conn: optional open connection to introspect (caller keeps ownership).
+      If omitted, a pooled connection is borrowed only when the cache
+      actually needs to talk to the database.
+    - cache_key: identifies the database / tenant the schema belongs to.
+    - force_refresh: bypass the fingerprint check and re-introspect.
 
     Output format:
     {
         "table_name": {
+            "schema": "public",
             "columns": { "col": "datatype" },
             "primary_key": ["id"],
             "foreign_keys": {
@@ -18,93 +94,418 @@ def load_physical_schema():
                     "references_table": "other_table",
                     "references_column": "id"
                 }
-            }
+            },
+            "foreign_key_constraints": [
+                {
+                    "name": "fk_name",
+                    "columns": ["col_a", "col_b"],
+                    "references_table": "other_table",
+                    "references_columns": ["id_a", "id_b"]
+                }
+            ],
+            "indexes": [
+                {
+                    "name": "orders_created_at_idx",
+                    "method": "btree",
+                    "unique": False,
+                    "partial": False,
+                    "columns": ["created_at"]   # key columns; null for expressions
+                }
+            ],
+            "partition_key": {"strategy": "range", "columns": ["created_at"]},
+            "partitions": [
+                {"name": "orders_2024_01", "bound": "FOR VALUES FROM (...) TO (...)"}
+            ]
         }
     }
+
+    "foreign_keys" only lists single-column foreign keys; composite keys
+    are only in "foreign_key_constraints" (which lists every FK).
+    "partition_key" is None for tables that are not partitioned. The
+    information_schema backend reports neither indexes nor partitions.
     """
 
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # -----------------------------
-        # 1. Fetch Tables
-        # -----------------------------
-        cursor.execute("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public'
-            AND table_name NOT IN ('semantic_mappings');
-        """)
-        tables = [row[0] for row in cursor.fetchall()]
-
-        schema = {}
-
-        for table in tables:
-            schema[table] = {
-                "columns": {},
-                "primary_key": [],
-                "foreign_keys": {}
-            }
+    borrowed = None
 
-        # -----------------------------
-        # 2. Fetch Columns
-        # -----------------------------
-        cursor.execute("""
-            SELECT table_name, column_name, data_type
-            FROM information_schema.columns
-            WHERE table_schema = 'public';
-        """)
-        for table, column, dtype in cursor.fetchall():
-            if table in schema:
-                schema[table]["columns"][column] = dtype
-
-        # -----------------------------
-        # 3. Fetch Primary Keys
-        # -----------------------------
-        cursor.execute("""
-            SELECT tc.table_name, kcu.column_name
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.key_column_usage kcu
-              ON tc.constraint_name = kcu.constraint_name
-            WHERE tc.constraint_type = 'PRIMARY KEY'
-              AND tc.table_schema = 'public';
-        """)
-        for table, column in cursor.fetchall():
-            if table in schema:
-                schema[table]["primary_key"].append(column)
-
-        # -----------------------------
-        # 4. Fetch Foreign Keys
-        # -----------------------------
-        cursor.execute("""
-            SELECT
-                tc.table_name,
-                kcu.column_name,
-                ccu.table_name AS foreign_table,
-                ccu.column_name AS foreign_column
-            FROM information_schema.table_constraints tc
-            JOIN information_schema.key_column_usage kcu
-                ON tc.constraint_name = kcu.constraint_name
-            JOIN information_schema.constraint_column_usage ccu
-                ON ccu.constraint_name = tc.constraint_name
-            WHERE tc.constraint_type = 'FOREIGN KEY'
-              AND tc.table_schema = 'public';
-        """)
-        for table, column, ref_table, ref_column in cursor.fetchall():
-            if table in schema:
-                schema[table]["foreign_keys"][column] = {
-                    "references_table": ref_table,
-                    "references_column": ref_column
-                }
+    def open_cursor():
+        nonlocal borrowed
+        if conn is not None:
+            return conn.cursor()
+        if borrowed is None:
+            borrowed = get_db_connection()
+        return borrowed.cursor()
+
+    def fingerprint_fn():
+        cur = open_cursor()
+        try:
+            return fetch_schema_fingerprint(cur)
+        finally:
+            cur.close()
 
-        cursor.close()
-        return schema
+    def load_fn():
+        cur = open_cursor()
+        try:
+            return introspect_physical_schema(cur)
+        finally:
+            cur.close()
+
+    try:
+        with span("introspection"):
+            if force_refresh:
+                return SCHEMA_CACHE.refresh(cache_key, fingerprint_fn, load_fn)
+            return SCHEMA_CACHE.get(cache_key, fingerprint_fn, load_fn)
 
     except Exception as e:
         raise Exception(f"Schema introspection failed: {str(e)}")
 
     finally:
-        if conn is not None:
-            release_db_connection(conn)
+        if borrowed is not None:
+            release_db_connection(borrowed)
+
+
+def invalidate_physical_schema(cache_key: str = None):
+    """
+    Drops the cached schema for cache_key (or for every tenant if None).
+    The next load_physical_schema() call re-introspects.
+    """
+    SCHEMA_CACHE.invalidate(cache_key)
+
+
+def refresh_physical_schema(conn=None, cache_key: str = INTERNAL_SCHEMA_KEY):
+    """
+    Re-introspects immediately and replaces the cached schema.
+    """
+    return load_physical_schema(conn=conn, cache_key=cache_key, force_refresh=True)
+
+
+def get_schema_version(cache_key: str = INTERNAL_SCHEMA_KEY):
+    """
+    Returns the version number of the cached schema for cache_key.
+    The version changes every time the schema is (re)introspected.
+    """
+    return SCHEMA_CACHE.version(cache_key)
+
+
+# ---------------------------------
+# Catalog Queries
+# ---------------------------------
+
+def qualified_table_name(schema: str, table: str) -> str:
+    """
+    Key used for a table throughout WhareIQ: bare in "public", else schema.table.
+    """
+    return table if schema == DEFAULT_SCHEMA else f"{schema}.{table}"
+
+
+def foreign_key_constraints(table: str, meta: dict) -> list:
+    """
+    Returns the table's foreign keys as constraint dicts, for schemas that
+    only carry the per-column "foreign_keys" map as well.
+    """
+    if "foreign_key_constraints" in meta:
+        return meta["foreign_key_constraints"]
+
+    return [
+        {
+            "name": f"{table}_{col}_fkey",
+            "columns": [col],
+            "references_table": fk["references_table"],
+            "references_columns": [fk["references_column"]],
+        }
+        for col, fk in sorted(meta.get("foreign_keys", {}).items())
+    ]
+
+
+# Index methods whose leading column serves range predicates
+RANGE_INDEX_METHODS = ("btree", "brin")
+
+
+def leading_index_columns(meta: dict) -> set:
+    """
+    Columns that lead a valid, non-partial btree / BRIN index on the table,
+    i.e. columns a range predicate can use an index for.
+    """
+    return {
+        index["columns"][0]
+        for index in meta.get("indexes") or []
+        if index.get("method") in RANGE_INDEX_METHODS
+        and not index.get("partial")
+        and index.get("columns")
+        and index["columns"][0] is not None
+    }
+
+
+def partition_key_column(meta: dict):
+    """
+    First column of the table's RANGE partition key (the column partition
+    pruning works on), or None.
+    """
+    key = meta.get("partition_key")
+    if not key or key.get("strategy") != "range" or not key.get("columns"):
+        return None
+    return key["columns"][0]
+
+
+def fetch_schema_fingerprint(cursor, schemas=INTROSPECTION_SCHEMAS) -> str:
+    """
+    Runs a single pg_catalog query that changes whenever table or key DDL does.
+    """
+    cursor.execute(SCHEMA_FINGERPRINT_SQL, {"schemas": list(schemas)})
+    return cursor.fetchone()[0]
+
+
+def introspect_physical_schema(cursor, schemas=INTROSPECTION_SCHEMAS, backend: str = None) -> dict:
+    """
+    Introspects PostgreSQL with the configured backend (uncached).
+    """
+    backend = backend or INTROSPECTION_BACKEND
+
+    if backend == "pg_catalog":
+        return introspect_pg_catalog(cursor, schemas)
+    if backend == "information_schema":
+        return introspect_information_schema(cursor)
+
+    raise ValueError(f"Unknown schema introspection backend: {backend}")
+
+
+# One round trip: every table with its columns, primary key, foreign keys
+# (composite ones kept whole), indexes and partitioning, aggregated per
+# table. pg_catalog is not permission-filtered, so this avoids the
+# information_schema views.
+PG_CATALOG_SCHEMA_SQL = """
+    SELECT
+        n.nspname::text,
+        c.relname::text,
+        cols.names,
+        cols.types,
+        pk.columns,
+        fk.constraints,
+        idx.indexes,
+        part.strategy,
+        part.columns,
+        parts.partitions
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN LATERAL (
+        SELECT
+            array_agg(a.attname::text ORDER BY a.attnum) AS names,
+            array_agg(pg_catalog.format_type(a.atttypid, NULL) ORDER BY a.attnum) AS types
+        FROM pg_catalog.pg_attribute a
+        WHERE a.attrelid = c.oid
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+    ) cols ON true
+    LEFT JOIN LATERAL (
+        SELECT array_agg(a.attname::text ORDER BY k.ord) AS columns
+        FROM pg_catalog.pg_constraint con
+        CROSS JOIN LATERAL unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+        WHERE con.conrelid = c.oid
+          AND con.contype = 'p'
+    ) pk ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'name', con.conname,
+            'columns', (
+                SELECT array_agg(a.attname::text ORDER BY k.ord)
+                FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            ),
+            'references_schema', rn.nspname,
+            'references_table', rc.relname,
+            'references_columns', (
+                SELECT array_agg(a.attname::text ORDER BY k.ord)
+                FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_catalog.pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+            )
+        ) ORDER BY con.conname) AS constraints
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class rc ON rc.oid = con.confrelid
+        JOIN pg_catalog.pg_namespace rn ON rn.oid = rc.relnamespace
+        WHERE con.conrelid = c.oid
+          AND con.contype = 'f'
+    ) fk ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'name', ic.relname,
+            'method', am.amname,
+            'unique', i.indisunique,
+            'partial', i.indpred IS NOT NULL,
+            'columns', (
+                SELECT array_agg(a.attname::text ORDER BY k.ord)
+                FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                LEFT JOIN pg_catalog.pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                WHERE k.ord <= i.indnkeyatts
+            )
+        ) ORDER BY ic.relname) AS indexes
+        FROM pg_catalog.pg_index i
+        JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_catalog.pg_am am ON am.oid = ic.relam
+        WHERE i.indrelid = c.oid
+          AND i.indisvalid
+    ) idx ON true
+    LEFT JOIN LATERAL (
+        SELECT
+            pt.partstrat::text AS strategy,
+            array_agg(a.attname::text ORDER BY k.ord) AS columns
+        FROM pg_catalog.pg_partitioned_table pt
+        CROSS JOIN LATERAL unnest(pt.partattrs::int2[]) WITH ORDINALITY AS k(attnum, ord)
+        LEFT JOIN pg_catalog.pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = k.attnum
+        WHERE pt.partrelid = c.oid
+        GROUP BY pt.partstrat
+    ) part ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'name', pc.relname,
+            'bound', pg_catalog.pg_get_expr(pc.relpartbound, pc.oid)
+        ) ORDER BY pc.relname) AS partitions
+        FROM pg_catalog.pg_inherits inh
+        JOIN pg_catalog.pg_class pc ON pc.oid = inh.inhrelid
+        WHERE inh.inhparent = c.oid
+          AND pc.relispartition
+    ) parts ON true
+    WHERE n.nspname = ANY(%(schemas)s)
+      AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+      AND NOT c.relispartition
+      AND NOT (n.nspname = 'public' AND c.relname = ANY(%(excluded)s))
+      AND c.relname NOT LIKE %(rollup_pattern)s
+    ORDER BY n.nspname, c.relname;
+"""
+
+
+PARTITION_STRATEGIES = {"r": "range", "l": "list", "h": "hash"}
+
+
+def introspect_pg_catalog(cursor, schemas=INTROSPECTION_SCHEMAS) -> dict:
+    """
+    Introspects tables, columns, primary keys, foreign keys, indexes and
+    partitioning of every schema in schemas with one pg_catalog query.
+
+    Partitions are skipped (their parent table is introspected instead,
+    with the partition bounds listed under "partitions").
+    """
+    cursor.execute(PG_CATALOG_SCHEMA_SQL, {
+        "schemas": list(schemas),
+        "excluded": list(EXCLUDED_TABLES),
+        "rollup_pattern": ROLLUP_TABLE_PREFIX.replace("_", "\\_") + "%",
+    })
+
+    schema = {}
+
+    for (nspname, relname, col_names, col_types, pk_columns, fk_constraints,
+         indexes, part_strategy, part_columns, partitions) in cursor.fetchall():
+        constraints = []
+        single_column_fks = {}
+
+        for fk in fk_constraints or []:
+            constraint = {
+                "name": fk["name"],
+                "columns": fk["columns"],
+                "references_table": qualified_table_name(fk["references_schema"], fk["references_table"]),
+                "references_columns": fk["references_columns"],
+            }
+            constraints.append(constraint)
+
+            if len(constraint["columns"]) == 1:
+                single_column_fks[constraint["columns"][0]] = {
+                    "references_table": constraint["references_table"],
+                    "references_column": constraint["references_columns"][0],
+                }
+
+        schema[qualified_table_name(nspname, relname)] = {
+            "schema": nspname,
+            "columns": dict(zip(col_names or [], col_types or [])),
+            "primary_key": list(pk_columns or []),
+            "foreign_keys": single_column_fks,
+            "foreign_key_constraints": constraints,
+            "indexes": indexes or [],
+            "partition_key": (
+                {"strategy": PARTITION_STRATEGIES.get(part_strategy, part_strategy), "columns": part_columns}
+                if part_strategy else None
+            ),
+            "partitions": partitions or [],
+        }
+
+    return schema
+
+
+def introspect_information_schema(cursor) -> dict:
+    """
+    Introspects the public schema through information_schema (four queries).
+    Kept as a fallback backend; it does not see composite foreign keys.
+    """
+
+    # -----------------------------
+    # 1. Fetch Tables
+    # -----------------------------
+    cursor.execute("""
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_schema = 'public'
+        AND table_name NOT IN ('semantic_mappings', 'semantic_rollups')
+        AND table_name NOT LIKE 'whareiq\\_rollup\\_%';
+    """)
+    tables = [row[0] for row in cursor.fetchall()]
+
+    schema = {}
+
+    for table in tables:
+        schema[table] = {
+            "schema": DEFAULT_SCHEMA,
+            "columns": {},
+            "primary_key": [],
+            "foreign_keys": {}
+        }
+
+    # -----------------------------
+    # 2. Fetch Columns
+    # -----------------------------
+    cursor.execute("""
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'public';
+    """)
+    for table, column, dtype in cursor.fetchall():
+        if table in schema:
+            schema[table]["columns"][column] = dtype
+
+    # -----------------------------
+    # 3. Fetch Primary Keys
+    # -----------------------------
+    cursor.execute("""
+        SELECT tc.table_name, kcu.column_name
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+          ON tc.constraint_name = kcu.constraint_name
+        WHERE tc.constraint_type = 'PRIMARY KEY'
+          AND tc.table_schema = 'public';
+    """)
+    for table, column in cursor.fetchall():
+        if table in schema:
+            schema[table]["primary_key"].append(column)
+
+    # -----------------------------
+    # 4. Fetch Foreign Keys
+    # -----------------------------
+    cursor.execute("""
+        SELECT
+            tc.table_name,
+            kcu.column_name,
+            ccu.table_name AS foreign_table,
+            ccu.column_name AS foreign_column
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+            ON tc.constraint_name = kcu.constraint_name
+        JOIN information_schema.constraint_column_usage ccu
+            ON ccu.constraint_name = tc.constraint_name
+        WHERE tc.constraint_type = 'FOREIGN KEY'
+          AND tc.table_schema = 'public';
+    """)
+    for table, column, ref_table, ref_column in cursor.fetchall():
+        if table in schema:
+            schema[table]["foreign_keys"][column] = {
+                "references_table": ref_table,
+                "references_column": ref_column
+            }
+
+    return schema
@@ -1,8 +1,13 @@
-from sql_builder import build_sql
+import asyncio
+
+from sql_builder import build_query, route_query
 from sql_validator import validate_sql
-from allowlist_validator import validate_allowlist
-from limit_enforcer import enforce_limit
+from allowlist_validator import validate_query_allowlist
+from limit_enforcer import enforce_query_limit
 from query_timeout import execute_with_timeout
+from async_db import execute_with_timeout_async, get_internal_pool
+from cost_gate import COST_GATE, INTERNAL_TENANT, estimate_query_cost
+from metrics import span
 
 
 # ---------------------------------
@@ -13,43 +18,165 @@ DEFAULT_MAX_LIMIT = 1000
 DEFAULT_TIMEOUT_MS = 2000
 
 
+def prepare_query_ast(plan: dict, rollups: list = None):
+    """
+    Builds the checked, routed query AST for a plan (stages 1-4 of
+    prepare_semantic_query), for callers that combine several queries
+    before rendering (see query_batch).
+
+    rollups: registry of the database the query runs on (internal if None).
+    """
+
+    # 1. Build the query AST
+    with span("resolution"):
+        query = build_query(plan)
+
+    with span("validation"):
+        # 2. Enforce hard row limit
+        query = enforce_query_limit(query, max_limit=DEFAULT_MAX_LIMIT)
+
+        # 3. Enforce semantic allowlist (tables, columns, FK joins)
+        validate_query_allowlist(query)
+
+    # 4. Read a rollup instead of the fact table when it can answer exactly
+    with span("rollup_routing"):
+        return route_query(query, rollups=rollups)
+
+
+def render_checked_sql(query):
+    """
+    Renders a prepared query AST and validates the SQL (stage 5 of
+    prepare_semantic_query). Returns (final_sql, params).
+    """
+    with span("sql_validation"):
+        final_sql, params = query.render()
+        validate_sql(final_sql)
+
+    return final_sql, params
+
+
+def prepare_semantic_query(plan: dict, rollups: list = None):
+    """
+    Runs every pre-execution stage and returns (final_sql, params).
+    rollups: registry of the database the query runs on (internal if None).
+
+    Pipeline:
+      Semantic Plan
+        → SQL Builder (query AST)
+        → Hard Limit Enforcer (on the AST)
+        → Allowlist Validator (on the AST)
+        → Rollup routing (reads a pre-aggregated table when possible)
+        → Render to parameterized SQL
+        → SQL Validator
+
+    Plan values are bound through params, so the SQL text only changes
+    when the shape of the question changes.
+    """
+
+    # 1-4. Build, limit, allowlist and route the query AST
+    query = prepare_query_ast(plan, rollups)
+
+    # 5. Render and validate SQL syntax & safety
+    return render_checked_sql(query)
+
+
 def execute_semantic_query(plan: dict):
     """
     Executes a semantic query safely and deterministically.
 
     Pipeline:
       Semantic Plan
-        → SQL Builder
-        → SQL Validator
-        → Allowlist Validator
-        → Hard Limit Enforcer
+        → prepare_semantic_query (AST checks, render, validate)
+        → Cost gate (EXPLAIN estimate vs. budget; may reject or queue)
         → Timeout-enforced Execution
 
     Returns:
       {
         "sql": final_sql,
-        "rows": query_result_rows
+        "params": bound_params,
+        "rows": query_result_rows,
+        "cost": {"total_cost": ..., "plan_rows": ..., "nodes": [...], "decision": "ok" | "heavy", ...}
       }
+
+    Raises cost_gate.CostBudgetExceeded when the estimate is over the hard budget.
     """
 
-    # 1. Build SQL
-    sql_info = build_sql(plan)
-    raw_sql = sql_info["sql"]
+    final_sql, params = prepare_semantic_query(plan)
+
+    # 6. Estimate cost before touching the warehouse
+    with span("cost_estimate"):
+        cost = COST_GATE.check(INTERNAL_TENANT, estimate_query_cost(final_sql, params))
 
-    # 2. Validate SQL syntax & safety
-    validate_sql(raw_sql)
+    # 7. Execute with timeout (expensive queries share the heavy lane)
+    if cost["decision"] == "heavy":
+        with COST_GATE.heavy_lane(), span("execution"):
+            rows = execute_with_timeout(final_sql, timeout_ms=DEFAULT_TIMEOUT_MS, params=params)
+    else:
+        with span("execution"):
+            rows = execute_with_timeout(final_sql, timeout_ms=DEFAULT_TIMEOUT_MS, params=params)
 
-    # 3. Enforce semantic allowlist
-    validate_allowlist(raw_sql)
+    return {
+        "sql": final_sql,
+        "params": params,
+        "rows": rows,
+        "cost": cost
+    }
 
-    # 4. Enforce hard row limit
-    final_sql = enforce_limit(raw_sql, max_limit=DEFAULT_MAX_LIMIT)
 
-    # 5. Execute with timeout
-    rows = execute_with_timeout(final_sql, timeout_ms=DEFAULT_TIMEOUT_MS)
+async def execute_gated_async(conn, sql: str, params, tenant: str, budget_tenant: str = None):
+    """
+    Cost gate + timeout-enforced execution on an async connection.
+    Returns (cost, rows).
+
+    - tenant: cache key for the estimate (the database the SQL runs on)
+    - budget_tenant: whose cost budget applies (defaults to tenant)
+    """
+    with span("cost_estimate"):
+        estimate = await COST_GATE.estimate_async(conn, tenant, sql, params)
+        cost = COST_GATE.check(budget_tenant or tenant, estimate)
+
+    # Expensive queries share the heavy lane
+    if cost["decision"] == "heavy":
+        async with COST_GATE.async_heavy_lane():
+            with span("execution"):
+                rows = await execute_with_timeout_async(sql, params, timeout_ms=DEFAULT_TIMEOUT_MS, conn=conn)
+    else:
+        with span("execution"):
+            rows = await execute_with_timeout_async(sql, params, timeout_ms=DEFAULT_TIMEOUT_MS, conn=conn)
+
+    return cost, rows
+
+
+async def execute_semantic_query_async(plan: dict, conn=None, tenant: str = INTERNAL_TENANT, rollups: list = None):
+    """
+    Async counterpart of execute_semantic_query.
+
+    SQL building and allowlist validation may touch the (cached) internal
+    catalogs, so they run in a worker thread; execution is fully async.
+
+    - conn: optional async connection to execute on (e.g. a tenant pool
+      connection); defaults to the internal pool.
+    - tenant: whose cost budget applies.
+    - rollups: registry of conn's database; without it, queries on conn
+      are not routed (the internal registry only describes the internal
+      database).
+    """
+    if conn is not None and rollups is None:
+        rollups = []
+
+    final_sql, params = await asyncio.to_thread(prepare_semantic_query, plan, rollups)
+
+    # 6. Cost gate, then execute with timeout
+    if conn is None:
+        pool = await get_internal_pool()
+        async with pool.connection() as internal_conn:
+            cost, rows = await execute_gated_async(internal_conn, final_sql, params, tenant)
+    else:
+        cost, rows = await execute_gated_async(conn, final_sql, params, tenant)
 
     return {
         "sql": final_sql,
-        "rows": rows
+        "params": params,
+        "rows": rows,
+        "cost": cost
     }
-
@@ -0,0 +1,177 @@
+import contextvars
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from semantic_storage import load_semantic_mappings
+
+
+# ---------------------------------
+# Semantic Catalog (indexed, memoized mappings)
+# ---------------------------------
+
+SEMANTIC_CATALOG_TTL_S = 60.0
+
+
+class SemanticCatalog:
+    """
+    Immutable, indexed snapshot of the semantic_mappings table.
+
+    All lookups the resolvers and validators need are precomputed at load time:
+
+    - measure_index:    logical measure   -> (table, column)
+    - dimension_index:  logical dimension -> (table, column)
+    - allowed_columns:  {(table, column)} that SQL may touch
+    - ambiguous_*:      logical names defined in more than one table
+
+    version is a content hash, so two loads of identical mappings share a version.
+    """
+
+    def __init__(self, mappings: dict):
+        self.mappings = mappings
+        self.tables = frozenset(mappings.keys())
+
+        self.measure_index, self.ambiguous_measures = self._build_index("measures")
+        self.dimension_index, self.ambiguous_dimensions = self._build_index("dimensions")
+
+        allowed_columns = set()
+        for table, meta in mappings.items():
+            for column in (meta.get("dimensions") or {}).values():
+                allowed_columns.add((table, column))
+            for column in (meta.get("measures") or {}).values():
+                allowed_columns.add((table, column))
+        self.allowed_columns = frozenset(allowed_columns)
+
+        self.version = hashlib.sha256(
+            json.dumps(mappings, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+
+    def _build_index(self, kind: str):
+        index = {}
+        ambiguous = {}
+
+        for table_name in sorted(self.mappings.keys()):
+            entries = self.mappings[table_name].get(kind) or {}
+
+            for logical_name, column in entries.items():
+                if logical_name in ambiguous:
+                    ambiguous[logical_name].append(table_name)
+                elif logical_name in index:
+                    ambiguous[logical_name] = [index.pop(logical_name)[0], table_name]
+                else:
+                    index[logical_name] = (table_name, column)
+
+        return index, ambiguous
+
+    @classmethod
+    def load(cls):
+        return cls(load_semantic_mappings())
+
+    # -----------------------------
+    # Resolution (O(1) per name)
+    # -----------------------------
+
+    def resolve_measure(self, logical_name: str):
+        return self._resolve(logical_name, "Measure", self.measure_index, self.ambiguous_measures)
+
+    def resolve_dimension(self, logical_name: str):
+        return self._resolve(logical_name, "Dimension", self.dimension_index, self.ambiguous_dimensions)
+
+    def _resolve(self, logical_name: str, label: str, index: dict, ambiguous: dict):
+        if logical_name in ambiguous:
+            tables = ambiguous[logical_name]
+            raise ValueError(
+                f"{label} '{logical_name}' is defined in multiple tables "
+                f"('{tables[0]}' and '{tables[1]}'). Resolution is ambiguous."
+            )
+
+        if logical_name not in index:
+            raise ValueError(
+                f"{label} '{logical_name}' could not be resolved to any physical column "
+                f"using stored semantic mappings."
+            )
+
+        return index[logical_name]
+
+    # -----------------------------
+    # Allowlist Checks
+    # -----------------------------
+
+    def is_allowed_table(self, table: str) -> bool:
+        return table in self.tables
+
+    def is_allowed_column(self, table: str, column: str) -> bool:
+        return (table, column) in self.allowed_columns
+
+
+# ---------------------------------
+# Process-wide Catalog Accessor
+# ---------------------------------
+
+_catalog = None
+_catalog_loaded_at = 0.0
+_catalog_lock = threading.Lock()
+
+# Snapshot pinned for the current context (see pinned_semantic_catalog)
+_pinned_catalog = contextvars.ContextVar("whareiq_pinned_catalog", default=None)
+
+
+def get_semantic_catalog(force_refresh: bool = False) -> SemanticCatalog:
+    """
+    Returns the process-wide SemanticCatalog, reloading it from storage
+    when it is older than SEMANTIC_CATALOG_TTL_S or was invalidated.
+    Inside pinned_semantic_catalog() the pinned snapshot is returned.
+    """
+    global _catalog, _catalog_loaded_at
+
+    pinned = _pinned_catalog.get()
+    if pinned is not None and not force_refresh:
+        return pinned
+
+    with _catalog_lock:
+        now = time.monotonic()
+        expired = now - _catalog_loaded_at >= SEMANTIC_CATALOG_TTL_S
+
+        if _catalog is None or expired or force_refresh:
+            _catalog = SemanticCatalog.load()
+            _catalog_loaded_at = now
+
+        return _catalog
+
+
+def set_semantic_catalog(catalog: SemanticCatalog):
+    """
+    Installs a prebuilt catalog (e.g. built from in-memory mappings).
+    """
+    global _catalog, _catalog_loaded_at
+
+    with _catalog_lock:
+        _catalog = catalog
+        _catalog_loaded_at = time.monotonic()
+
+
+@contextmanager
+def pinned_semantic_catalog(catalog: SemanticCatalog):
+    """
+    Makes every get_semantic_catalog() in this context (thread / task,
+    including asyncio.to_thread workers started inside it) return catalog,
+    so a batch of plans resolves against one snapshot even if the TTL
+    expires or the catalog is invalidated halfway through.
+    """
+    token = _pinned_catalog.set(catalog)
+    try:
+        yield catalog
+    finally:
+        _pinned_catalog.reset(token)
+
+
+def invalidate_semantic_catalog():
+    """
+    Change notification hook: forces a reload on the next access.
+    """
+    global _catalog
+
+    with _catalog_lock:
+        _catalog = None
@@ -1,64 +1,170 @@
+import hashlib
+import json
+
+from psycopg2.extras import execute_values
+
 from db import execute_select, get_db_connection, release_db_connection
-from logical_domain_detector import build_logical_domain_map
+from schema_reader import load_physical_schema
+from logical_domain_detector import build_logical_domain_map, get_rule_set, CLASSIFICATION_VERSION
 from measure_auto_mapper import build_measure_map
 from dimension_auto_mapper import build_dimension_map
-import json
 
 
 # ---------------------------------
-# Store Semantic Mappings
+# Per-table Column Fingerprints
 # ---------------------------------
 
-def store_semantic_mappings():
-    logical_schema = build_logical_domain_map()
-    measure_map = build_measure_map()
-    dimension_map = build_dimension_map()
+def table_fingerprint(table: str, meta: dict, rules_fingerprint: str = "") -> str:
+    """
+    Hash of everything classification depends on: the table's columns and
+    types, its primary key and the classifier rules (version + rule set).
+    """
+    raw = json.dumps(
+        [CLASSIFICATION_VERSION, rules_fingerprint, table,
+         sorted(meta["columns"].items()), sorted(meta["primary_key"])],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+_fingerprint_column_ready = False
+
+
+def ensure_fingerprint_column(cursor):
+    """
+    Adds semantic_mappings.column_fingerprint on first use (once per process).
+    """
+    global _fingerprint_column_ready
+    if _fingerprint_column_ready:
+        return
+
+    cursor.execute("""
+        ALTER TABLE semantic_mappings
+        ADD COLUMN IF NOT EXISTS column_fingerprint TEXT;
+    """)
+    _fingerprint_column_ready = True
+
+
+UPSERT_SEMANTIC_MAPPINGS_SQL = """
+    INSERT INTO semantic_mappings (
+        table_name,
+        table_domain,
+        dimensions,
+        measures,
+        technical_fields,
+        ignored_fields,
+        column_fingerprint
+    )
+    VALUES %s
+    ON CONFLICT (table_name)
+    DO UPDATE SET
+        table_domain = EXCLUDED.table_domain,
+        dimensions = EXCLUDED.dimensions,
+        measures = EXCLUDED.measures,
+        technical_fields = EXCLUDED.technical_fields,
+        ignored_fields = EXCLUDED.ignored_fields,
+        column_fingerprint = EXCLUDED.column_fingerprint;
+"""
+
+
+# ---------------------------------
+# Store Semantic Mappings (incremental)
+# ---------------------------------
+
+def store_semantic_mappings(force: bool = False, rule_set=None):
+    """
+    Brings semantic_mappings in line with the physical schema.
+
+    - Introspects once (through the schema cache).
+    - Re-classifies only tables whose column fingerprint differs from the
+      stored one (all tables if force=True). Changing the rule set
+      changes every fingerprint.
+    - Upserts the changed tables in one execute_values batch and deletes
+      mappings of dropped tables, in one short transaction.
+
+    Returns {"changed": [...], "dropped": [...], "unchanged": count}.
+    """
 
     conn = None
     try:
+        rule_set = rule_set or get_rule_set()
+        physical_schema = load_physical_schema()
+        fingerprints = {
+            table: table_fingerprint(table, meta, rule_set.fingerprint)
+            for table, meta in physical_schema.items()
+        }
+
+        # 1. Diff against what is stored
         conn = get_db_connection()
         cursor = conn.cursor()
+        ensure_fingerprint_column(cursor)
+        cursor.execute("SELECT table_name, column_fingerprint FROM semantic_mappings;")
+        stored = dict(cursor.fetchall())
+        conn.commit()
+        release_db_connection(conn)
+        conn = None
+
+        changed = sorted(
+            table for table, fingerprint in fingerprints.items()
+            if force or stored.get(table) != fingerprint
+        )
+        dropped = sorted(
+            table for table in stored
+            if table not in physical_schema and table != "semantic_mappings"
+        )
 
-        for table, meta in logical_schema.items():
-            table_domain = meta["table_domain"]
-            dimensions = dimension_map.get(table, {})
-            measures = measure_map.get(table, {})
-            technical_fields = meta["technical_fields"]
-            ignored_fields = meta["ignored_fields"]
+        if not changed and not dropped:
+            return {"changed": [], "dropped": [], "unchanged": len(fingerprints)}
 
+        # 2. Classify only the changed tables (no connection held)
+        logical_schema = build_logical_domain_map(
+            {t: physical_schema[t] for t in changed}, rule_set
+        )
+        measure_map = build_measure_map(logical_schema)
+        dimension_map = build_dimension_map(logical_schema)
+
+        rows = [
+            (
+                table,
+                meta["table_domain"],
+                json.dumps(dimension_map.get(table, {})),
+                json.dumps(measure_map.get(table, {})),
+                json.dumps(meta["technical_fields"]),
+                json.dumps(meta["ignored_fields"]),
+                fingerprints[table]
+            )
+            for table, meta in logical_schema.items()
+        ]
+
+        # 3. Write everything in one batch
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        if rows:
+            execute_values(cursor, UPSERT_SEMANTIC_MAPPINGS_SQL, rows, page_size=1000)
+
+        if dropped:
             cursor.execute(
-                """
-                INSERT INTO semantic_mappings (
-                    table_name,
-                    table_domain,
-                    dimensions,
-                    measures,
-                    technical_fields,
-                    ignored_fields
-                )
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (table_name)
-                DO UPDATE SET
-                    table_domain = EXCLUDED.table_domain,
-                    dimensions = EXCLUDED.dimensions,
-                    measures = EXCLUDED.measures,
-                    technical_fields = EXCLUDED.technical_fields,
-                    ignored_fields = EXCLUDED.ignored_fields;
-                """,
-                (
-                    table,
-                    table_domain,
-                    json.dumps(dimensions),
-                    json.dumps(measures),
-                    json.dumps(technical_fields),
-                    json.dumps(ignored_fields)
-                )
+                "DELETE FROM semantic_mappings WHERE table_name = ANY(%s);",
+                (dropped,)
             )
 
         conn.commit()
         cursor.close()
 
+        # Change notification: readers pick up the new mappings immediately
+        from semantic_catalog import invalidate_semantic_catalog
+        invalidate_semantic_catalog()
+
+        return {
+            "changed": changed,
+            "dropped": dropped,
+            "unchanged": len(fingerprints) - len(changed)
+        }
+
     except Exception as e:
+        if conn is not None:
+            conn.rollback()
         raise Exception(f"Failed to store semantic mappings: {str(e)}")
 
     finally:
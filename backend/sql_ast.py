@@ -0,0 +1,429 @@
+import dataclasses
+from dataclasses import dataclass
+from functools import cached_property
+
+
+# ---------------------------------
+# Query AST (compile once, render to SQL + params)
+# ---------------------------------
+#
+# Every node renders itself into SQL text and appends its literal values
+# to a shared params list, so values never end up inline in the SQL:
+# two plans that differ only in values produce identical SQL text.
+
+
+@dataclass(frozen=True)
+class Column:
+    table: str
+    name: str
+
+    def render(self, params: list) -> str:
+        return f"{self.table}.{self.name}"
+
+    def columns(self):
+        return ((self.table, self.name),)
+
+
+@dataclass(frozen=True)
+class Param:
+    """
+    A bound value (rendered as %s, optionally with a cast).
+    """
+    value: object
+    cast: str = None
+
+    def render(self, params: list) -> str:
+        params.append(self.value)
+        return f"%s::{self.cast}" if self.cast else "%s"
+
+    def columns(self):
+        return ()
+
+
+@dataclass(frozen=True)
+class Fragment:
+    """
+    A trusted SQL fragment generated by WhareIQ itself (never user input).
+    Each {} in sql is replaced by the rendering of the matching arg.
+    """
+    sql: str
+    args: tuple = ()
+
+    def render(self, params: list) -> str:
+        return self.sql.format(*[arg.render(params) for arg in self.args])
+
+    def columns(self):
+        return tuple(c for arg in self.args for c in arg.columns())
+
+
+AGGREGATE_SQL = {
+    "sum": "SUM({})",
+    "count": "COUNT({})",
+    "avg": "AVG({})",
+    "min": "MIN({})",
+    "max": "MAX({})",
+    "distinct_count": "COUNT(DISTINCT {})",
+}
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    operation: str
+    arg: object
+
+    def __post_init__(self):
+        if self.operation not in AGGREGATE_SQL:
+            raise ValueError(f"Unsupported aggregation operation: {self.operation}")
+
+    def render(self, params: list) -> str:
+        return AGGREGATE_SQL[self.operation].format(self.arg.render(params))
+
+    def columns(self):
+        return self.arg.columns()
+
+
+TIME_GRAINS = ("day", "week", "month", "quarter", "year")
+
+
+@dataclass(frozen=True)
+class TimeBucket:
+    """
+    Start date of the day / week / month / quarter / year column falls in.
+    The grain is one of TIME_GRAINS, so it is safe to write inline.
+    """
+    grain: str
+    column: object
+    date_column: bool = False  # date_trunc(date) would resolve to timestamptz
+
+    def __post_init__(self):
+        if self.grain not in TIME_GRAINS:
+            raise ValueError(f"Unsupported time grain: {self.grain}")
+
+    def render(self, params: list) -> str:
+        arg = self.column.render(params)
+        if self.date_column:
+            arg = f"{arg}::timestamp"
+        return f"date_trunc('{self.grain}', {arg})::date"
+
+    def columns(self):
+        return self.column.columns()
+
+
+@dataclass(frozen=True)
+class SelectItem:
+    expr: object
+    alias: str = None
+
+    def render(self, params: list) -> str:
+        sql = self.expr.render(params)
+        return f"{sql} AS {self.alias}" if self.alias else sql
+
+    def columns(self):
+        return self.expr.columns()
+
+
+@dataclass(frozen=True)
+class Join:
+    table: str
+    on: tuple  # ((Column, Column), ...) equality pairs
+    join_type: str = "INNER"
+
+    def render(self, params: list) -> str:
+        condition = " AND ".join(f"{l.render(params)} = {r.render(params)}" for l, r in self.on)
+        return f"{self.join_type} JOIN {self.table} ON {condition}"
+
+    def columns(self):
+        return tuple(c for l, r in self.on for c in l.columns() + r.columns())
+
+
+@dataclass(frozen=True)
+class Predicate:
+    left: object
+    op: str
+    right: object = None  # None for unary operators (e.g. IS NULL)
+
+    def render(self, params: list) -> str:
+        left = self.left.render(params)
+        if self.right is None:
+            return f"{left} {self.op}"
+        return f"{left} {self.op} {self.right.render(params)}"
+
+    def columns(self):
+        right = self.right.columns() if self.right is not None else ()
+        return self.left.columns() + right
+
+
+@dataclass(frozen=True)
+class OrderBy:
+    expr: object
+    direction: str = "ASC"
+
+    def render(self, params: list) -> str:
+        return f"{self.expr.render(params)} {self.direction}"
+
+    def columns(self):
+        return self.expr.columns()
+
+
+@dataclass(frozen=True)
+class Limit:
+    count: int
+
+    def render(self, params: list) -> str:
+        # Kept inline: it is always an int and the limit enforcer reads it
+        return f"LIMIT {int(self.count)}"
+
+
+@dataclass(frozen=True)
+class GapFill:
+    """
+    Fills missing periods of a time-bucketed query with generate_series.
+
+    The aggregated query becomes a subquery LEFT JOINed onto every bucket
+    from start to stop (ISO dates, both aligned to grain, stop inclusive);
+    measures in zero_fill (counts and sums) read 0 for empty buckets.
+    """
+    grain: str
+    start: str
+    stop: str
+    period_alias: str
+    zero_fill: tuple = ()
+
+    def __post_init__(self):
+        if self.grain not in TIME_GRAINS:
+            raise ValueError(f"Unsupported time grain: {self.grain}")
+
+    def render(self, query, params: list) -> str:
+        period = "series.period::date"
+
+        outer_items = []
+        for item in query.items:
+            if item.alias == self.period_alias:
+                outer_items.append(f"{period} AS {item.alias}")
+            elif item.alias in self.zero_fill:
+                outer_items.append(f"COALESCE(agg.{item.alias}, 0) AS {item.alias}")
+            else:
+                outer_items.append(f"agg.{item.alias} AS {item.alias}")
+
+        series = (
+            f"generate_series({Param(self.start, 'timestamp').render(params)}, "
+            f"{Param(self.stop, 'timestamp').render(params)}, interval '1 {self.grain}') AS series(period)"
+        )
+
+        inner_query = dataclasses.replace(query, order_by=(), limit=None, gap_fill=None)
+        inner = inner_query._render_sql(params)
+
+        # ORDER BY can only name the subquery's output columns
+        aliases = {item.expr: item.alias for item in query.items}
+        order_by = []
+        for order in query.order_by:
+            alias = aliases.get(order.expr)
+            if alias is None:
+                continue
+            target = period if alias == self.period_alias else f"agg.{alias}"
+            order_by.append(f"{target} {order.direction}")
+
+        sql = (
+            "SELECT " + ", ".join(outer_items)
+            + f" FROM {series}"
+            + f" LEFT JOIN ({inner}) AS agg ON agg.{self.period_alias} = {period}"
+        )
+        if order_by:
+            sql += " ORDER BY " + ", ".join(order_by)
+        if query.limit is not None:
+            sql += " " + query.limit.render(params)
+        return sql
+
+
+@dataclass(frozen=True)
+class Select:
+    items: tuple
+    from_table: str
+    joins: tuple = ()
+    where: tuple = ()
+    group_by: tuple = ()
+    having: tuple = ()
+    order_by: tuple = ()
+    limit: Limit = None
+    gap_fill: GapFill = None
+
+    def _render_clauses(self, params: list) -> dict:
+        clauses = {
+            "select": "SELECT " + ", ".join(i.render(params) for i in self.items),
+            "from": "FROM " + " ".join([self.from_table] + [j.render(params) for j in self.joins]),
+            "where": "",
+            "group_by": "",
+            "having": "",
+            "order_by": "",
+            "limit": "",
+        }
+        if self.where:
+            clauses["where"] = "WHERE " + " AND ".join(p.render(params) for p in self.where)
+        if self.group_by:
+            clauses["group_by"] = "GROUP BY " + ", ".join(g.render(params) for g in self.group_by)
+        if self.having:
+            clauses["having"] = "HAVING " + " AND ".join(p.render(params) for p in self.having)
+        if self.order_by:
+            clauses["order_by"] = "ORDER BY " + ", ".join(o.render(params) for o in self.order_by)
+        if self.limit is not None:
+            clauses["limit"] = self.limit.render(params)
+        return clauses
+
+    @cached_property
+    def compiled(self):
+        """
+        (sql, params) for this query; computed once per AST instance.
+        """
+        params = []
+        if self.gap_fill is not None:
+            sql = self.gap_fill.render(self, params)
+        else:
+            sql = self._render_sql(params)
+        return sql, tuple(params)
+
+    def _render_sql(self, params: list) -> str:
+        clauses = self._render_clauses(params)
+        return " ".join(part for part in clauses.values() if part)
+
+    def render(self):
+        return self.compiled
+
+    def clauses(self) -> dict:
+        """
+        Individual clause strings (with placeholders), for display/debugging.
+        A gap-filled query shows the clauses of its aggregated subquery.
+        """
+        return self._render_clauses([])
+
+    def with_limit(self, count: int):
+        return dataclasses.replace(self, limit=Limit(count))
+
+    def output_names(self) -> list:
+        """
+        Result column names, in order (an unaliased column keeps its own name).
+        """
+        return [item.alias or getattr(item.expr, "name", "?column?") for item in self.items]
+
+    # -----------------------------
+    # Introspection for validators
+    # -----------------------------
+
+    def tables(self) -> set:
+        return {self.from_table} | {j.table for j in self.joins}
+
+    def referenced_columns(self) -> set:
+        """
+        (table, column) pairs the query reads or exposes, excluding join keys.
+        """
+        nodes = self.items + self.where + self.group_by + self.having + self.order_by
+        return {c for node in nodes for c in node.columns()}
+
+    def join_columns(self) -> set:
+        return {c for j in self.joins for c in j.columns()}
+
+
+# ---------------------------------
+# Grouping Sets (several GROUP BYs in one scan)
+# ---------------------------------
+
+@dataclass(frozen=True)
+class GroupingSets:
+    """
+    GROUP BY GROUPING SETS ((a, b), (c), ()): one aggregation per set.
+    """
+    sets: tuple  # ((expr, ...), ...)
+
+    def render(self, params: list) -> str:
+        rendered = ["(" + ", ".join(e.render(params) for e in s) + ")" for s in self.sets]
+        return "GROUPING SETS (" + ", ".join(rendered) + ")"
+
+    def columns(self):
+        return tuple(c for s in self.sets for e in s for c in e.columns())
+
+
+@dataclass(frozen=True)
+class Grouping:
+    """
+    GROUPING(a, b, ...): bit i (first argument = most significant) is 1
+    when the row's grouping set does not contain argument i.
+    """
+    args: tuple
+
+    def render(self, params: list) -> str:
+        return "GROUPING(" + ", ".join(a.render(params) for a in self.args) + ")"
+
+    def columns(self):
+        return tuple(c for a in self.args for c in a.columns())
+
+
+GROUPING_MAX_ARGS = 31  # GROUPING() returns an integer bit mask
+
+
+@dataclass(frozen=True)
+class GroupingSetsQuery:
+    """
+    Several aggregate queries over the same FROM / WHERE, answered by one
+    GROUP BY GROUPING SETS scan. Each set keeps its own LIMIT (set_limits,
+    same order as sets) through row_number() over the set's rows.
+
+    Output columns: items, then grouping_id (see grouping_id()), which
+    tells which set a row belongs to. Expressions outside a row's set are NULL.
+    """
+    items: tuple  # SelectItem(expr, alias), aliases unique
+    from_table: str
+    joins: tuple
+    where: tuple
+    grouping_columns: tuple  # every expr of every set; the GROUPING() argument order
+    sets: tuple
+    set_limits: tuple
+
+    def __post_init__(self):
+        if not 0 < len(self.grouping_columns) <= GROUPING_MAX_ARGS:
+            raise ValueError(f"Grouping sets need 1 to {GROUPING_MAX_ARGS} grouping columns")
+        if len(self.sets) != len(self.set_limits):
+            raise ValueError("Every grouping set needs a limit")
+
+    def grouping_id(self, grouping_set: tuple) -> int:
+        """
+        The GROUPING(...) value of rows produced by grouping_set.
+        """
+        bits = 0
+        for expr in self.grouping_columns:
+            bits = (bits << 1) | (0 if expr in grouping_set else 1)
+        return bits
+
+    @cached_property
+    def compiled(self):
+        params = []
+        grouped = Select(
+            items=self.items + (SelectItem(Grouping(self.grouping_columns), "grouping_id"),),
+            from_table=self.from_table,
+            joins=self.joins,
+            where=self.where,
+            group_by=(GroupingSets(self.sets),),
+        )
+        inner = grouped._render_sql(params)
+
+        limits = " ".join(
+            f"WHEN {self.grouping_id(s)} THEN {int(limit)}" for s, limit in zip(self.sets, self.set_limits)
+        )
+        outputs = ", ".join(f"s.{item.alias}" for item in self.items)
+        sql = (
+            f"SELECT {outputs}, s.grouping_id FROM ("
+            f"SELECT g.*, row_number() OVER (PARTITION BY g.grouping_id) AS set_row FROM ({inner}) AS g"
+            f") AS s WHERE s.set_row <= CASE s.grouping_id {limits} END"
+        )
+        return sql, tuple(params)
+
+    def render(self):
+        return self.compiled
+
+    def tables(self) -> set:
+        return {self.from_table} | {j.table for j in self.joins}
+
+    def referenced_columns(self) -> set:
+        nodes = self.items + self.where + self.grouping_columns
+        return {c for node in nodes for c in node.columns()}
+
+    def join_columns(self) -> set:
+        return {c for j in self.joins for c in j.columns()}
@@ -1,93 +1,204 @@
+import datetime
+import os
+
 from measure_resolver import resolve_measures
 from dimension_resolver import resolve_dimensions
 from join_resolver import build_join_plan
-from time_filter_resolver import resolve_time_filter
+from time_filter_resolver import resolve_time_filter, resolve_time_grain, truncate_date
+from filter_resolver import resolve_filters, resolve_sorting
+from rollup_manager import route_to_rollup
+from sql_ast import Aggregate, Column, GapFill, Join, Limit, Select, SelectItem
+
+# Read pre-aggregated rollups instead of the fact table when they can answer a query.
+# Each database registers its own rollups (rollup_manager); route_query reads the
+# internal registry unless the caller passes the registry of the database the
+# query runs on (the API endpoints pass the tenant's).
+ROLLUP_ROUTING_ENABLED = os.getenv("ROLLUP_ROUTING_ENABLED", "true").lower() == "true"
 
+# Output column of the time bucket in time_grain (trend) queries
+PERIOD_ALIAS = "period"
 
+# Aggregates whose value for an empty period is 0 rather than NULL
+ZERO_FILL_OPERATIONS = ("count", "distinct_count", "sum")
 
 
-def build_sql(plan: dict):
+def resolve_gap_fill(plan: dict, time_grain: dict, time_filter: dict, resolved_dimensions: list,
+                     resolved_measures: list, having: tuple):
     """
-    Builds a full deterministic SQL query from a WhareIQ semantic plan.
+    generate_series gap filling for plan['fill_gaps'], or None.
 
-    Returns:
-      {
-        "sql": "SELECT ...",
-        "select": "...",
-        "from": "...",
-        "where": "...",
-        "group_by": "...",
-        "limit": 100
-      }
+    Only applied to plain trend lines bounded by a time_range: with other
+    dimensions every period would need every dimension value, and with
+    HAVING a period filtered out must stay out.
+    """
+    if not plan.get("fill_gaps") or time_grain is None:
+        return None
+    if resolved_dimensions or having or time_filter["bounds"] is None:
+        return None
+
+    grain = time_grain["grain"]
+    start, end = time_filter["bounds"]
+
+    return GapFill(
+        grain,
+        truncate_date(start, grain).isoformat(),
+        truncate_date(end - datetime.timedelta(days=1), grain).isoformat(),
+        PERIOD_ALIAS,
+        zero_fill=tuple(
+            m["logical_name"] for m in resolved_measures if m["operation"] in ZERO_FILL_OPERATIONS
+        ),
+    )
+
+
+def build_query(plan: dict) -> Select:
+    """
+    Builds the query AST for a WhareIQ semantic plan.
+
+    The AST is what the allowlist and limit checks inspect; it renders to
+    parameterized SQL, so plans that differ only in values (dates, day
+    counts, filter values) produce the same SQL text.
     """
 
     # 1. Resolve semantic components
     resolved_measures = resolve_measures(plan)
     resolved_dimensions = resolve_dimensions(plan)
+    filters = resolve_filters(plan, resolved_measures)
 
-    join_plan = build_join_plan(resolved_measures, resolved_dimensions)
+    join_plan = build_join_plan(resolved_measures, resolved_dimensions, filter_tables=filters["tables"])
     base_table = join_plan["base_table"]
 
     if base_table is None:
         raise ValueError("No base table could be determined from measures/dimensions")
 
     time_filter = resolve_time_filter(plan, base_table)
+    time_grain = resolve_time_grain(plan, base_table)
+    time_bucket = time_grain["bucket"] if time_grain else None
 
-    # 2. Build SELECT clause
-    select_parts = []
+    # 2. SELECT items
+    items = []
+
+    if time_bucket is not None:
+        if not resolved_measures:
+            raise ValueError("A time grain needs at least one measure to aggregate per period")
+        if PERIOD_ALIAS in {d["logical_name"] for d in resolved_dimensions}:
+            raise ValueError(f"Dimension '{PERIOD_ALIAS}' clashes with the time grain's output column")
+        items.append(SelectItem(time_bucket, PERIOD_ALIAS))
 
     for d in resolved_dimensions:
-        select_parts.append(d["select_sql"])
+        items.append(SelectItem(Column(d["table"], d["column"]), d["logical_name"]))
 
     for m in resolved_measures:
-        select_parts.append(m["sql"])
+        items.append(SelectItem(
+            Aggregate(m["operation"], Column(m["table"], m["column"])),
+            m["logical_name"]
+        ))
 
-    if not select_parts:
+    if not items:
         raise ValueError("SQL builder cannot construct SELECT with no dimensions or measures")
 
-    select_clause = "SELECT " + ", ".join(select_parts)
+    # 3. FROM / JOIN
+    joins = tuple(
+        Join(
+            j["right_table"],
+            tuple((Column(*left), Column(*right)) for left, right in j["on"]),
+            j["join_type"]
+        )
+        for j in join_plan["joins"]
+    )
+
+    # 4. WHERE (time range + row filters)
+    where = tuple(time_filter["predicates"]) + tuple(filters["where"])
+
+    # 5. GROUP BY (only if measures are present) / HAVING (measure filters)
+    #    A time grain groups by date_trunc, so periods aggregate server-side
+    group_by = ()
+    if resolved_measures and (resolved_dimensions or time_bucket is not None):
+        group_by = tuple(Column(d["table"], d["column"]) for d in resolved_dimensions)
+        if time_bucket is not None:
+            group_by = (time_bucket,) + group_by
+
+    having = tuple(filters["having"])
+
+    # 6. ORDER BY: with LIMIT, Postgres keeps only the top N rows while sorting
+    order_by = tuple(resolve_sorting(
+        plan, resolved_measures, resolved_dimensions, bool(group_by),
+        time_bucket=time_bucket, period_alias=PERIOD_ALIAS
+    ))
+
+    # 7. LIMIT
+    limit = plan.get("limit", 100)
+    if not isinstance(limit, int) or limit <= 0:
+        raise ValueError("Invalid LIMIT value in semantic plan")
 
-    # 3. FROM / JOIN clause
-    from_clause = "FROM " + join_plan["from_sql"]
+    return Select(
+        items=tuple(items),
+        from_table=base_table,
+        joins=joins,
+        where=where,
+        group_by=group_by,
+        having=having,
+        order_by=order_by,
+        limit=Limit(limit),
+        gap_fill=resolve_gap_fill(
+            plan, time_grain, time_filter, resolved_dimensions, resolved_measures, having
+        )
+    )
+
+
+def route_query(query: Select, use_rollups: bool = None, rollups: list = None) -> Select:
+    """
+    Rewrites an already-validated query onto a rollup table when one can
+    answer it exactly (see rollup_manager.rewrite_for_rollup); otherwise
+    returns query unchanged.
 
-    # 4. WHERE clause (time filters only for V1)
-    where_clauses = []
-    where_clauses.extend(time_filter["where_clauses"])
+    rollups: the registry of the database the query will run on (see
+    rollup_manager.get_tenant_rollups_async); the internal database's
+    registry if omitted.
+    """
+    if use_rollups is None:
+        use_rollups = ROLLUP_ROUTING_ENABLED
 
-    where_clause = ""
-    if where_clauses:
-        where_clause = "WHERE " + " AND ".join(where_clauses)
+    if not use_rollups:
+        return query
 
-    # 5. GROUP BY (only if measures are present)
-    group_by_clause = ""
-    if resolved_measures and resolved_dimensions:
-        group_cols = [d["group_by_sql"] for d in resolved_dimensions]
-        group_by_clause = "GROUP BY " + ", ".join(group_cols)
+    return route_to_rollup(query, rollups) or query
 
-    # 6. LIMIT
-    limit = plan.get("limit", 100)
-    if not isinstance(limit, int) or limit <= 0:
-        raise ValueError("Invalid LIMIT value in semantic plan")
 
-    limit_clause = f"LIMIT {limit}"
+def build_sql(plan: dict, use_rollups: bool = False):
+    """
+    Builds a full deterministic SQL query from a WhareIQ semantic plan.
 
-    # 7. Final SQL Assembly
-    sql_parts = [
-        select_clause,
-        from_clause,
-        where_clause,
-        group_by_clause,
-        limit_clause
-    ]
+    Returns:
+      {
+        "ast": Select(...),
+        "sql": "SELECT ... WHERE orders.created_at >= %s::date ...",
+        "params": ("2024-01-01", ...),
+        "select": "...",
+        "from": "...",
+        "where": "...",
+        "group_by": "...",
+        "having": "...",
+        "order_by": "...",
+        "limit": 100
+      }
+
+    use_rollups: route to a rollup table when possible. Off by default
+    here, since callers usually validate the logical query first.
+    """
 
-    # remove empty parts
-    final_sql = " ".join([p for p in sql_parts if p])
+    query = route_query(build_query(plan), use_rollups)
+    sql, params = query.render()
+    clauses = query.clauses()
 
     return {
-        "sql": final_sql,
-        "select": select_clause,
-        "from": from_clause,
-        "where": where_clause,
-        "group_by": group_by_clause,
-        "limit": limit
+        "ast": query,
+        "sql": sql,
+        "params": params,
+        "select": clauses["select"],
+        "from": clauses["from"],
+        "where": clauses["where"],
+        "group_by": clauses["group_by"],
+        "having": clauses["having"],
+        "order_by": clauses["order_by"],
+        "limit": query.limit.count
     }
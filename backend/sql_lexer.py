@@ -0,0 +1,208 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+# ---------------------------------
+# SQL Lexer (single pass, literal-aware)
+# ---------------------------------
+
+Token = namedtuple("Token", ["kind", "text", "start", "end"])
+
+# Alternation order matters: literals and comments are matched before
+# words, so keywords inside strings / quoted identifiers / comments never
+# surface as "word" tokens.
+_TOKEN_REGEX = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>[eE]'(?:\\.|''|[^'\\])*'?|'(?:''|[^'])*'?)
+  | (?P<dollar_string>\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*)?\$.*?(?:\$(?P=tag)\$|\Z))
+  | (?P<quoted_ident>"(?:""|[^"])*"?)
+  | (?P<param>%s|%\([A-Za-z_][A-Za-z0-9_]*\)s|\$\d+)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op>::|<>|!=|<=|>=|\|\||.)
+""", re.VERBOSE | re.DOTALL)
+
+
+@lru_cache(maxsize=512)
+def tokenize(sql: str) -> tuple:
+    """
+    Splits SQL into tokens in one regex pass. Whitespace is dropped;
+    comments are kept (as "comment" tokens) so callers can reject them.
+
+    Token kinds: comment, string, dollar_string, quoted_ident, param,
+    number, word, op.
+    """
+    tokens = []
+    for match in _TOKEN_REGEX.finditer(sql):
+        kind = match.lastgroup
+        if kind == "ws":
+            continue
+        tokens.append(Token(kind, match.group(), match.start(), match.end()))
+    return tuple(tokens)
+
+
+def _is_unterminated(token: Token) -> bool:
+    text = token.text
+    if token.kind == "string":
+        body = text[1:] if text[0] in "eE" else text
+        return len(body) < 2 or not body.endswith("'")
+    if token.kind == "quoted_ident":
+        return len(text) < 2 or not text.endswith('"')
+    if token.kind == "comment":
+        return text.startswith("/*") and not text.endswith("*/")
+    if token.kind == "dollar_string":
+        return text.count("$") < 4
+    return False
+
+
+def identifier_name(token: Token) -> str:
+    """
+    Returns the identifier a word / quoted_ident token refers to.
+    """
+    if token.kind == "quoted_ident":
+        return token.text[1:-1].replace('""', '"')
+    return token.text
+
+
+# ---------------------------------
+# SQL Analysis (everything the validators need, one walk)
+# ---------------------------------
+
+SqlAnalysis = namedtuple("SqlAnalysis", [
+    "tokens",
+    "first_keyword",      # lowercase first word, e.g. "select"
+    "keywords",           # frozenset of lowercase words outside literals
+    "has_semicolon",
+    "has_comment",
+    "has_unterminated",   # unterminated string / identifier / comment
+    "tables",             # tuple of names following FROM / JOIN ("schema.table" outside public)
+    "columns",            # frozenset of (qualifier, column) pairs; qualifier may be "schema.table"
+    "limit",              # top-level LIMIT token info, or None
+])
+
+# limit: (value, start, end) where value is an int, "all" or "param",
+# and [start, end) spans "LIMIT <value>" in the original SQL.
+
+_IDENT_KINDS = ("word", "quoted_ident")
+
+# Tables in the default schema are keyed by their bare name (schema_reader)
+_DEFAULT_SCHEMA_PREFIX = "public."
+
+
+def _identifier_chains(tokens: tuple) -> dict:
+    """
+    {index of first token: [names]} for every dotted identifier chain
+    (users, users.email, sales.orders.amount, "Sales"."Orders").
+    """
+    chains = {}
+    i = 0
+    while i < len(tokens):
+        if tokens[i].kind not in _IDENT_KINDS or (i > 0 and tokens[i - 1].text == "."):
+            i += 1
+            continue
+
+        start = i
+        names = [identifier_name(tokens[i])]
+        while (
+            i + 2 < len(tokens)
+            and tokens[i + 1].kind == "op" and tokens[i + 1].text == "."
+            and tokens[i + 2].kind in _IDENT_KINDS
+        ):
+            names.append(identifier_name(tokens[i + 2]))
+            i += 2
+
+        chains[start] = names
+        i += 1
+    return chains
+
+
+def _table_key(names: list) -> str:
+    key = ".".join(names)
+    if key.startswith(_DEFAULT_SCHEMA_PREFIX):
+        return key[len(_DEFAULT_SCHEMA_PREFIX):]
+    return key
+
+
+@lru_cache(maxsize=512)
+def analyze_sql(sql: str) -> SqlAnalysis:
+    """
+    Tokenizes sql once and derives the keyword / stacked-query / comment
+    checks, the table + column allowlist extraction and LIMIT detection
+    from the same token stream. Cached, so the validators and the limit
+    enforcer share one pass per SQL string.
+    """
+    tokens = tokenize(sql)
+    chains = _identifier_chains(tokens)
+
+    first_keyword = None
+    keywords = set()
+    has_semicolon = False
+    has_comment = False
+    has_unterminated = False
+    tables = []
+    columns = set()
+    limit = None
+    depth = 0
+
+    for i, token in enumerate(tokens):
+        kind = token.kind
+
+        if _is_unterminated(token):
+            has_unterminated = True
+
+        if kind == "comment":
+            has_comment = True
+            continue
+
+        if kind == "op":
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                depth -= 1
+            elif token.text == ";":
+                has_semicolon = True
+            continue
+
+        # A dotted chain outside FROM / JOIN is a column: every part but
+        # the last is the table (sales.orders.amount → ("sales.orders", "amount"))
+        names = chains.get(i)
+        if names is not None and len(names) > 1:
+            previous = tokens[i - 1] if i > 0 else None
+            if previous is None or previous.kind != "word" or previous.text.lower() not in ("from", "join"):
+                columns.add((_table_key(names[:-1]), names[-1]))
+
+        if kind != "word":
+            continue
+
+        lower = token.text.lower()
+        keywords.add(lower)
+
+        if first_keyword is None:
+            first_keyword = lower
+
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        if lower in ("from", "join") and i + 1 in chains:
+            tables.append(_table_key(chains[i + 1]))
+
+        elif lower == "limit" and depth == 0 and nxt is not None:
+            if nxt.kind == "number" and nxt.text.isdigit():
+                limit = (int(nxt.text), token.start, nxt.end)
+            elif nxt.kind == "word" and nxt.text.lower() == "all":
+                limit = ("all", token.start, nxt.end)
+            elif nxt.kind == "param":
+                limit = ("param", token.start, nxt.end)
+
+    return SqlAnalysis(
+        tokens=tokens,
+        first_keyword=first_keyword,
+        keywords=frozenset(keywords),
+        has_semicolon=has_semicolon,
+        has_comment=has_comment,
+        has_unterminated=has_unterminated,
+        tables=tuple(tables),
+        columns=frozenset(columns),
+        limit=limit,
+    )
@@ -1,4 +1,4 @@
-import re
+from sql_lexer import analyze_sql
 
 
 # ---------------------------------
@@ -10,13 +10,6 @@ FORBIDDEN_KEYWORDS = [
     "create", "truncate", "grant", "revoke", "merge"
 ]
 
-FORBIDDEN_PATTERNS = [
-    r";",           # stacked queries
-    r"--",          # inline comments
-    r"/\*",         # block comment start
-    r"\*/"          # block comment end
-]
-
 
 def validate_sql(sql: str) -> bool:
     """
@@ -26,25 +19,28 @@ def validate_sql(sql: str) -> bool:
     - Must be a SELECT statement
     - Must not contain forbidden SQL keywords
     - Must not contain stacked queries or comments
+
+    Checks run on the token stream from sql_lexer, so keywords, ';' and
+    comment markers inside string literals or quoted identifiers are
+    not false positives.
     """
 
     if not sql or not isinstance(sql, str):
         raise ValueError("Empty or invalid SQL")
 
-    normalized = sql.strip().lower()
+    analysis = analyze_sql(sql)
 
     # 1. Must start with SELECT
-    if not normalized.startswith("select"):
+    if analysis.first_keyword != "select" or analysis.tokens[0].kind != "word":
         raise ValueError("Only SELECT statements are allowed")
 
     # 2. Block forbidden keywords
     for kw in FORBIDDEN_KEYWORDS:
-        if re.search(rf"\b{kw}\b", normalized):
+        if kw in analysis.keywords:
             raise ValueError(f"Forbidden SQL keyword detected: {kw}")
 
-    # 3. Block injection patterns
-    for pattern in FORBIDDEN_PATTERNS:
-        if re.search(pattern, sql):
-            raise ValueError("Potentially dangerous SQL pattern detected")
+    # 3. Block injection patterns (stacked queries, comments, broken literals)
+    if analysis.has_semicolon or analysis.has_comment or analysis.has_unterminated:
+        raise ValueError("Potentially dangerous SQL pattern detected")
 
     return True
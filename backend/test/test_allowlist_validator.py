@@ -1,4 +1,4 @@
-from src.allowlist_validator import validate_allowlist
+from src.allowlist_validator import validate_allowlist, extract_tables, extract_columns
 
 # SAFE: only semantic dimensions
 safe_sql = "SELECT users.email AS email, users.name AS name FROM users LIMIT 10"
@@ -43,3 +43,12 @@ try:
     print("UNEXPECTED PASS")
 except Exception as e:
     print("BLOCKED AS EXPECTED:", e)
+
+
+print("\n✅ TEST 5 (SCHEMA-QUALIFIED TABLES KEEP THEIR schema.table KEY)")
+qualified_sql = (
+    "SELECT sales.orders.amount, users.email FROM sales.orders "
+    "INNER JOIN public.users ON sales.orders.user_id = users.id"
+)
+print("tables:", sorted(extract_tables(qualified_sql)))
+print("columns:", sorted(extract_columns(qualified_sql)))
@@ -0,0 +1,34 @@
+import asyncio
+from src.async_db import execute_with_timeout_async
+
+
+async def main():
+    # Fast query (should succeed)
+    print("\n✅ TEST 1 (FAST ASYNC QUERY)")
+    try:
+        rows = await execute_with_timeout_async("SELECT 1", timeout_ms=1000)
+        print("PASSED:", rows)
+    except Exception as e:
+        print("FAILED:", e)
+
+    # Many slow queries in flight at once on one event loop
+    print("\n✅ TEST 2 (CONCURRENT ASYNC QUERIES)")
+    try:
+        results = await asyncio.gather(*[
+            execute_with_timeout_async("SELECT pg_sleep(0.5), %s", (i,), timeout_ms=2000)
+            for i in range(5)
+        ])
+        print("PASSED:", len(results), "queries")
+    except Exception as e:
+        print("FAILED:", e)
+
+    # Slow query (should be canceled)
+    print("\n❌ TEST 3 (SLOW ASYNC QUERY)")
+    try:
+        rows = await execute_with_timeout_async("SELECT pg_sleep(3)", timeout_ms=1000)
+        print("UNEXPECTED PASS:", rows)
+    except Exception as e:
+        print("BLOCKED AS EXPECTED:", e)
+
+
+asyncio.run(main())
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# ---------------------------------
+# Local stand-in for Supabase (JWKS + /auth/v1/user)
+# ---------------------------------
+
+rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(rsa_key.public_key()))
+jwk.update(kid="key-1", use="sig", alg="RS256")
+
+requests_seen = []
+remote_token = None  # the only token /auth/v1/user accepts
+
+
+class FakeSupabase(BaseHTTPRequestHandler):
+    def do_GET(self):
+        requests_seen.append(self.path)
+        if self.path == "/jwks.json":
+            body = {"keys": [jwk]}
+        elif self.path == "/auth/v1/user" and self.headers["Authorization"] == f"Bearer {remote_token}":
+            body = {"id": "remote-user", "email": "remote@example.com"}
+        else:
+            self.send_response(401)
+            self.end_headers()
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+server = HTTPServer(("127.0.0.1", 0), FakeSupabase)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_port}"
+
+os.environ["SUPABASE_URL"] = base_url
+os.environ["SUPABASE_ANON_KEY"] = "anon-key"
+os.environ["SUPABASE_JWKS_URL"] = f"{base_url}/jwks.json"
+os.environ["SUPABASE_JWT_SECRET"] = "test-secret-with-at-least-32-bytes!"
+os.environ["JWKS_REFETCH_INTERVAL_S"] = "60"
+
+from src.auth import authenticate_token_async, _TOKEN_CACHE, _token_key  # noqa: E402
+
+
+def claims(expires_in: float, sub: str = "user-1") -> dict:
+    return {"sub": sub, "aud": "authenticated", "role": "authenticated", "exp": int(time.time() + expires_in)}
+
+
+def hs256(payload):
+    return jwt.encode(payload, os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256")
+
+
+def rs256(payload, kid="key-1"):
+    return jwt.encode(payload, rsa_key, algorithm="RS256", headers={"kid": kid})
+
+
+# One loop for the whole script: the remote fallback's HTTP client is bound to it
+loop = asyncio.new_event_loop()
+
+
+def authenticate(token):
+    try:
+        return loop.run_until_complete(authenticate_token_async(token))
+    except Exception as e:
+        return f"{type(e).__name__} {getattr(e, 'status_code', '')}".strip()
+
+
+def cache_ttl(token):
+    expires_at, _ = _TOKEN_CACHE._data[_token_key(token)]
+    return round(expires_at - time.monotonic())
+
+
+print("\n✅ TEST 1 (HS256 VERIFIED LOCALLY)")
+token = hs256(claims(3600))
+print(authenticate(token))
+print("wrong secret:", authenticate(jwt.encode(claims(3600), "another-secret-with-32-bytes-or-more", algorithm="HS256")))
+
+print("\n✅ TEST 2 (RS256 VERIFIED AGAINST THE JWKS)")
+print(authenticate(rs256(claims(3600, sub="user-2"))))
+print("signed by another key:", authenticate(jwt.encode(
+    claims(3600), rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    algorithm="RS256", headers={"kid": "key-1"},
+)))
+print("JWKS fetches:", requests_seen.count("/jwks.json"))
+
+print("\n✅ TEST 3 (EXPIRED TOKENS REJECTED)")
+print("HS256:", authenticate(hs256(claims(-60))))
+print("RS256:", authenticate(rs256(claims(-60))))
+
+print("\n✅ TEST 4 (CACHE TTL CAPPED BY TOKEN EXPIRY AND TOKEN_CACHE_MAX_TTL_S)")
+short = hs256(claims(45, sub="user-3"))
+authenticate(short)
+print("expires in 45s → cached", cache_ttl(short), "s")
+print("expires in 1h  → cached", cache_ttl(token), "s")
+
+print("\n✅ TEST 5 (UNKNOWN KID → RATE-LIMITED JWKS REFETCH, THEN REMOTE FALLBACK)")
+requests_seen.clear()
+forged = [rs256(claims(3600, sub=f"forged-{n}"), kid=f"unknown-{n}") for n in range(3)]
+remote_token = forged[0]
+for token in forged:
+    print(authenticate(token))
+print("JWKS fetches:", requests_seen.count("/jwks.json"), "| remote lookups:", requests_seen.count("/auth/v1/user"))
+
+loop.close()
+server.shutdown()
@@ -0,0 +1,37 @@
+from src.cost_gate import (
+    COST_GATE, CostBudgetExceeded, estimate_query_cost, get_tenant_budget, load_tenant_budgets,
+    set_tenant_budget, summarize_plan,
+)
+
+SQL = "SELECT users.email AS email FROM users WHERE users.created_at >= %s::date LIMIT 10"
+
+print("\n✅ TEST 1 (EXPLAIN ESTIMATE)")
+estimate = estimate_query_cost(SQL, ("2024-01-01",))
+print(estimate["total_cost"], estimate["plan_rows"], estimate["cached"])
+for node in estimate["nodes"]:
+    print("  " * node["depth"], node["node_type"], node["relation"], node["total_cost"])
+
+print("\n✅ TEST 2 (SAME VALUES → CACHED, OTHER VALUES → RE-ESTIMATED)")
+print(estimate_query_cost(SQL, ("2024-01-01",))["cached"], estimate_query_cost(SQL, ("2014-01-01",))["cached"])
+
+print("\n✅ TEST 3 (TENANT BUDGETS)")
+set_tenant_budget("tiny", soft=0.001, hard=1e12)
+print(COST_GATE.check("tiny", estimate)["decision"])
+
+set_tenant_budget("none", soft=0, hard=0.001)
+try:
+    COST_GATE.check("none", estimate)
+except CostBudgetExceeded as e:
+    print("Rejected:", e)
+
+print("\n✅ TEST 4 (PLAN SUMMARY FROM JSON TEXT)")
+print(summarize_plan('[{"Plan": {"Node Type": "Seq Scan", "Relation Name": "orders", "Startup Cost": 0.0, "Total Cost": 42.5, "Plan Rows": 1000}}]'))
+
+print("\n✅ TEST 5 (BUDGETS LOADED FROM COST_TENANT_BUDGETS JSON)")
+print("loaded:", load_tenant_budgets('{"user-a": {"soft": 500, "hard": 5000}, "user-b": {"hard": 1e12}}'))
+print("user-a:", get_tenant_budget("user-a"), "| user-b:", get_tenant_budget("user-b"), "| other:", get_tenant_budget("other"))
+for raw in ('["user-a"]', '{"user-c": {"soft": 10, "hard": 1}}', "{not json"):
+    try:
+        load_tenant_budgets(raw)
+    except ValueError as e:
+        print("Rejected:", e)
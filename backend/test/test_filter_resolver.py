@@ -0,0 +1,48 @@
+from src.filter_resolver import compile_filter, prefix_successor, split_values
+from src.sql_ast import Column, Select, SelectItem
+from src.sql_builder import build_sql
+
+
+def render(predicates):
+    query = Select(items=(SelectItem(Column("users", "email")),), from_table="users", where=tuple(predicates))
+    return query.render()
+
+
+email = Column("users", "email")
+
+# 1) Compiled predicates (no database needed)
+print("\n✅ TEST 1: Filter compilation\n")
+print("=        →", render(compile_filter(email, "email", "=", "a@b.com", "text")))
+print("in       →", render(compile_filter(email, "email", "in", "a@b.com, c@d.com", "text")))
+print("not_in   →", render(compile_filter(email, "email", "not_in", "a@b.com", "character varying(255)")))
+print("like x%  →", render(compile_filter(email, "email", "like", "adm%", "text")))
+print("like x   →", render(compile_filter(email, "email", "like", "admin", "text")))
+print("like %x% →", render(compile_filter(email, "email", "like", "%admin%", "text")))
+print("split    →", split_values("Paris, Berlin,Paris"))
+print("succ     →", prefix_successor("abc"), prefix_successor("a\U0010FFFF"))
+
+try:
+    compile_filter(Column("orders", "total_amount"), "total_amount", ">", "lots", "numeric")
+    print("❌ Non-numeric value accepted")
+except ValueError as e:
+    print("Expected failure:", e)
+
+
+# 2) Filters + sorting through the SQL builder (adjust names to your mappings)
+plan = {
+    "measures": [],
+    "dimensions": ["email", "name"],
+    "time_range": None,
+    "filters": [{"field": "name", "operator": "like", "value": "A%"}],
+    "sorting": [{"field": "name", "direction": "asc"}],
+    "limit": 10
+}
+
+try:
+    result = build_sql(plan)
+    print("\n✅ TEST 2: Filtered, sorted SQL\n")
+    print(result["sql"])
+    print(result["params"])
+
+except Exception as e:
+    print("❌ SQL build failed:", e)
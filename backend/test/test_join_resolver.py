@@ -19,3 +19,67 @@ try:
 
 except Exception as e:
     print("❌ Join plan failed:", e)
+
+
+# ---------------------------------
+# Join graph on a synthetic schema (no database)
+# ---------------------------------
+from src.join_resolver import JoinGraph, choose_base_table, get_join_graph
+from src.schema_reader import SCHEMA_CACHE
+
+
+def table(**foreign_keys):
+    return {
+        "columns": {"id": "integer"},
+        "primary_key": ["id"],
+        "foreign_keys": {
+            col: {"references_table": ref, "references_column": "id"} for col, ref in foreign_keys.items()
+        },
+    }
+
+
+# order_items → orders → users → regions, order_items → products → categories
+shop = {
+    "regions": table(),
+    "users": table(region_id="regions"),
+    "orders": table(user_id="users"),
+    "categories": table(),
+    "products": table(category_id="categories"),
+    "order_items": table(order_id="orders", product_id="products"),
+    "payments": table(order_id="orders"),
+}
+graph = JoinGraph(shop)
+
+measures = [{"table": "order_items", "column": "quantity"}]
+dimensions = [{"table": "regions", "column": "name"}, {"table": "categories", "column": "name"}]
+
+print("\n✅ TEST 1 (INTERMEDIATE TABLES ON THE FK PATHS ARE JOINED)")
+plan = build_join_plan(measures, dimensions, join_graph=graph)
+print(plan["from_sql"])
+print("payments joined:", any(j["right_table"] == "payments" for j in plan["joins"]))
+
+print("\n✅ TEST 2 (TIE-BREAKING IS DETERMINISTIC)")
+# One measure each: more outgoing FKs wins (order_items: 2, payments: 1)
+print(choose_base_table(
+    [{"table": "payments"}, {"table": "order_items"}], [], graph
+))
+# Same measure count and out-degree: the table name decides
+print(choose_base_table([{"table": "products"}, {"table": "orders"}], [], graph))
+# Two equally short routes (a → b → d, a → c → d): the same one every time
+diamond = {"a": table(b_id="b", c_id="c"), "b": table(d_id="d"), "c": table(d_id="d"), "d": table()}
+routes = {
+    tuple(j["right_table"] for j in JoinGraph(diamond).steiner_joins("a", tables))
+    for tables in (["a", "d"], ["d", "a"])
+}
+print("routes:", routes)
+
+print("\n✅ TEST 3 (GRAPH REUSED UNTIL THE SCHEMA VERSION CHANGES)")
+SCHEMA_CACHE.prime("join_test", shop, fingerprint="v1")
+first = get_join_graph("join_test")
+first.steiner_joins("order_items", ["regions"])
+print("same version → same graph:", get_join_graph("join_test") is first,
+      "| cached BFS trees:", sorted(first._bfs_trees))
+
+SCHEMA_CACHE.prime("join_test", {**shop, "refunds": table(payment_id="payments")}, fingerprint="v2")
+second = get_join_graph("join_test")
+print("new version → rebuilt:", second is not first, "| knows refunds:", "refunds" in second.adjacency)
@@ -12,3 +12,6 @@ print(enforce_limit(sql_small_limit, max_limit=100))
 
 print("\n❌ TEST 3 (BIG LIMIT)")
 print(enforce_limit(sql_big_limit, max_limit=100))
+
+print("\n✅ TEST 4 (LIMIT INSIDE SUBQUERY / LITERAL IGNORED)")
+print(enforce_limit("SELECT t.email FROM (SELECT users.email FROM users LIMIT 5000) t WHERE t.email != 'limit 9'", max_limit=100))
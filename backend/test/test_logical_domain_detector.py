@@ -16,3 +16,16 @@ try:
 
 except Exception as e:
     print("❌ Logical Domain Detection Failed:", e)
+
+
+# Batch classification + tenant-specific rules
+from src.logical_domain_detector import ColumnRuleSet, classify_columns, CONTACT_FIELDS
+
+columns = {"id": "integer", "email": "text", "slack_handle": "text", "amount": "numeric", "password_hash": "text"}
+
+print("\n✅ BATCH CLASSIFICATION (default rules):")
+print(classify_columns(columns, ["id"]))
+
+tenant_rules = ColumnRuleSet(contact_fields=CONTACT_FIELDS + ["slack"])
+print("\n✅ BATCH CLASSIFICATION (tenant rules, slack_handle → contact):")
+print(classify_columns(columns, ["id"], tenant_rules))
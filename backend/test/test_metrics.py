@@ -0,0 +1,26 @@
+import time
+from src.metrics import (
+    span, start_request, end_request, stage_timings, server_timing_header, render_prometheus,
+)
+
+print("\n✅ TEST 1 (STAGE SPANS IN A REQUEST)")
+request_id, tokens = start_request()
+with span("llm"):
+    time.sleep(0.02)
+with span("execution"):
+    time.sleep(0.01)
+with span("execution"):
+    time.sleep(0.01)
+print(request_id, stage_timings())
+
+print("\n✅ TEST 2 (SERVER-TIMING HEADER)")
+print(server_timing_header(stage_timings(), total_s=0.05))
+end_request(tokens)
+
+print("\n✅ TEST 3 (MALFORMED CLIENT REQUEST ID IS REPLACED)")
+request_id, tokens = start_request("bad id\r\nX-Injected: 1")
+print(request_id)
+end_request(tokens)
+
+print("\n✅ TEST 4 (PROMETHEUS EXPOSITION)")
+print("\n".join(line for line in render_prometheus().splitlines() if 'stage="llm"' in line))
@@ -0,0 +1,26 @@
+from src.plan_cache import PlanCache, make_plan_cache_key, normalize_question
+
+cache = PlanCache(sqlite_path=":memory:")
+
+plan = {
+    "needs_clarification": False,
+    "clarification_question": None,
+    "plan": None
+}
+
+key_1 = make_plan_cache_key("Revenue this month?", "prompt", "v1", "llama3-8b-8192")
+key_2 = make_plan_cache_key("  Revenue   this month ", "prompt", "v1", "llama3-8b-8192")
+key_3 = make_plan_cache_key("Revenue this month", "prompt", "v2", "llama3-8b-8192")
+
+# Filter values come from the question text: case changes the plan
+shipped = make_plan_cache_key("orders with status Shipped", "prompt", "v1", "llama3-8b-8192")
+shipped_upper = make_plan_cache_key("orders with status SHIPPED", "prompt", "v1", "llama3-8b-8192")
+
+print("\n✅ NORMALIZED:", normalize_question("  Revenue   THIS month? "))
+print("✅ Same key for equivalent questions:", key_1 == key_2)
+print("✅ Different key for new catalog version:", key_1 != key_3)
+print("✅ Different key when a value's case differs:", shipped != shipped_upper)
+
+cache.set(key_1, plan)
+print("\n✅ CACHE HIT:", cache.get(key_2))
+print("✅ CACHE MISS:", cache.get(key_3))
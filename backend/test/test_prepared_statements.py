@@ -0,0 +1,32 @@
+from src.db import get_db_connection, release_db_connection
+from src.prepared_statements import PreparedStatementRegistry, to_positional
+
+print("\n✅ TEST 1 (PLACEHOLDERS → $n)")
+print(to_positional("SELECT users.email FROM users WHERE users.created_at >= %s::date AND users.name LIKE 'a%%'"))
+
+print("\n✅ TEST 2 (NON-SELECT IS NOT PREPARED)")
+print(to_positional("DELETE FROM users WHERE id = %s"))
+
+registry = PreparedStatementRegistry(max_per_connection=2)
+conn = get_db_connection()
+
+try:
+    cursor = conn.cursor()
+
+    print("\n✅ TEST 3 (PREPARE ONCE, EXECUTE MANY)")
+    for n in (1, 2, 3):
+        registry.execute(cursor, "SELECT %s::int + 1", (n,))
+        print(cursor.fetchall())
+    print(registry.stats())
+
+    print("\n✅ TEST 4 (LRU EVICTION DEALLOCATES)")
+    for sql in ("SELECT %s::int + 2", "SELECT %s::int + 3"):
+        registry.execute(cursor, sql, (1,))
+        print(cursor.fetchall())
+    cursor.execute("SELECT count(*) FROM pg_prepared_statements")
+    print("server-side statements:", cursor.fetchone()[0], registry.stats())
+
+    cursor.close()
+finally:
+    conn.rollback()
+    release_db_connection(conn)
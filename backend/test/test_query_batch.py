@@ -0,0 +1,58 @@
+from src.query_batch import plan_batch, split_rows
+from src.sql_ast import Select, SelectItem, Column, Aggregate, Join, Predicate, Param, Limit, OrderBy
+
+orders_total = Column("orders", "total_amount")
+orders_id = Column("orders", "id")
+users_city = Column("users", "city")
+users_country = Column("users", "country")
+created_at = Column("orders", "created_at")
+
+join_users = (Join("users", ((Column("orders", "user_id"), Column("users", "id")),)),)
+last_week = (Predicate(created_at, ">=", Param("2024-01-01", "timestamp")),)
+
+
+def tile(dimension, aggregate, alias, limit=10, order_by=()):
+    items = (SelectItem(aggregate, alias),)
+    group_by = ()
+    if dimension is not None:
+        items = (SelectItem(dimension, dimension.name),) + items
+        group_by = (dimension,)
+    return Select(
+        items=items, from_table="orders", joins=join_users, where=last_week,
+        group_by=group_by, order_by=order_by, limit=Limit(limit),
+    )
+
+
+# A dashboard: the same scan sliced several ways
+queries = {
+    0: tile(users_city, Aggregate("sum", orders_total), "revenue"),
+    1: tile(users_city, Aggregate("count", orders_id), "orders", limit=5),
+    2: tile(users_country, Aggregate("sum", orders_total), "revenue"),
+    3: tile(None, Aggregate("sum", orders_total), "revenue"),
+    4: tile(users_city, Aggregate("sum", orders_total), "revenue"),  # same as 0
+    5: tile(users_city, Aggregate("sum", orders_total), "revenue",
+            order_by=(OrderBy(Aggregate("sum", orders_total), "DESC NULLS LAST"),)),
+}
+
+print("\n✅ TEST 1 (DEDUPE + MERGE → STATEMENTS)")
+statements = plan_batch(queries)
+for statement in statements:
+    sql, params = statement.render()
+    print(type(statement.query).__name__, "| queries:", sorted({m.index for m in statement.members}))
+    print(sql)
+    print(params)
+
+print("\n✅ TEST 2 (GROUP BY only, no GROUPING SETS)")
+for statement in plan_batch(queries, use_grouping_sets=False):
+    print(statement.render()[0])
+
+print("\n✅ TEST 3 (SPLIT MERGED ROWS BACK PER QUERY)")
+grouping = statements[0]
+rows = []
+for grouping_set in grouping.query.sets:
+    grouping_id = grouping.query.grouping_id(grouping_set)
+    for n in range(8):
+        rows.append(tuple(f"v{n}" for _ in grouping.query.items) + (grouping_id,))
+
+for index, member_rows in sorted(split_rows(grouping, rows).items()):
+    print(index, len(member_rows), member_rows[:2])
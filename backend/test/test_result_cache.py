@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import pickle
+import time
+import uuid
+from decimal import Decimal
+from src.result_cache import ResultCache, LocalKVBackend, make_result_cache_key, ttl_for_time_range
+
+cache = ResultCache(memory_budget_bytes=4096, backend=LocalKVBackend())
+
+sql = "SELECT users.city AS city, SUM(orders.total) AS revenue FROM orders LIMIT 10"
+rows = [("Paris", Decimal("10.50")), ("Berlin", Decimal("7.00"))]
+
+key = make_result_cache_key("tenant-1", sql, role="authenticated")
+other_tenant = make_result_cache_key("tenant-2", sql, role="authenticated")
+
+print("\n✅ TTLs:")
+print("  no time range:", ttl_for_time_range(None))
+print("  this_month:", ttl_for_time_range({"type": "this_month"}))
+print("  last_year:", ttl_for_time_range({"type": "last_year"}))
+print("  past absolute_range:", ttl_for_time_range({
+    "type": "absolute_range", "start_date": "2024-01-01", "end_date": "2024-06-30"
+}))
+
+cache.set(key, rows, ttl_s=ttl_for_time_range({"type": "last_year"}))
+
+print("\n✅ CACHE HIT:", cache.get(key))
+print("✅ ISOLATED PER TENANT (miss):", cache.get(other_tenant))
+print("✅ STATS:", cache.stats())
+
+
+print("\n✅ TYPED ROUND TRIP (tagged JSON, no pickle):")
+typed_rows = [(
+    "Paris", 3, 1.5, float("nan"), True, None, Decimal("1234567890123456789.0123456789"),
+    datetime.date(2024, 1, 1), datetime.datetime(2024, 1, 1, 12, 30, tzinfo=datetime.timezone.utc),
+    datetime.time(9, 15), datetime.timedelta(days=2, seconds=5), uuid.UUID(int=1), b"\x00\xff",
+    {"$dec": "not a tag", "tags": ["a", "b"]},
+)]
+typed_key = make_result_cache_key("tenant-1", "SELECT typed", role="authenticated")
+cache.set(typed_key, typed_rows, ttl_s=60)
+restored, _ = cache.get(typed_key)
+print("  memory:", restored[0])
+
+shared_only = ResultCache(memory_budget_bytes=4096, backend=cache.backend)
+print("  shared backend:", shared_only.get(typed_key)[0][0][6:9])
+
+print("\n✅ PICKLED SHARED ENTRY IS A MISS:")
+cache.backend.setex(ResultCache.KEY_PREFIX + "poisoned", 60, pickle.dumps(rows))
+print(" ", shared_only.get("poisoned"))
+
+
+class BrokenBackend:
+    """A shared backend that is down (e.g. a Redis timeout)."""
+
+    def get(self, key):
+        raise TimeoutError("Timeout reading from socket")
+
+    def setex(self, key, ttl_s, value):
+        raise ConnectionError("Connection refused")
+
+
+print("\n✅ BACKEND OUTAGE → MISS / SKIPPED WRITE:")
+degraded = ResultCache(memory_budget_bytes=4096, backend=BrokenBackend())
+print("  get:", degraded.get(key))
+degraded.set(key, rows, ttl_s=60)
+print("  set kept in memory:", degraded.get(key))
+print("  async get (other key):", asyncio.run(degraded.get_async(other_tenant)))
+print("  stats:", degraded.stats())
+
+
+class SlowBackend(LocalKVBackend):
+    """A shared backend with a 200 ms round trip."""
+
+    def get(self, key):
+        time.sleep(0.2)
+        return super().get(key)
+
+
+async def loop_stays_free():
+    slow = ResultCache(memory_budget_bytes=4096, backend=SlowBackend())
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await slow.get_many_async(["a", "b"])
+    task.cancel()
+    return ticks
+
+
+print("\n✅ ASYNC BACKEND READS RUN OFF THE EVENT LOOP:")
+print("  event loop ticks during two 200 ms backend reads:", asyncio.run(loop_stays_free()))
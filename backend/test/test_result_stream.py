@@ -0,0 +1,60 @@
+import asyncio
+import datetime
+from decimal import Decimal
+from src.result_stream import encode_ndjson, encode_arrow, arrow_available, encode_columnar, encode_arrow_result
+
+
+async def fake_batches():
+    columns = ["city", "revenue"]
+    yield columns, [("Paris", Decimal("10.50")), ("Berlin", Decimal("7"))]
+    yield columns, [("Rome", None)]
+
+
+async def collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+print("\n✅ NDJSON STREAM:\n")
+print(asyncio.run(collect(encode_ndjson(fake_batches(), "SELECT ..."))).decode())
+
+if arrow_available():
+    import pyarrow as pa
+
+    body = asyncio.run(collect(encode_arrow(fake_batches(), "SELECT ...")))
+    table = pa.ipc.open_stream(body).read_all()
+    print("✅ ARROW STREAM:", table.num_rows, "rows")
+    print(table.schema)
+else:
+    print("⚠️ pyarrow not installed, skipping Arrow stream")
+
+
+async def empty_batches():
+    # stream_with_timeout_async always yields the column names once
+    yield ["city", "revenue"], []
+
+
+print("\n✅ NDJSON STREAM (NO ROWS):\n")
+print(asyncio.run(collect(encode_ndjson(empty_batches(), "SELECT ..."))).decode())
+
+if arrow_available():
+    table = pa.ipc.open_stream(asyncio.run(collect(encode_arrow(empty_batches(), "SELECT ...")))).read_all()
+    print("✅ ARROW STREAM (NO ROWS):", table.num_rows, "rows |", table.schema.names)
+
+
+# Buffered /query encodings (format="columnar" / "arrow")
+columns = ["city", "period", "revenue"]
+rows = [("Paris", datetime.date(2024, 1, 1), Decimal("10.50")), ("Berlin", datetime.date(2024, 1, 2), None)]
+
+print("\n✅ COLUMNAR JSON:\n")
+print(encode_columnar({"answer": "2 rows", "sql": "SELECT ..."}, columns, rows).decode())
+
+if arrow_available():
+    table = pa.ipc.open_stream(encode_arrow_result(columns, rows, {"sql": "SELECT ..."})).read_all()
+    print("✅ ARROW RESULT:", table.num_rows, "rows |", table.schema.metadata)
+
+    # SUM(numeric) past 1e18 rounds to 10 decimals; past 28 digits → doubles
+    big = [("Paris", datetime.date(2024, 1, 1), Decimal("1234567890123456789.123456789012")),
+           ("Berlin", datetime.date(2024, 1, 2), Decimal("1E+30"))]
+    for sample in (big[:1], big):
+        table = pa.ipc.open_stream(encode_arrow_result(columns, sample, {"sql": "SELECT ..."})).read_all()
+        print("✅ ARROW WIDE NUMERIC:", table.schema.field("revenue").type, table.column("revenue").to_pylist())
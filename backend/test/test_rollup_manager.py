@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+
+from src.rollup_manager import (
+    define_rollups, refresh_rollup, route_to_rollup, get_rollups, RollupDefinition, rewrite_for_rollup,
+    get_tenant_rollups_async, invalidate_rollups,
+)
+from src.sql_builder import build_query, route_query
+from src.sql_ast import Select, SelectItem, Column, Aggregate, Predicate, Param
+
+try:
+    definitions = define_rollups()
+    print("\n✅ ROLLUP DEFINITIONS:")
+    for rollup in definitions:
+        print(rollup.name, "→", rollup.to_dict())
+
+    print("\n✅ INCREMENTAL REFRESH (second run only recomputes the lookback window):")
+    for rollup in definitions:
+        print(refresh_rollup(rollup))
+        print(refresh_rollup(rollup))
+
+except Exception as e:
+    print("❌ Rollup refresh failed:", e)
+
+
+# Measure-by-dimension-over-time plan (adjust names to your mappings)
+plan = {
+    "measures": [{"name": "total_amount", "operation": "avg"}],
+    "dimensions": ["city"],
+    "time_range": {"type": "last_month"},
+    "limit": 10
+}
+
+try:
+    routed = route_to_rollup(build_query(plan), get_rollups())
+    print("\n✅ ROUTED SQL:", routed.render() if routed else "no rollup can answer this plan")
+
+except Exception as e:
+    print("❌ Rollup routing failed:", e)
+
+
+# Time bounds: only whole days can be answered from daily buckets (no database needed)
+
+rollup = RollupDefinition(
+    fact_table="orders",
+    time_column="created_at",
+    time_type="timestamp without time zone",
+    dimensions=(),
+    measures=(("total_amount", "numeric"),),
+    joins=(),
+)
+
+
+def revenue_since(bound):
+    return Select(
+        items=(SelectItem(Aggregate("sum", Column("orders", "total_amount")), "revenue"),),
+        from_table="orders",
+        where=(Predicate(Column("orders", "created_at"), ">=", bound),),
+    )
+
+
+print("\n✅ TIME BOUNDS ON A TIMESTAMP ROLLUP:")
+for bound in (
+    Param("2024-01-15", cast="timestamp without time zone"),  # resolve_time_filter bound
+    Param("2024-01-15 12:00", cast="date"),
+    Param("2024-01-15 12:00"),  # plan filter with a time of day: must not route
+):
+    rewritten = rewrite_for_rollup(revenue_since(bound), rollup)
+    print(bound.value, bound.cast, "→", rewritten.render() if rewritten else "not routed")
+
+
+# Per-tenant registries: a tenant's queries only route to its own rollups (no database needed)
+
+class FakeRegistryCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        self.result = [(True,)] if "to_regclass" in sql else self.rows
+
+    async def fetchone(self):
+        return self.result[0]
+
+    async def fetchall(self):
+        return self.result
+
+
+registry_reads = []
+
+
+def tenant_database(name, rows):
+    @asynccontextmanager
+    async def connect():
+        registry_reads.append(name)
+
+        class Conn:
+            def cursor(self):
+                return FakeRegistryCursor(rows)
+        yield Conn()
+    return connect
+
+
+refreshed = datetime.datetime.now(datetime.timezone.utc)
+tenant_a = tenant_database("a", [(rollup.to_dict(), refreshed)])
+tenant_b = tenant_database("b", [])
+
+
+async def tenant_registries():
+    a = await get_tenant_rollups_async("user-a@db-a:5432/shop", tenant_a)
+    b = await get_tenant_rollups_async("user-b@db-b:5432/shop", tenant_b)
+    await get_tenant_rollups_async("user-a@db-a:5432/shop", tenant_a)  # cached
+    return a, b
+
+
+rollups_a, rollups_b = asyncio.run(tenant_registries())
+query = revenue_since(Param("2024-01-15", cast="date"))
+
+print("\n✅ PER-TENANT ROLLUP REGISTRIES:")
+print("registry reads:", registry_reads)
+print("tenant a →", route_query(query, use_rollups=True, rollups=rollups_a).from_table)
+print("tenant b →", route_query(query, use_rollups=True, rollups=rollups_b).from_table)
+
+invalidate_rollups("user-a@db-a:5432/shop")
+asyncio.run(get_tenant_rollups_async("user-a@db-a:5432/shop", tenant_a))
+print("after a refresh of tenant a, registry reads:", registry_reads)
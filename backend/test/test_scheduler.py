@@ -0,0 +1,70 @@
+import asyncio
+import time
+from src.scheduler import FairScheduler, SchedulerOverloaded
+
+
+async def main():
+    order = []
+
+    async def job(scheduler, tenant):
+        async with scheduler.slot(tenant):
+            order.append(tenant[0])
+            await asyncio.sleep(0.01)
+
+    # One tenant floods the queue, another sends a few requests after it
+    print("\n✅ TEST 1 (FAIR QUEUEING ACROSS TENANTS)")
+    scheduler = FairScheduler("sql", capacity=1, tenant_concurrency=1)
+    tasks = [asyncio.create_task(job(scheduler, "heavy")) for _ in range(10)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(job(scheduler, "light")) for _ in range(3)]
+    await asyncio.gather(*tasks)
+    print("".join(order))  # light requests interleave instead of waiting for all of heavy
+
+    print("\n✅ TEST 2 (WEIGHTS)")
+    order.clear()
+    scheduler.set_weight("gold", 3)
+    await asyncio.gather(*[job(scheduler, t) for _ in range(6) for t in ("gold", "basic")])
+    print("".join(order))
+
+    print("\n❌ TEST 3 (BOUNDED QUEUE → OVERLOADED)")
+    scheduler = FairScheduler("llm", capacity=1, tenant_concurrency=1, tenant_queue_limit=2, queue_limit=3)
+    results = await asyncio.gather(*[job(scheduler, "t") for _ in range(5)], return_exceptions=True)
+    print([type(r).__name__ for r in results])
+
+    # Hold the only slot, fill the queues, then knock on the full ones
+    release = asyncio.Event()
+
+    async def hold(tenant):
+        async with scheduler.slot(tenant):
+            await release.wait()
+
+    async def admit(tenant):
+        try:
+            async with scheduler.slot(tenant):
+                print("UNEXPECTED ADMIT:", tenant)
+        except SchedulerOverloaded as e:
+            print(f"{tenant}: {e} (retry after {e.retry_after_s}s)")
+
+    holders = [asyncio.create_task(hold("t")) for _ in range(3)]  # 1 running + 2 queued
+    await asyncio.sleep(0)
+    await admit("t")  # tenant queue full
+
+    holders.append(asyncio.create_task(hold("u")))  # 3 queued overall
+    await asyncio.sleep(0)
+    await admit("v")  # global queue full
+
+    release.set()
+    await asyncio.gather(*holders)
+    print("rejected:", scheduler.stats()["rejected"])
+
+    print("\n✅ TEST 4 (TOKEN BUCKET)")
+    scheduler = FairScheduler("llm", capacity=10, tenant_concurrency=10, tenant_rate_per_s=20, tenant_burst=2)
+    start = time.monotonic()
+    await asyncio.gather(*[job(scheduler, "t") for _ in range(6)])
+    print(f"6 requests at 20/s with burst 2: {time.monotonic() - start:.2f}s")
+
+    print("\n✅ TEST 5 (QUEUE DEPTH METRICS)")
+    print(scheduler.stats())
+
+
+asyncio.run(main())
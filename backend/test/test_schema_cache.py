@@ -0,0 +1,53 @@
+import threading
+import time
+
+from src.schema_cache import SchemaCache
+
+cache = SchemaCache(check_interval_s=0)
+loads = []
+
+
+def slow_load(key):
+    def load_fn():
+        loads.append(key)
+        time.sleep(0.3)
+        return {"orders": {"columns": {"id": "integer"}}}
+    return load_fn
+
+
+print("\n✅ TEST 1 (ONE TENANT'S INTROSPECTION DOES NOT BLOCK ANOTHER)")
+cache.prime("tenant_b", {"users": {}}, fingerprint="b1")
+
+slow = threading.Thread(target=cache.get, args=("tenant_a", lambda: "a1", slow_load("tenant_a")))
+slow.start()
+time.sleep(0.05)
+
+start = time.perf_counter()
+cache.get("tenant_b", lambda: "b1", slow_load("tenant_b"))
+print("tenant_b served in", round((time.perf_counter() - start) * 1000, 1), "ms while tenant_a loads")
+slow.join()
+
+
+print("\n✅ TEST 2 (CONCURRENT MISSES FOR ONE KEY LOAD ONCE)")
+cache = SchemaCache(check_interval_s=60)
+loads.clear()
+
+threads = [
+    threading.Thread(target=cache.get, args=("tenant_c", lambda: "c1", slow_load("tenant_c")))
+    for _ in range(5)
+]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print("loads:", loads, "| version:", cache.version("tenant_c"))
+
+
+print("\n✅ TEST 3 (FINGERPRINT CHANGE → RELOAD, REFRESH → RELOAD)")
+cache.check_interval_s = 0
+cache.get("tenant_c", lambda: "c1", slow_load("tenant_c"))
+print("same fingerprint, version:", cache.version("tenant_c"))
+cache.get("tenant_c", lambda: "c2", slow_load("tenant_c"))
+print("new fingerprint, version:", cache.version("tenant_c"))
+cache.refresh("tenant_c", lambda: "c2", slow_load("tenant_c"))
+print("refresh, version:", cache.version("tenant_c"), "| loads:", len(loads))
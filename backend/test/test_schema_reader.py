@@ -1,4 +1,7 @@
-from src.schema_reader import load_physical_schema
+import time
+
+from src.db import get_db_connection, release_db_connection
+from src.schema_reader import load_physical_schema, get_schema_version, introspect_physical_schema
 
 try:
     schema = load_physical_schema()
@@ -9,7 +12,36 @@ try:
         print("  Columns:", meta["columns"])
         print("  Primary Key:", meta["primary_key"])
         print("  Foreign Keys:", meta["foreign_keys"])
+        print("  FK Constraints:", meta["foreign_key_constraints"])
         print("-" * 50)
 
 except Exception as e:
     print("❌ Schema load failed:", e)
+
+
+# Second call should be served from the schema cache (no catalog queries)
+try:
+    version = get_schema_version()
+    load_physical_schema()
+    print("\n✅ Cached schema version unchanged:", version == get_schema_version())
+
+except Exception as e:
+    print("❌ Cached schema load failed:", e)
+
+
+# pg_catalog (single query) vs information_schema backend
+conn = get_db_connection()
+try:
+    cur = conn.cursor()
+    for backend in ("pg_catalog", "information_schema"):
+        start = time.perf_counter()
+        tables = introspect_physical_schema(cur, backend=backend)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"\n✅ {backend}: {len(tables)} tables in {elapsed_ms:.1f} ms")
+    cur.close()
+
+except Exception as e:
+    print("❌ Backend comparison failed:", e)
+
+finally:
+    release_db_connection(conn)
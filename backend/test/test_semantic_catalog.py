@@ -0,0 +1,16 @@
+from src.semantic_catalog import get_semantic_catalog
+
+try:
+    catalog = get_semantic_catalog()
+
+    print("\n✅ SEMANTIC CATALOG (version", catalog.version + ")\n")
+    print("Measures:", catalog.measure_index)
+    print("Dimensions:", catalog.dimension_index)
+    print("Ambiguous measures:", catalog.ambiguous_measures)
+    print("Ambiguous dimensions:", catalog.ambiguous_dimensions)
+
+    # Second access must be served from memory (same snapshot object)
+    print("\n✅ Memoized:", get_semantic_catalog() is catalog)
+
+except Exception as e:
+    print("❌ Semantic catalog failed:", e)
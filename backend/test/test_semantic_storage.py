@@ -1,12 +1,16 @@
 from src.semantic_storage import store_semantic_mappings, load_semantic_mappings
 
 try:
-    store_semantic_mappings()
-    print("✅ Semantic mappings stored successfully")
+    summary = store_semantic_mappings()
+    print("✅ Semantic mappings stored successfully:", summary)
 
     data = load_semantic_mappings()
     print("\n✅ Loaded Semantic Mappings:\n")
     print(data)
 
+    # Nothing changed since the previous run → no table is reclassified
+    summary = store_semantic_mappings()
+    print("\n✅ Incremental refresh (expected no changes):", summary)
+
 except Exception as e:
     print("❌ Semantic storage failed:", e)
@@ -0,0 +1,63 @@
+import dataclasses
+
+from src.sql_ast import (
+    Select, SelectItem, Column, Aggregate, Join, Predicate, Param, Fragment, Limit, OrderBy, TimeBucket, GapFill,
+)
+
+orders_total = Column("orders", "total_amount")
+users_city = Column("users", "city")
+created_at = Column("orders", "created_at")
+
+
+def build(days: int):
+    return Select(
+        items=(
+            SelectItem(users_city, "city"),
+            SelectItem(Aggregate("sum", orders_total), "revenue"),
+        ),
+        from_table="orders",
+        joins=(Join("users", ((Column("orders", "user_id"), Column("users", "id")),)),),
+        where=(Predicate(created_at, ">=", Fragment("CURRENT_DATE - make_interval(days => {})", (Param(days),))),),
+        group_by=(users_city,),
+        limit=Limit(10),
+    )
+
+
+print("\n✅ TEST 1 (RENDER SQL + PARAMS)")
+sql, params = build(7).render()
+print(sql)
+print(params)
+
+print("\n✅ TEST 2 (SAME SHAPE → SAME SQL TEXT)")
+sql_30, params_30 = build(30).render()
+print("same sql:", sql == sql_30, "| params:", params, params_30)
+
+print("\n✅ TEST 3 (TABLES / COLUMNS WITHOUT RE-PARSING)")
+query = build(7)
+print("tables:", sorted(query.tables()))
+print("columns:", sorted(query.referenced_columns()))
+print("join keys:", sorted(query.join_columns()))
+
+print("\n✅ TEST 4 (LIMIT REWRITE ON THE AST)")
+print(query.with_limit(1000).render()[0])
+
+print("\n❌ TEST 5 (UNKNOWN AGGREGATION)")
+try:
+    Aggregate("median", orders_total)
+    print("UNEXPECTED PASS")
+except ValueError as e:
+    print("BLOCKED AS EXPECTED:", e)
+
+print("\n✅ TEST 6 (TIME GRAIN + GAP FILL)")
+month = TimeBucket("month", created_at)
+trend = Select(
+    items=(SelectItem(month, "period"), SelectItem(Aggregate("sum", orders_total), "revenue")),
+    from_table="orders",
+    where=(Predicate(created_at, ">=", Param("2024-01-01", "date")),),
+    group_by=(month,),
+    order_by=(OrderBy(month, "ASC"),),
+    limit=Limit(12),
+)
+print(trend.render()[0])
+filled = dataclasses.replace(trend, gap_fill=GapFill("month", "2024-01-01", "2024-12-01", "period", ("revenue",)))
+print(filled.render())
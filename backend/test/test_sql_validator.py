@@ -36,3 +36,14 @@ try:
     print("UNEXPECTED PASS")
 except Exception as e:
     print("BLOCKED AS EXPECTED:", e)
+
+
+# Keywords / separators inside string literals are data, not SQL
+literal_sql = "SELECT users.name FROM users WHERE users.name = 'drop; -- me' LIMIT 10"
+
+print("\n✅ TEST 5 (KEYWORDS INSIDE STRING LITERAL)")
+try:
+    validate_sql(literal_sql)
+    print("PASSED")
+except Exception as e:
+    print("FAILED:", e)
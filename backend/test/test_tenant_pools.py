@@ -0,0 +1,47 @@
+import asyncio
+import os
+from src.async_db import AsyncTenantPoolRegistry
+
+# Use the internal database as a stand-in tenant database
+creds = {
+    "host": os.getenv("POSTGRES_HOST"),
+    "port": os.getenv("POSTGRES_PORT"),
+    "db_name": os.getenv("POSTGRES_DB"),
+    "username": os.getenv("POSTGRES_USER"),
+    "password": os.getenv("POSTGRES_PASSWORD"),
+}
+
+
+async def main():
+    registry = AsyncTenantPoolRegistry(max_pools=2, max_connections_per_pool=2)
+
+    try:
+        for i in range(3):
+            async with registry.connection("test-user", creds) as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT 1;")
+                    print(f"Pooled query {i + 1} OK:", await cur.fetchone())
+
+        print("\n✅ Pool stats:", registry.stats())
+
+    except Exception as e:
+        print("❌ Tenant pool failed:", e)
+
+    finally:
+        await registry.close_all()
+
+    # Every pool busy: a new tenant's pool must not evict itself (no connection needed)
+    registry = AsyncTenantPoolRegistry(max_pools=1)
+    try:
+        busy = await registry._acquire_entry("tenant-a", dict(creds, db_name="a"))
+        await registry._acquire_entry("tenant-b", dict(creds, db_name="b"))
+        print("✅ Over capacity while busy:", registry.stats(), "| busy pool kept:", busy["in_use"] == 1)
+
+    except Exception as e:
+        print("❌ Pool eviction failed:", e)
+
+    finally:
+        await registry.close_all()
+
+
+asyncio.run(main())
@@ -1,4 +1,6 @@
-from src.time_filter_resolver import resolve_time_filter
+import datetime
+
+from src.time_filter_resolver import resolve_time_filter, time_range_bounds
 
 # 1) Plan with NO time_range → should produce no filter
 plan_no_time = {
@@ -31,3 +33,19 @@ try:
     print(result2)
 except Exception as e:
     print("Expected failure:", e)
+
+
+# 3) Half-open bounds computed in Python (no database needed)
+print("\n✅ TEST 3: Half-open bounds for a fixed date (2024-03-31)\n")
+
+today = datetime.date(2024, 3, 31)
+for time_range in [
+    {"type": "relative_days", "last_n_days": 7},
+    {"type": "relative_months", "last_n_months": 1},
+    {"type": "this_month"},
+    {"type": "last_month"},
+    {"type": "last_year"},
+    {"type": "absolute_range", "start_date": "2024-01-01", "end_date": "2024-01-31"},
+]:
+    start, end = time_range_bounds(time_range, today)
+    print(f"{time_range['type']:<16} [{start}, {end})")
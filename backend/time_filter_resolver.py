@@ -1,4 +1,12 @@
-from schema_reader import load_physical_schema
+import calendar
+import datetime
+import functools
+import os
+from zoneinfo import ZoneInfo
+
+from schema_reader import load_physical_schema, leading_index_columns, partition_key_column
+from filter_resolver import base_type
+from sql_ast import TIME_GRAINS, Column, Param, Predicate, TimeBucket
 
 
 # ---------------------------------
@@ -27,10 +35,13 @@ def find_time_column(base_table: str):
     possible time-related columns. Uses a priority-based, deterministic strategy.
 
     Strategy:
-      1. Find all columns whose name contains any of TIME_COLUMN_PRIORITY (in order).
-      2. If multiple match, pick the one with the highest priority (lowest index).
-      3. If none match by name, look at data types and pick the first time-like dtype.
-      4. If still nothing, return None.
+      1. Candidates are columns whose name contains any of TIME_COLUMN_PRIORITY,
+         plus columns with a time-like dtype.
+      2. Time-typed candidates that can prune or use an index win: first the
+         RANGE partition key, then the leading column of a btree / BRIN index.
+      3. Then the name priority (lowest index first; type-only matches last),
+         then column order.
+      4. If nothing matches, return None.
     """
 
     schema = load_physical_schema()
@@ -38,52 +49,169 @@ def find_time_column(base_table: str):
     if base_table not in schema:
         raise ValueError(f"Base table '{base_table}' not found in physical schema")
 
-    columns = schema[base_table]["columns"]
+    return select_time_column(schema[base_table])
+
+
+def select_time_column(meta: dict):
+    """
+    find_time_column() for an already loaded table entry of the physical schema.
+    """
+    columns = meta["columns"]
+
+    partition_column = partition_key_column(meta)
+    indexed = leading_index_columns(meta)
 
-    # 1. Name-based candidates with priority scoring
     candidates = []
 
-    for col_name in columns.keys():
+    for position, (col_name, dtype) in enumerate(columns.items()):
         lower = col_name.lower()
-        for idx, pattern in enumerate(TIME_COLUMN_PRIORITY):
-            if pattern in lower:
-                # lower idx = higher priority
-                candidates.append((idx, col_name))
-                break  # don't match multiple patterns for same column
+        time_typed = base_type(dtype) in TIME_DATA_TYPES
 
-    if candidates:
-        # sort by priority index, return the best column
-        candidates.sort(key=lambda x: x[0])
-        return candidates[0][1]
+        # lower idx = higher priority; type-only matches rank after names
+        priority = next(
+            (idx for idx, pattern in enumerate(TIME_COLUMN_PRIORITY) if pattern in lower),
+            None
+        )
+        if priority is None:
+            if not time_typed:
+                continue
+            priority = len(TIME_COLUMN_PRIORITY)
+
+        if time_typed and col_name == partition_column:
+            access = 0
+        elif time_typed and col_name in indexed:
+            access = 1
+        else:
+            access = 2
+
+        candidates.append((access, priority, position, col_name))
 
-    # 2. Type-based fallback if no name-based match
-    for col_name, dtype in columns.items():
-        if dtype in TIME_DATA_TYPES:
-            return col_name
+    if not candidates:
+        return None
 
-    # 3. No suitable time column found
-    return None
+    return min(candidates)[3]
 
 
 # ---------------------------------
 # Time Range → SQL Resolver
 # ---------------------------------
 
-def resolve_time_filter(plan: dict, base_table: str):
+# Calendar arithmetic happens here, not in SQL: bounds reach PostgreSQL as
+# constants, so partition pruning and index range selection happen at plan
+# time (CURRENT_DATE is only known at execution). "Today" is taken in
+# TIME_FILTER_TIMEZONE, which should match the database session's TimeZone.
+TIME_FILTER_TIMEZONE = os.getenv("TIME_FILTER_TIMEZONE", "UTC")
+
+
+def current_date(timezone: str = None) -> datetime.date:
+    return datetime.datetime.now(_zone(timezone or TIME_FILTER_TIMEZONE)).date()
+
+
+@functools.lru_cache(maxsize=None)
+def _zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def add_months(day: datetime.date, months: int) -> datetime.date:
+    """
+    day shifted by months, clamped to the month's last day (like
+    PostgreSQL's date - interval 'n months').
+    """
+    index = day.year * 12 + (day.month - 1) + months
+    year, month = divmod(index, 12)
+    month += 1
+    return datetime.date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def time_range_bounds(time_range: dict, today: datetime.date):
+    """
+    Half-open [start, end) date bounds for a time_range.
+
+    Relative ranges end after today; absolute ranges include end_date.
+    """
+    range_type = time_range.get("type")
+    tomorrow = today + datetime.timedelta(days=1)
+    month_start = today.replace(day=1)
+    year_start = today.replace(month=1, day=1)
+
+    # --- Relative days: last_n_days ---
+    if range_type == "relative_days":
+        n = time_range.get("last_n_days")
+        if not isinstance(n, int):
+            raise ValueError("relative_days requires integer last_n_days")
+        return today - datetime.timedelta(days=n), tomorrow
+
+    # --- Relative months: last_n_months ---
+    if range_type == "relative_months":
+        n = time_range.get("last_n_months")
+        if not isinstance(n, int):
+            raise ValueError("relative_months requires integer last_n_months")
+        return add_months(today, -n), tomorrow
+
+    # --- This month ---
+    if range_type == "this_month":
+        return month_start, add_months(month_start, 1)
+
+    # --- This year ---
+    if range_type == "this_year":
+        return year_start, year_start.replace(year=year_start.year + 1)
+
+    # --- Last month ---
+    if range_type == "last_month":
+        return add_months(month_start, -1), month_start
+
+    # --- Last year ---
+    if range_type == "last_year":
+        return year_start.replace(year=year_start.year - 1), year_start
+
+    # --- Absolute range ---
+    if range_type == "absolute_range":
+        start_date = time_range.get("start_date")
+        end_date = time_range.get("end_date")
+
+        if not start_date or not end_date:
+            raise ValueError("absolute_range requires start_date and end_date")
+
+        try:
+            start = datetime.date.fromisoformat(str(start_date))
+            end = datetime.date.fromisoformat(str(end_date))
+        except ValueError:
+            raise ValueError("absolute_range dates must be YYYY-MM-DD")
+
+        if end < start:
+            raise ValueError("absolute_range end_date is before start_date")
+
+        return start, end + datetime.timedelta(days=1)
+
+    raise ValueError(f"Unsupported time_range type: {range_type}")
+
+
+def resolve_time_filter(plan: dict, base_table: str, today: datetime.date = None):
     """
-    Resolves plan['time_range'] into SQL WHERE clauses based on a selected
+    Resolves plan['time_range'] into WHERE predicates based on a selected
     canonical time column for the base_table.
 
+    Every range becomes a half-open pair of constant bounds,
+    col >= %s AND col < %s, computed from today (default: current_date())
+    and bound as parameters cast to the column's own type, so the
+    comparison stays sargable and prunes partitions at plan time.
+
     Returns:
       {
         "time_column": "table.col",
-        "where_clauses": ["table.col >= ...", "table.col < ..."]
+        "predicates": [Predicate(...), ...],
+        "where_clauses": ["table.col >= %s::date", "table.col < %s::date"],
+        "params": ("2024-01-01", "2024-02-01"),
+        "bounds": (date(2024, 1, 1), date(2024, 2, 1))
       }
 
     Or, if no time_range is present:
       {
         "time_column": None,
-        "where_clauses": []
+        "predicates": [],
+        "where_clauses": [],
+        "params": (),
+        "bounds": None
       }
     """
 
@@ -93,74 +221,104 @@ def resolve_time_filter(plan: dict, base_table: str):
     if not time_range:
         return {
             "time_column": None,
-            "where_clauses": []
+            "predicates": [],
+            "where_clauses": [],
+            "params": (),
+            "bounds": None
         }
 
-    time_col = find_time_column(base_table)
+    schema = load_physical_schema()
+
+    if base_table not in schema:
+        raise ValueError(f"Base table '{base_table}' not found in physical schema")
+
+    columns = schema[base_table]["columns"]
+    time_col = select_time_column(schema[base_table])
 
     if time_col is None:
         raise ValueError(
             f"Time range specified, but no suitable time column found on table '{base_table}'."
         )
 
-    full_col = f"{base_table}.{time_col}"
-    clauses = []
+    start, end = time_range_bounds(time_range, today or current_date())
 
-    range_type = time_range.get("type")
+    dtype = base_type(columns[time_col])
+    cast = dtype if dtype in TIME_DATA_TYPES else "date"
 
-    # --- Relative days: last_n_days ---
-    if range_type == "relative_days":
-        n = time_range.get("last_n_days")
-        if not isinstance(n, int):
-            raise ValueError("relative_days requires integer last_n_days")
-        clauses.append(f"{full_col} >= CURRENT_DATE - INTERVAL '{n} days'")
+    column = Column(base_table, time_col)
+    predicates = [
+        Predicate(column, ">=", Param(start.isoformat(), cast=cast)),
+        Predicate(column, "<", Param(end.isoformat(), cast=cast)),
+    ]
 
-    # --- Relative months: last_n_months ---
-    elif range_type == "relative_months":
-        n = time_range.get("last_n_months")
-        if not isinstance(n, int):
-            raise ValueError("relative_months requires integer last_n_months")
-        clauses.append(f"{full_col} >= CURRENT_DATE - INTERVAL '{n} months'")
+    params = []
+    where_clauses = [p.render(params) for p in predicates]
 
-    # --- This month ---
-    elif range_type == "this_month":
-        clauses.append(f"{full_col} >= date_trunc('month', CURRENT_DATE)")
-        clauses.append(f"{full_col} < (date_trunc('month', CURRENT_DATE) + INTERVAL '1 month')")
+    return {
+        "time_column": f"{base_table}.{time_col}",
+        "predicates": predicates,
+        "where_clauses": where_clauses,
+        "params": tuple(params),
+        "bounds": (start, end)
+    }
 
-    # --- This year ---
-    elif range_type == "this_year":
-        clauses.append(f"{full_col} >= date_trunc('year', CURRENT_DATE)")
-        clauses.append(f"{full_col} < (date_trunc('year', CURRENT_DATE) + INTERVAL '1 year')")
 
-    # --- Last month ---
-    elif range_type == "last_month":
-        clauses.append(
-            f"{full_col} >= (date_trunc('month', CURRENT_DATE) - INTERVAL '1 month')"
-        )
-        clauses.append(f"{full_col} < date_trunc('month', CURRENT_DATE)")
+# ---------------------------------
+# Time Grain → date_trunc Bucket
+# ---------------------------------
 
-    # --- Last year ---
-    elif range_type == "last_year":
-        clauses.append(
-            f"{full_col} >= (date_trunc('year', CURRENT_DATE) - INTERVAL '1 year')"
-        )
-        clauses.append(f"{full_col} < date_trunc('year', CURRENT_DATE)")
+def truncate_date(day: datetime.date, grain: str) -> datetime.date:
+    """
+    Python twin of date_trunc(grain, day)::date (weeks start on Monday).
+    """
+    if grain == "day":
+        return day
+    if grain == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if grain == "month":
+        return day.replace(day=1)
+    if grain == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if grain == "year":
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Unsupported time grain: {grain}")
+
+
+def resolve_time_grain(plan: dict, base_table: str):
+    """
+    Resolves plan['time_grain'] into a bucket over the base table's time
+    column (the same column time_range filters on).
 
-    # --- Absolute range ---
-    elif range_type == "absolute_range":
-        start_date = time_range.get("start_date")
-        end_date = time_range.get("end_date")
+    Returns None without a time_grain, else:
+      {
+        "grain": "month",
+        "time_column": "orders.created_at",
+        "bucket": TimeBucket("month", Column("orders", "created_at"))
+      }
+    """
+    grain = plan.get("time_grain")
+    if not grain:
+        return None
 
-        if not start_date or not end_date:
-            raise ValueError("absolute_range requires start_date and end_date")
+    grain = str(grain).lower()
+    if grain not in TIME_GRAINS:
+        raise ValueError(f"Unsupported time grain: {grain}")
+
+    schema = load_physical_schema()
 
-        clauses.append(f"{full_col} >= DATE '{start_date}'")
-        clauses.append(f"{full_col} <= DATE '{end_date}'")
+    if base_table not in schema:
+        raise ValueError(f"Base table '{base_table}' not found in physical schema")
+
+    time_col = select_time_column(schema[base_table])
+    if time_col is None:
+        raise ValueError(
+            f"Time grain specified, but no suitable time column found on table '{base_table}'."
+        )
 
-    else:
-        raise ValueError(f"Unsupported time_range type: {range_type}")
+    date_column = base_type(schema[base_table]["columns"][time_col]) == "date"
 
     return {
-        "time_column": full_col,
-        "where_clauses": clauses
+        "grain": grain,
+        "time_column": f"{base_table}.{time_col}",
+        "bucket": TimeBucket(grain, Column(base_table, time_col), date_column),
     }
@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# ---------------------------------
+# Bounded LRU Cache with per-entry TTL
+# ---------------------------------
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a TTL.
+
+    - maxsize bounds the number of entries (least recently used is evicted)
+    - ttl_s is the default lifetime; set() may pass a shorter / longer one
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_s: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_s: float = None):
+        ttl = self.ttl_s if ttl_s is None else ttl_s
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)